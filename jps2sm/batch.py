@@ -7,225 +7,154 @@ Perform batch processing functions for the --batch* arguments
 
 # Standard library packages
 import collections
-import time
 import re
-import sys
-from time import sleep
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from time import monotonic, sleep
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 # Third-party packages
-from bs4 import BeautifulSoup
+from bs4 import NavigableString, Tag
 from loguru import logger
 
 # jps2sm modules
-from jps2sm.get_data import GetGroupData, get_jps_group_data_class, get_jps_group_page
-from jps2sm.upload_data import upload_torrent
-from jps2sm.myloginsession import jpopsuki
+from jps2sm.get_data import GetGroupData, get_group_description, get_jps_group_data_class, get_jps_group_page
+from jps2sm.html_parser import make_soup
+from jps2sm.prepare_data import collate, prepare_torrent
+from jps2sm.upload_data import set_original_artists, upload_torrent
+from jps2sm.myloginsession import get_site_session, jpopsuki, session_pool_stats
 from jps2sm.save_data import download_sm_uploaded_torrents
 from jps2sm.utils import GetArgs, count_values_dict, GetConfig
 from jps2sm.constants import JPSTorrentView
+from jps2sm.cache import GetMediainfoCache, GetResponseCache
+from jps2sm.ledger import GetTorrentLedger, TorrentLedger
+from jps2sm.journal import RunJournal, load_run_journal, start_run_journal
+from jps2sm.download_watcher import DownloadWatcher, new_download_watcher
+from jps2sm.validation import decide_exc_filter, decide_max_size, get_exc_filter_fields
 
 
-def batch_mode(mode, user, start=1, end=None, sort=None, order=None):
+@dataclass
+class ListingTorrent:
+    """
+    Dataclass for a torrent found on a page of torrents at JPS, with the columns of the page that batch filters can be decided
+    on. Each column is None if it could not be parsed.
+    """
+    jps_group_id: str
+    jps_torrent_id: str
+    category: Optional[str] = None
+    slashdata: Optional[List[str]] = None
+    size_no_units: Optional[str] = None
+    size_units: Optional[str] = None
+    seeders: Optional[int] = None
+
+
+def batch_mode(mode, user, start=1, end=None, sort=None, order=None, run_journal=None, download_watcher=None):
     """
     Operate batch upload mode
+
+    :param run_journal: RunJournal of an interrupted run to continue, see resume_batch_mode(), else a new run is journaled
+    :param download_watcher: DownloadWatcher, only for recent mode in daemon_mode(): instead of waiting for the files of the JPS
+        torrents to download, the collated torrents are added to it and the torrents added by this and earlier runs whose files
+        have downloaded, or whose DownloadTimeoutMins has passed, are uploaded
+    :return: False if the run was interrupted by Ctrl-C
     """
     # pylint: disable=too-many-arguments
     # This is the minimum paras needed to parse the JPS data
-    from jps2sm.jps2sm import collate, prepare_torrent, set_original_artists
     args = GetArgs()
     config = GetConfig()
-
-    def batch_stats(final_stats, media_info_mode, dry_run):
-        """
-        Return statistics from a batch upload.
-        If using --recent mode it returns initial statistics after JPS torrents have been scraped, followed by final_stats after the
-        SM upload.
-
-        TODO: Needs some cleaning up, but this is better than the stats being completely duplicated as it was before
-        """
-        print(f'--------------------------------------------------------\nOverall stats:'
-              f'\nTorrents found at JPS: {batch_uploads_found}'
-              f'\nJPS Group data errors: {count_values_dict(batch_group_results["batch_group_errors"])}'
-              f'\nJPS Groups excluded by user: {len(batch_group_results["batch_groups_excluded"])}'
-              f'\nJPS "V.A." Groups with no contributing artists: {len(batch_group_results["batch_groups_va_errors"])}'
-              f'\nJPS Release data errors: {count_values_dict(batch_upload_collate_errors)}'
-              f'\nTorrents skipped due to max_size filter: {batch_torrent_info["skipped_torrents_max_size"]}'
-              f'\nTorrents skipped due to low seeders: {batch_torrent_info["skipped_torrents_low_seeders"]}'  
-              f'\nTorrents excluded by user: {batch_torrent_info["skipped_torrents_exc_filter"]}'
-              f'\nDuplicates found with torrent hash: {batch_torrent_info["skipped_torrents_duplicate"]}'
-              f'\nJPS Torrents downloaded: {batch_torrent_info["jps_torrents_downloaded_count"]}'
-              )
-        if final_stats:
-            if media_info_mode:
-                print(f'MediaInfo source data missing: {len(batch_upload_source_data_not_found)}')
-            if not dry_run:
-                logger.info(f'MediaInfo not submitted errors (use \"--mediainfo\" to fix): {batch_upload_mediainfo_not_submitted}'
-                            f'\n\nSM upload errors: {sm_upload_errors}'
-                            f'\nNew uploads successfully created: {sm_torrents_uploaded_count}'
-                            )
-
-    batch_uploads = get_batch_jps_group_torrent_ids(mode=mode, user=user, first=start, last=end, sort=sort, order=order, freeleech=args.parsed.freeleech_only)
-
-    """ For debugging
-    batch_uploads = {'362613': ['535927'],
-                     '354969': ['535926'],
-                     '362612': ['535925'],
-                     '362611': ['535924'],
-                     '181901': ['535923'],
-                     '181902': ['535922']}
-    """
-
-    batch_upload_collate_errors = collections.defaultdict(list)
-    batch_upload_source_data_not_found = []
-    batch_upload_mediainfo_not_submitted = 0
-    sm_upload_errors = 0
-    sm_torrents_uploaded_count = 0
-
-    batch_uploads_found = count_values_dict(batch_uploads)
-
-    batch_torrent_info = {
-        'skipped_torrents_max_size': 0,
-        'skipped_torrents_low_seeders': 0,
-        'jps_torrents_downloaded_count': 0,
-        'skipped_torrents_exc_filter': 0,
-        'skipped_torrents_duplicate': 0,
-        'dupe_jps_ids': [],
-        'dupe_sm_ids': [],
-    }
-
-    logger.info(f'Now attempting to upload {batch_uploads_found} torrents.')
-
-    batch_group_results = get_batch_group_data(batch_uploads, args.parsed.exccategory)
-    # print(json.dumps(batch_group_data, indent=2))
-
-    # batch_group_results = {
-    #     'batch_group_data': batch_group_data,
-    #     'batch_group_errors': batch_group_errors,
-    #     'batch_groups_excluded': batch_groups_excluded,
-    #     'batch_groups_va_errors': batch_groups_va_errors,
-    # }
+    torrent_ledger = GetTorrentLedger().torrent_ledger()
+    # Group descriptions are only memoized for the length of a run, so that every poll of daemon_mode() sees edits made at JPS
+    get_group_description.cache_clear()
+    if run_journal is None:
+        run_journal = start_run_journal({
+            'mode': mode, 'user': user, 'start': start, 'end': end, 'sort': sort, 'order': order,
+            'exccategory': args.parsed.exccategory, 'excaudioformat': args.parsed.excaudioformat, 'excmedia': args.parsed.excmedia,
+            'freeleech_only': args.parsed.freeleech_only,
+        })
 
     max_size = None
+    recent_cursor_name = None
+    recent_cursor = None
 
     if mode == "recent":
         max_size = config.max_size_recent_mode
+        # Recent mode remembers the newest torrent processed by each run and the next run pages forward until it reaches it, unless
+        # the pages or sort are specified by the user
+        if not end and sort is None and order is None and not args.parsed.reprocess:
+            recent_cursor_name = 'recent-freeleech' if args.parsed.freeleech_only else 'recent'
+            if (recent_cursor := get_recent_cursor(torrent_ledger, recent_cursor_name, download_watcher)) is not None:
+                logger.info(f'Retrieving the torrents uploaded to JPS after JPS torrent id {recent_cursor}, processed by an earlier run')
+
+    # Each torrent is processed as soon as it is found on a page of torrents at JPS, rather than after every page has been
+    # retrieved, whilst BatchGroupDataPool retrieves the data of the groups of the next few torrents. In recent mode the uploads
+    # must still wait until every torrent has been collated, so that the JPS torrents downloaded by collate() have time to download.
+    batch_run = BatchRun(run_journal=run_journal, download_watcher=download_watcher, max_size=max_size, upload_immediately=mode != "recent")
+    batch_run.process_listing(mode=mode, user=user, start=start, end=end, sort=sort, order=order, stop_at_torrent_id=recent_cursor)
+    batch_run.upload_downloaded_torrents()
+    batch_run.log_results()
 
-    batch_collate_torrent_info = {}
-    for jps_group_id, jps_torrent_ids in batch_uploads.items():
-        if jps_group_id in batch_group_results['batch_group_errors']\
-                or jps_group_id in batch_group_results['batch_groups_excluded']\
-                or jps_group_id in batch_group_results['batch_groups_va_errors']:
-            # Skip group if GetGroupData() failed or the group is being excluded by the '-exc' parameter, or if it is a 'V.A.' group and
-            # no contrib artists were set
-            # TODO Should the jps_group_ids be deleted within get_batch_group_data() ?
-            continue
+    logger.info('Finished batch upload')
+    batch_run.batch_stats(final_stats=True)
 
-        jps_group_data = get_jps_group_data_class(batch_group_results['batch_group_data'], jps_group_id)
+    if batch_run.interrupted:
+        logger.info(f'Batch run {run_journal.run_id} was interrupted, continue it with --resume {run_journal.run_id}')
+    else:
+        if recent_cursor_name:
+            set_recent_cursors(torrent_ledger, recent_cursor_name, batch_run.batch_uploads, download_watcher)
+        run_journal.finish()
 
-        try:
-            collate_torrent_info = collate(torrentids=jps_torrent_ids, torrentgroupdata=jps_group_data, max_size=max_size)
-            #logger.debug(f'collate_torrent_info: {json.dumps(collate_torrent_info, indent=2)}')
-            for collate_result_item, value in collate_torrent_info.items():
-                if isinstance(value, int):
-                    batch_torrent_info[collate_result_item] += value
-                elif isinstance(value, list):
-                    for item in value:
-                        batch_torrent_info[collate_result_item].append(item)
-                elif isinstance(value, dict):
-                    if collate_result_item != "jps_torrent_collated_data":
-                        raise RuntimeError('Expected only a dict with a parent dicts value of jps_torrent_collated_data')
-                    for jps_torrent_id, collate_torrent_info in collate_torrent_info['jps_torrent_collated_data'].items():
-                        batch_collate_torrent_info[jps_torrent_id] = {}
-                        batch_collate_torrent_info[jps_torrent_id]['jps_torrent_object'] = collate_torrent_info['jps_torrent_object']
-                        batch_collate_torrent_info[jps_torrent_id]['torrentgroupdata'] = collate_torrent_info['torrentgroupdata']
-                        batch_collate_torrent_info[jps_torrent_id]['release_data_collated'] = collate_torrent_info['release_data_collated']
-                else:
-                    raise RuntimeError('Expected either int, list or dict in collate_torrent_info.items() from collate()')
-        except KeyboardInterrupt:  # Allow Ctrl-C to exit without showing the error multiple times and polluting the final error dict
-            break  # Still continue to get error dicts and dupe list so far
-        except Exception as exc:
-            # Catch all for any collate() exception
-            logger.exception(f'Error with collating/retrieving release data for JPS group id'
-                             f'{jps_group_id} torrentid(s) {",".join(jps_torrent_ids)}, skipping upload')
-            batch_upload_collate_errors[jps_group_id] = jps_torrent_ids
-            continue
+    return not batch_run.interrupted
 
-    #logger.debug(f'batch_collate_torrent_info: {pprint.pprint(batch_collate_torrent_info, indent=2, compact=True)}')
 
-    if mode == "recent":
-        logger.info('Interim stats')
-        batch_stats(final_stats=False, media_info_mode=args.parsed.mediainfo, dry_run=args.parsed.dryrun)
-        wait_time_seconds = 60 * int(config.wait_time_recent_mode)
+def daemon_mode(user):
+    """
+    Mirror recent uploads to JPS continuously by running recent mode every DaemonPollMins, keeping the sessions and caches of the
+    process between runs. The torrents collated by a run are uploaded by the first run after their files have downloaded into the
+    MediaDirectories, or DownloadTimeoutMins has passed, so no run waits for them. A run that fails is logged and the next run
+    retries it, only Ctrl-C stops the daemon.
+
+    :param user: JPS userid
+    """
+    config = GetConfig()
+    poll_seconds = 60 * config.daemon_poll_mins
+    download_watcher = new_download_watcher()
+    logger.info(f'Mirroring recent uploads to JPS every {config.daemon_poll_mins} minutes, press Ctrl-C to stop')
+
+    poll = 0
+    while True:
+        poll += 1
+        poll_start = monotonic()
         try:
-            print(f'Waiting {config.wait_time_recent_mode} minutes for the files to download, or press Ctrl-C to continue immediately...')
-            sleep(int(wait_time_seconds))
+            # The ledger and the recent mode cursor let the daemon be restarted without a journal to resume
+            if not batch_mode(mode='recent', user=user, run_journal=RunJournal(f'daemon-{poll}', None), download_watcher=download_watcher):
+                break
         except KeyboardInterrupt:
-            pass
+            break
+        except Exception:  # Catch all so that a failure at JPS or SM does not stop the daemon
+            logger.exception(f'Recent mode run {poll} failed, it will be retried by the next run')
 
-    for jps_torrent_id, collate_torrent_info in batch_collate_torrent_info.items():
         try:
-            sugoimusic_upload_data = prepare_torrent(jps_torrent_object=collate_torrent_info['jps_torrent_object'],
-                                                     torrent_group_data=collate_torrent_info['torrentgroupdata'],
-                                                     mediainfo=args.parsed.mediainfo,
-                                                     release_data_collated=collate_torrent_info['release_data_collated'])
-        except KeyboardInterrupt:  # Allow Ctrl-C to exit without showing the error multiple times and polluting the final error dict
-            break  # Still continue to get error dicts and dupe list so far
-        except Exception as exc:
-            # TODO These should all be custom exceptions
-            if str(exc).startswith('Mediainfo error - file/directory not found'):
-                # Need to get filename that was not found
-                missing_file = re.findall(r'Mediainfo error - file/directory not found: (.+) in any of the MediaDirectories', str(exc))
-                batch_upload_source_data_not_found.append(missing_file)
-            elif str(exc).startswith('You do not appear to have entered any MediaInfo data for your video upload.'):
-                batch_upload_mediainfo_not_submitted += 1
-            else:
-                logger.exception(exc)
-            continue
-        if not args.parsed.dryrun and batch_collate_torrent_info:
-            try:
-                upload_torrent(sugoimusic_upload_data, collate_torrent_info['jps_torrent_object'])
-            except Exception as exc:
-                # Catch all for any upload_torrent() exception
-                logger.exception(f"SM upload error with JPS torrent id {jps_torrent_id} - {collate_torrent_info['torrentgroupdata'].title} - {exc}")
-                sm_upload_errors += 1
-                continue
-            set_original_artists(collate_torrent_info['torrentgroupdata'].contribartists)
-            sm_torrents_uploaded_count += 1
-    if not args.parsed.dryrun and batch_collate_torrent_info:
-        download_sm_uploaded_torrents(torrent_count=sm_torrents_uploaded_count)
-
-    if batch_group_results['batch_group_errors']:
-        logger.error('The following JPS groupid(s) (torrentid(s) shown for reference) had errors in retrieving group data, '
-                     'keep this data safe and you can possibly retry with it in a later version:')
-        logger.error(batch_group_results['batch_group_errors'])
-        logger.error(f'Total: {count_values_dict(batch_group_results["batch_group_errors"])}')
-    if batch_group_results['batch_groups_excluded']:
-        logger.info('The following groups were excluded due to user-specified filters:')
-        logger.info(f'{batch_group_results["batch_groups_excluded"]}\nTotal: {len(batch_group_results["batch_groups_excluded"])}')
-    if batch_group_results['batch_groups_va_errors']:
-        logger.warning('The following JPS groupid(s) were "bad V.A." groups - they are Various Artist groups with the artist set as "V.A." and'
-                       ' the contributing artists should be set as the actual list of artists, however these are missing:')
-        logger.warning(batch_group_results['batch_groups_va_errors'])
-        logger.warning(f'Total: {len(batch_group_results["batch_groups_va_errors"])}')
-    if batch_upload_collate_errors:
-        logger.error('The following JPS groupid(s) and corresponding torrentid(s) had errors either in collating/retrieving '
-                     'release data or in performing the actual upload to SM (although group data was retrieved OK), '
-                     'keep this data safe and you can possibly retry with it in a later version:')
-        logger.error(batch_upload_collate_errors)
-        logger.error(f'Total: {count_values_dict(batch_upload_collate_errors)}')
-    if batch_torrent_info['dupe_sm_ids']:  # Dupes found by decide_duplicate()
-        logger.warning('The following torrents have already been uploaded to the site, '
-                       'and were found by searching for the torrent hash on SM, the SM torrents were download so you can cross seed:')
-        logger.warning(f'SM duplicate torrent ids: {batch_torrent_info["dupe_sm_ids"]}'
-                       f'\nJPS duplicate torrent ids: {batch_torrent_info["dupe_jps_ids"]}'
-                       f'\nTotal: {len(batch_torrent_info["dupe_sm_ids"])}')
-    if batch_upload_source_data_not_found:
-        logger.error('The following file(s)/dir(s) were not found in your MediaDirectories specified in jps2sm.cfg and the upload was skipped:')
-        logger.error(batch_upload_source_data_not_found)
-        logger.error(f'Total: {len(batch_upload_source_data_not_found)}')
+            sleep(max(poll_seconds - (monotonic() - poll_start), 0))
+        except KeyboardInterrupt:
+            break
 
-    logger.info('Finished batch upload')
-    batch_stats(final_stats=True, media_info_mode=args.parsed.mediainfo, dry_run=args.parsed.dryrun)
+    if download_watcher:
+        logger.info(f'{len(download_watcher)} torrents collated but not uploaded yet will be processed again when the daemon is restarted')
+
+
+def resume_batch_mode(run_id):
+    """
+    Continue an interrupted batch run from its journal, with the same batch arguments and filters
+
+    :param run_id: str: Run id of the interrupted run
+    """
+    args = GetArgs()
+    run_journal = load_run_journal(run_id)
+    batch_args = dict(run_journal.batch_args)
+    for batch_filter in ('exccategory', 'excaudioformat', 'excmedia', 'freeleech_only'):
+        setattr(args.parsed, batch_filter, batch_args.pop(batch_filter))
+
+    batch_mode(**batch_args, run_journal=run_journal)
 
 
 def get_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, order=None, freeleech=None):
@@ -233,6 +162,25 @@ def get_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, o
     Iterates through pages of uploads on JPS and gathers the jps_group_ids and corresponding jps_torrent_id and returns
     a dict in the format of jps_group_id: [jps_torrent_id]
 
+    See iter_batch_jps_group_torrent_ids() for the parameters
+    :return: batch_uploads: dict
+    """
+    # pylint: disable=too-many-arguments
+    batch_uploads = collections.defaultdict(list)
+    for listing_torrent in iter_batch_jps_group_torrent_ids(mode, user, first, last, sort, order, freeleech):
+        batch_uploads[listing_torrent.jps_group_id].append(listing_torrent.jps_torrent_id)
+
+    logger.debug(f'jps_group_ids and jps_torrent_ids found on all pages: {batch_uploads}')
+    return batch_uploads
+
+
+def iter_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, order=None, freeleech=None,
+                                     run_journal: Optional[RunJournal] = None,
+                                     stop_at_torrent_id: Optional[int] = None) -> Iterator[ListingTorrent]:
+    """
+    Iterates through pages of uploads on JPS, yielding each jps_group_id and corresponding jps_torrent_id, with the columns
+    shown for the torrent, as soon as the page they are on has been retrieved
+
     :param mode: Area to get batch torrent ids from:
         'uploaded' for a user's uploads,
         'seeding' for the user's currently seeding torrents,
@@ -244,7 +192,10 @@ def get_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, o
     :param sort: Sort the JPS torrents page by a specific column, one of: {",".join(JPSTorrentView.sort_by.keys())}
     :param order: Order by ASC or DESC
     :param freeleech: Search for freeleech torrents only - only for recent mode as JPS does not support it
-    :return: batch_uploads: dict
+    :param run_journal: RunJournal, pages already retrieved by the run are taken from it and pages retrieved are added to it
+    :param stop_at_torrent_id: int, only for recent mode: page forward until this JPS torrent id, processed by an earlier run, is
+        reached, up to RecentModeMaxPages, and only yield the torrents uploaded after it
+    :return: Iterator of ListingTorrent
     """
     # pylint: disable=too-many-arguments
     # This is the minimum paras needed to parse the JPS data
@@ -281,11 +232,13 @@ def get_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, o
     else:
         order_way = default_sort_order  # Else use sensible default defined in get_sort_mode()
 
-    if not last and mode != 'recent':
+    if not last and run_journal is not None and run_journal.last_page:
+        last = run_journal.last_page
+    elif not last and mode != 'recent':
         # Ascertain last page if not provided for seeding and snatched modes
 
         res = jpopsuki(f"https://jpopsuki.eu/torrents.php?type={mode}&userid={user}")
-        soup = BeautifulSoup(res.text, 'html5lib')
+        soup = make_soup(res.text, ['#content #ajax_torrents .linkbox'])
         linkbox = str(soup.select('#content #ajax_torrents .linkbox')[0])
         try:
             last = re.findall(
@@ -294,6 +247,11 @@ def get_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, o
         except IndexError:
             # There is only 1 page of uploads if the 'Last >>' link cannot be found
             last = 1
+        if run_journal is not None:
+            run_journal.record('last_page', last)
+    elif not last and mode == 'recent' and stop_at_torrent_id is not None:
+        # Stop at the last torrent processed by an earlier run instead, this is only the limit
+        last = GetConfig().recent_mode_max_pages
     elif not last and mode == 'recent':
         # We do not need to ascertain the last page for recent mode as we never use this - we are not trying to jps2sm
         # *every* torrent!
@@ -308,95 +266,642 @@ def get_batch_jps_group_torrent_ids(mode, user, first=1, last=None, sort=None, o
                  f'order by is {order_way} '
                  f'first page is {first}, last page is {last}, freeleech-only is {freeleech}')
 
-    batch_uploads = collections.defaultdict(list)
-
     search_freeleech_uri = ""
     if freeleech:
         search_freeleech_uri = "&action=advanced&freeleech=1"  # If JPS does not see action=advanced it ignores freeleech=1
 
+    # Plan the listing against the JPS browse quota, RateLimiter() paces the requests themselves. When stopping at a torrent id the
+    # number of pages is not known in advance.
+    listing_wait_seconds = get_site_session('jps').rate_limiter.time_until_available(int(last) - first + 1)
+    if listing_wait_seconds > 0 and stop_at_torrent_id is None:
+        logger.info(f'Retrieving {int(last) - first + 1} pages of torrents will take at least {listing_wait_seconds / 60:.1f} minutes '
+                    f'to stay within the JPS browse quota')
+
     # Parse every torrent page and add to dict
     for i in range(first, int(last) + 1):
-        if mode in ('snatched', 'uploaded', 'seeding'):
-            batch_upload_url = f"https://jpopsuki.eu/torrents.php?page={i}&order_by={sort_mode}&order_way={order_way}&type={mode}&userid={user}&disablegrouping=1"
-        elif mode == 'recent':
-            batch_upload_url = f"https://jpopsuki.eu/torrents.php?page={i}&order_by={sort_mode}&order_way={order_way}&disablegrouping=1{search_freeleech_uri}"
+        if run_journal is not None and i in run_journal.pages:
+            logger.info(f'Page {i} of torrents was retrieved by the interrupted run being resumed')
+            listing_torrents = run_journal.pages[i]
         else:
-            raise RuntimeError("Unknown batch mode set")
-
-        batch_upload_page = jpopsuki(batch_upload_url)
-        logger.info(batch_upload_url)
-        # print batch_upload_page.text
-        soup2 = BeautifulSoup(batch_upload_page.text, 'html5lib')
-        try:
-            torrent_table = str(soup2.select('#content #ajax_torrents .torrent_table tbody')[0])
-        except IndexError:
-            quota_exceeded = re.findall('<title>Browse quota exceeded :: JPopsuki 2.0</title>', batch_upload_page.text)
-            if quota_exceeded:
-                logger.error('Browse quota exceeded :: JPopsuki 2.0')
-                sys.exit(1)
+            if mode in ('snatched', 'uploaded', 'seeding'):
+                batch_upload_url = f"https://jpopsuki.eu/torrents.php?page={i}&order_by={sort_mode}&order_way={order_way}&type={mode}&userid={user}&disablegrouping=1"
+            elif mode == 'recent':
+                batch_upload_url = f"https://jpopsuki.eu/torrents.php?page={i}&order_by={sort_mode}&order_way={order_way}&disablegrouping=1{search_freeleech_uri}"
             else:
-                raise
-        # Find all jps_group_id/jps_torrent_id pairs and returns a list of tuples
-        all_jps_group_ids_and_torrent_ids = re.findall(r'torrents.php\?id=([0-9]+)&amp;torrentid=([0-9]+)', torrent_table)
-        logger.info(f'jps_group_ids and jps_torrent_ids found on page: {all_jps_group_ids_and_torrent_ids}')
+                raise RuntimeError("Unknown batch mode set")
+
+            batch_upload_page = jpopsuki(batch_upload_url)
+            logger.info(batch_upload_url)
+            # print batch_upload_page.text
+            soup2 = make_soup(batch_upload_page.text, ['#content #ajax_torrents .torrent_table tbody'])
+            listing_torrents = list(parse_listing_torrents(soup2.select('#content #ajax_torrents .torrent_table tbody')[0]))
+            logger.info(f'jps_group_ids and jps_torrent_ids found on page: '
+                        f'{[(listing_torrent.jps_group_id, listing_torrent.jps_torrent_id) for listing_torrent in listing_torrents]}')
+            if run_journal is not None:
+                run_journal.record('page', i, listing_torrents)
+
+        if stop_at_torrent_id is None:
+            yield from listing_torrents
+            continue
 
-        for jps_group_id, jps_torrent_id in all_jps_group_ids_and_torrent_ids:
-            batch_uploads[jps_group_id].append(jps_torrent_id)
-        time.sleep(5)  # Sleep as otherwise we hit JPS browse quota
+        new_listing_torrents = [listing_torrent for listing_torrent in listing_torrents
+                                if int(listing_torrent.jps_torrent_id) > stop_at_torrent_id]
+        yield from new_listing_torrents
+        if len(new_listing_torrents) < len(listing_torrents) or not listing_torrents:
+            logger.info(f'Reached JPS torrent id {stop_at_torrent_id}, processed by an earlier run, on page {i}')
+            return
+
+    if stop_at_torrent_id is not None:
+        logger.warning(f'JPS torrent id {stop_at_torrent_id}, processed by an earlier run, was not reached within {last} pages, '
+                       f'the torrents uploaded between them have been missed. Increase RecentModeMaxPages in jps2sm.cfg to reach it.')
+
+
+def parse_listing_torrents(torrent_table: Tag) -> Iterator[ListingTorrent]:
+    """
+    Parse each torrent in the torrent table of a page of torrents at JPS
+
+    :param torrent_table: Tag of the tbody of the torrent table
+    :return: Iterator of ListingTorrent, in the order they are on the page
+    """
+    for row in torrent_table.find_all('tr'):
+        cells = row.find_all('td', recursive=False)
+        for link in row.find_all('a', href=True):
+            if not (torrent_link := re.search(r'torrents\.php\?id=([0-9]+)&torrentid=([0-9]+)', link['href'])):
+                continue
+
+            listing_torrent = ListingTorrent(jps_group_id=torrent_link.group(1), jps_torrent_id=torrent_link.group(2))
+            if len(cells) >= 5:  # Category, name, size, snatches, seeders and leechers are the only columns in every type of page
+                listing_torrent.category = cells[0].get_text(strip=True) or None
+                if size := re.fullmatch(r'(\d*(?:\.)?(?:\d{0,2})?) (\w{2})', cells[-4].get_text(strip=True)):
+                    listing_torrent.size_no_units, listing_torrent.size_units = size.groups()
+                if re.fullmatch(r'[0-9,]{1,6}', seeders := cells[-2].get_text(strip=True)):
+                    listing_torrent.seeders = int(seeders.replace(',', ''))
+            # The release data follows the link to the torrent, eg '[MP3 / 320 / CD] [2012.08.22]'. If it contains any tags, such
+            # as for Freeleech, it is left unparsed.
+            if isinstance(link.next_sibling, NavigableString) and (slashdata := re.match(r'\s*\[([^\]]+)\]', link.next_sibling)):
+                listing_torrent.slashdata = slashdata.group(1).split(' / ')
+            yield listing_torrent
+
+
+def decide_listing_filter(listing_torrent: ListingTorrent, excluded_category: Optional[str], max_size: Optional[str]) -> Optional[str]:
+    """
+    Decide if a torrent can be skipped using only the columns of the page of torrents it was found on, before its group page is
+    requested. The filters are applied in the same order as retrieve_batch_group_data() and collate() apply them, and any filter that
+    cannot be decided as its column could not be parsed is left to them.
+
+    :param listing_torrent: ListingTorrent
+    :param excluded_category: str, JPS Category name to be excluded
+    :param max_size: str: Maximum size with unit specified, currently only used by recent mode
+    :return: None if the torrent should be processed, else 'batch_groups_excluded' if the group is excluded or the key of the
+             batch_torrent_info{} counter of the filter that skipped it
+    """
+    config = GetConfig()
+
+    if listing_torrent.category is not None and listing_torrent.category == excluded_category:
+        return 'batch_groups_excluded'
+    if max_size and listing_torrent.size_no_units is not None \
+            and decide_max_size(listing_torrent.size_no_units, listing_torrent.size_units, max_size):
+        return 'skipped_torrents_max_size'
+    if listing_torrent.seeders is not None and listing_torrent.seeders < config.jps_min_seeders:
+        return 'skipped_torrents_low_seeders'
+    if listing_torrent.category is not None and listing_torrent.slashdata is not None \
+            and (exc_filter_fields := get_exc_filter_fields(listing_torrent.category, listing_torrent.slashdata)) \
+            and decide_exc_filter(*exc_filter_fields, listing_torrent.slashdata):
+        return 'skipped_torrents_exc_filter'
+    return None
+
+
+def record_collate_outcomes(torrent_ledger: TorrentLedger, jps_group_id: str, jps_torrent_ids: List[str], collate_torrent_info: dict) -> None:
+    """
+    Record the torrents that collate() found to be duplicates, or skipped with a filter, in the ledger. The torrents it collated are
+    recorded once they have been uploaded.
+
+    :param torrent_ledger: TorrentLedger
+    :param jps_group_id: str
+    :param jps_torrent_ids: list, jps_torrent_ids given to collate()
+    :param collate_torrent_info: dict returned by collate()
+    """
+    dupe_jps_torrent_ids = [str(dupe_jps_torrent_id) for dupe_jps_torrent_id in collate_torrent_info['dupe_jps_ids']]
+    for dupe_jps_torrent_id, dupe_sm_torrent_id, sm_torrent_hash in zip(dupe_jps_torrent_ids, collate_torrent_info['dupe_sm_ids'],
+                                                                        collate_torrent_info['dupe_sm_torrent_hashes']):
+        torrent_ledger.record(jps_group_id, dupe_jps_torrent_id, 'dupe', sm_torrent_id=dupe_sm_torrent_id, sm_torrent_hash=sm_torrent_hash)
+
+    collate_filters = [collate_filter for collate_filter in
+                       ('skipped_torrents_max_size', 'skipped_torrents_low_seeders', 'skipped_torrents_exc_filter')
+                       if collate_torrent_info[collate_filter]]
+    if not collate_filters:
+        return
+    for jps_torrent_id in jps_torrent_ids:
+        if jps_torrent_id not in collate_torrent_info['jps_torrent_collated_data'] and jps_torrent_id not in dupe_jps_torrent_ids:
+            torrent_ledger.record(jps_group_id, jps_torrent_id, 'filtered', detail=','.join(collate_filters))
+
+
+def get_recent_cursor(torrent_ledger: TorrentLedger, recent_cursor_name: str, download_watcher: Optional[DownloadWatcher]) -> Optional[int]:
+    """
+    Return the JPS torrent id a recent mode run pages forward until, or None if the listing has never been processed. The torrents
+    collated by a daemon that was stopped before they were uploaded are found again, unless download_watcher still has them waiting.
+
+    :param recent_cursor_name: str: 'recent' or 'recent-freeleech'
+    :param download_watcher: DownloadWatcher of daemon_mode(), or None
+    """
+    recent_cursor = torrent_ledger.cursor(recent_cursor_name)
+    pending_cursor = torrent_ledger.cursor(f'{recent_cursor_name}-pending')
+    if recent_cursor is not None and pending_cursor is not None and not download_watcher:
+        return min(recent_cursor, pending_cursor)
+    return recent_cursor
 
-    logger.debug(f'jps_group_ids and jps_torrent_ids found on all pages: {batch_uploads}')
-    return batch_uploads
+
+def set_recent_cursors(torrent_ledger: TorrentLedger, recent_cursor_name: str, batch_uploads: Dict[str, List[str]],
+                       download_watcher: Optional[DownloadWatcher]) -> None:
+    """
+    Advance the recent mode cursor to the newest torrent listed by a run, so the next run only lists the torrents uploaded after it.
+    The torrents waiting in download_watcher for their files to download are tracked by a separate pending cursor, the torrent
+    before the oldest of them, rather than by holding back the cursor so that every run would list them and the torrents after
+    them again.
+
+    :param recent_cursor_name: str: 'recent' or 'recent-freeleech'
+    :param batch_uploads: dict of the JPS torrent ids listed by the run, by JPS group id
+    :param download_watcher: DownloadWatcher of daemon_mode(), or None
+    """
+    if listed_torrent_ids := [int(jps_torrent_id) for jps_torrent_ids in batch_uploads.values() for jps_torrent_id in jps_torrent_ids]:
+        torrent_ledger.set_cursor(recent_cursor_name, max(listed_torrent_ids))
+
+    if download_watcher:
+        pending_cursor = min(int(jps_torrent_id) for jps_torrent_id in download_watcher.pending) - 1
+    else:
+        pending_cursor = torrent_ledger.cursor(recent_cursor_name)
+    if pending_cursor is not None:
+        torrent_ledger.set_cursor(f'{recent_cursor_name}-pending', pending_cursor)
+
+
+def new_batch_group_results() -> dict:
+    """
+    Return an empty batch_group_results{}, to which record_batch_group_data() adds:
+        batch_group_data: dict, multi dimensional dict contain group data of all uploads
+        batch_group_errors: dict, All JPS jps_group_ids where GetGroupData failed, with their jps_torrent_ids
+        batch_groups_excluded: list, All jps_group_ids that were excluded by the user, currently --exccategory
+        batch_groups_va_errors: list, jps_group_ids that were 'V.A.' torrents with no contrib artists set
+    """
+    return {
+        'batch_group_data': {},
+        'batch_group_errors': collections.defaultdict(list),
+        'batch_groups_excluded': [],
+        'batch_groups_va_errors': [],
+    }
+
+
+def retrieve_batch_group_data(jps_group_id: str, excluded_category: str) -> Tuple[str, str, Any]:
+    """
+    Run GetGroupData on a group, this is run by the worker threads of BatchGroupDataPool so it must not alter any shared state
+
+    :param jps_group_id: str
+    :param excluded_category: str, JPS Category name to be excluded
+    :return: jps_group_id, outcome and value, where outcome is one of:
+        'data' with the group data as the value,
+        'excluded' with the group data as the value, if the group is in excluded_category,
+        'va_error' if it is a 'V.A.' group with no contrib artists set, or
+        'error' with the exception as the value
+    """
+    try:
+        logger.info('-------------------------')
+        jps_group_id, jps_group_page_text = get_jps_group_page(f"https://jpopsuki.eu/torrents.php?id={jps_group_id}")
+        group_data = GetGroupData(jps_group_id, jps_group_page_text).all()
+    except Exception as exc:
+        # Catch all for any exception
+        va_no_contrib_artists_error = "V.A. torrent with to contrib artists set - torrent has no valid artists so this cannot be uploaded."
+        if str(exc) == va_no_contrib_artists_error:
+            logger.error(va_no_contrib_artists_error)
+            return jps_group_id, 'va_error', None
+        return jps_group_id, 'error', exc
+
+    if group_data["category"] == excluded_category:
+        logger.debug(f'Excluding jps_group_id {jps_group_id} as it is {group_data["category"]} group and these are being skipped')
+        return jps_group_id, 'excluded', group_data
+    return jps_group_id, 'data', group_data
+
+
+def record_batch_group_data(batch_group_results: dict, jps_torrent_ids: List[str], group_data_result: Tuple[str, str, Any]) -> None:
+    """
+    Store the result of retrieve_batch_group_data() in batch_group_results{}
+
+    :param batch_group_results: dict, see new_batch_group_results()
+    :param jps_torrent_ids: list, jps_torrent_ids of the group being uploaded
+    :param group_data_result: Tuple returned by retrieve_batch_group_data()
+    """
+    jps_group_id, outcome, value = group_data_result
+    if outcome in ('data', 'excluded'):
+        batch_group_results['batch_group_data'][jps_group_id] = value
+        if outcome == 'excluded':
+            batch_group_results['batch_groups_excluded'].append(jps_group_id)
+    elif outcome == 'va_error':
+        batch_group_results['batch_groups_va_errors'].append(jps_group_id)
+    else:
+        logger.opt(exception=value).error(
+            f'Error with retrieving group data for jps_group_id {jps_group_id} jps_torrent_id {",".join(jps_torrent_ids)}, skipping upload')
+        batch_group_results['batch_group_errors'][jps_group_id] = list(jps_torrent_ids)
 
 
-def get_batch_group_data(batch_uploads, excluded_category):
+class BatchGroupDataPool:
     """
-    Iterate through batch_uploads and run GetGroupData on each group and store the data in batch_group_data{}
+    Retrieve the data of JPS groups with a pool of worker threads, so that the requests and parsing of several groups overlap.
+    Every request is still paced by the shared JPS RateLimiter(), and the number of workers is set by GroupDataWorkers in
+    jps2sm.cfg, which defaults to 2.
+
+    Results are only returned by result(), so the caller records them into batch_group_results{} in its own order.
 
-    :param batch_uploads: dict, Contains jps_group_id: jps_torrent_id of all uploads
     :param excluded_category: str, JPS Category name to be excluded
-    :return batch_group_data: dict, multi dimensional dict contain group data of all uploads
-    :return batch_group_errors: list, All JPS jps_group_ids where GetGroupData failed
-    :return batch_groups_excluded: list, All jps_group_ids that were excluded by the user, currently --exccategory
-    :return batch_groups_va_errors: list, jps_group_ids that were 'V.A.' torrents with no contrib artists set
+    :param workers: int, number of worker threads
+    :param run_journal: RunJournal, groups already retrieved by the run are taken from it and groups retrieved are added to it
     """
 
-    batch_group_errors = collections.defaultdict(list)
-    batch_groups_excluded = []
-    batch_groups_va_errors = []
-    batch_group_data = {}
+    def __init__(self, excluded_category: str, workers: int, run_journal: Optional[RunJournal] = None):
+        self.excluded_category = excluded_category
+        self.workers = max(workers, 1)
+        self.run_journal = run_journal
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='jps-group-data')
+        self.futures: Dict[str, Future] = {}
+
+    def submit(self, jps_group_id: str) -> None:
+        """
+        Start retrieving the data of a group, unless it has already been submitted
+        """
+        if self.run_journal is not None and jps_group_id in self.run_journal.group_data_results:
+            return
+        if jps_group_id not in self.futures:
+            self.futures[jps_group_id] = self.executor.submit(retrieve_batch_group_data, jps_group_id, self.excluded_category)
+
+    def done(self, jps_group_id: str) -> bool:
+        """
+        Return True if the data of a submitted group has been retrieved
+        """
+        if self.run_journal is not None and jps_group_id in self.run_journal.group_data_results:
+            return True
+        return self.futures[jps_group_id].done()
+
+    def result(self, jps_group_id: str) -> Tuple[str, str, Any]:
+        """
+        Wait for and return the result of retrieve_batch_group_data() for a submitted group, journaling it unless it is an error
+        """
+        if self.run_journal is not None and jps_group_id in self.run_journal.group_data_results:
+            return self.run_journal.group_data_results[jps_group_id]
+
+        group_data_result = self.futures[jps_group_id].result()
+        if self.run_journal is not None and group_data_result[1] != 'error':
+            self.run_journal.record('group_data', group_data_result)
+        return group_data_result
+
+    def shutdown(self, cancel_pending: bool = False) -> None:
+        """
+        Stop the worker threads, after Ctrl-C cancel_pending is used to abandon the groups that have not been started yet
+
+        :param cancel_pending: bool
+        """
+        self.executor.shutdown(wait=not cancel_pending, cancel_futures=cancel_pending)
+
+
+def new_batch_torrent_info() -> dict:
+    """
+    Return an empty batch_torrent_info{}, the totals and lists of the outcomes that collate() returns for each torrent
+    """
+    return {
+        'skipped_torrents_max_size': 0,
+        'skipped_torrents_low_seeders': 0,
+        'jps_torrents_downloaded_count': 0,
+        'skipped_torrents_exc_filter': 0,
+        'skipped_torrents_duplicate': 0,
+        'dupe_jps_ids': [],
+        'dupe_sm_ids': [],
+        'dupe_sm_torrent_hashes': [],
+    }
+
+
+@dataclass
+class BatchRun:
+    """
+    A run of batch_mode() and the outcomes of its torrents, split into its stages:
+
+    process_listing() lists the torrents at JPS, retrieves the data of their groups and collates each torrent, uploading it unless
+    upload_immediately is False, upload_downloaded_torrents() uploads the torrents collated in recent mode once their files have
+    downloaded, and log_results() and batch_stats() report the outcomes.
+
+    :param run_journal: RunJournal of the run
+    :param download_watcher: DownloadWatcher of daemon_mode(), else the files of the torrents collated in recent mode are waited for
+    :param max_size: str: Maximum size of the torrents to upload, only in recent mode
+    :param upload_immediately: bool: Upload each torrent as soon as it is collated, rather than in upload_downloaded_torrents()
+    """
+    # Every outcome is reported by batch_stats() at the end of the run, so they are held together
+    # pylint: disable=too-many-instance-attributes
+    run_journal: RunJournal
+    download_watcher: Optional[DownloadWatcher] = None
+    max_size: Optional[str] = None
+    upload_immediately: bool = True
+    interrupted: bool = False
+    batch_uploads: Dict[str, List[str]] = field(default_factory=lambda: collections.defaultdict(list))
+    batch_group_results: dict = field(default_factory=new_batch_group_results)
+    batch_torrent_info: dict = field(default_factory=new_batch_torrent_info)
+    batch_collate_torrent_info: dict = field(default_factory=dict)
+    batch_upload_collate_errors: Dict[str, List[str]] = field(default_factory=lambda: collections.defaultdict(list))
+    batch_upload_source_data_not_found: list = field(default_factory=list)
+    batch_upload_mediainfo_not_submitted: int = 0
+    sm_upload_errors: int = 0
+    sm_torrents_uploaded_count: int = 0
+    ledger_skipped_torrents: int = 0
+    ledger_skipped_groups: set = field(default_factory=set)
+
+    def batch_stats(self, final_stats):
+        """
+        Return statistics from a batch upload.
+        If using --recent mode it returns initial statistics after JPS torrents have been scraped, followed by final_stats after the
+        SM upload.
+
+        TODO: Needs some cleaning up, but this is better than the stats being completely duplicated as it was before
+        """
+        args = GetArgs()
+        batch_torrent_info = self.batch_torrent_info
+        print(f'--------------------------------------------------------\nOverall stats:'
+              f'\nTorrents found at JPS: {count_values_dict(self.batch_uploads)}'
+              f'\nTorrents skipped as uploaded or duplicates in an earlier run: {self.ledger_skipped_torrents}'
+              f'\nJPS Group data errors: {count_values_dict(self.batch_group_results["batch_group_errors"])}'
+              f'\nJPS Groups excluded by user: {len(self.batch_group_results["batch_groups_excluded"])}'
+              f'\nJPS "V.A." Groups with no contributing artists: {len(self.batch_group_results["batch_groups_va_errors"])}'
+              f'\nJPS Release data errors: {count_values_dict(self.batch_upload_collate_errors)}'
+              f'\nTorrents skipped due to max_size filter: {batch_torrent_info["skipped_torrents_max_size"]}'
+              f'\nTorrents skipped due to low seeders: {batch_torrent_info["skipped_torrents_low_seeders"]}'
+              f'\nTorrents excluded by user: {batch_torrent_info["skipped_torrents_exc_filter"]}'
+              f'\nDuplicates found with torrent hash: {batch_torrent_info["skipped_torrents_duplicate"]}'
+              f'\nJPS Torrents downloaded: {batch_torrent_info["jps_torrents_downloaded_count"]}'
+              )
+        if final_stats:
+            if args.parsed.mediainfo:
+                print(f'MediaInfo source data missing: {len(self.batch_upload_source_data_not_found)}')
+            if not args.parsed.dryrun:
+                logger.info(f'MediaInfo not submitted errors (use \"--mediainfo\" to fix): {self.batch_upload_mediainfo_not_submitted}'
+                            f'\n\nSM upload errors: {self.sm_upload_errors}'
+                            f'\nNew uploads successfully created: {self.sm_torrents_uploaded_count}'
+                            )
+            for site, pool_stats in session_pool_stats().items():
+                print(f'{site.upper()} connections opened: {pool_stats["connections_opened"]}, '
+                      f'connections reused: {pool_stats["connections_reused"]}, logins performed: {pool_stats["logins"]}')
+            jps_rate_limiter = get_site_session('jps').rate_limiter
+            print(f'JPS requests made: {jps_rate_limiter.requests_made}, '
+                  f'time waited for the JPS browse quota: {jps_rate_limiter.time_waited / 60:.1f} minutes')
+            if (response_cache := GetResponseCache().response_cache()).disk_cache is not None:
+                print(f'JPS response cache: {response_cache.disk_cache.stats()}')
+            if args.parsed.mediainfo and (mediainfo_cache := GetMediainfoCache().mediainfo_cache()) is not None:
+                print(f'Mediainfo cache: {mediainfo_cache.stats()}')
+            print(f'Torrent ledger: {GetTorrentLedger().torrent_ledger().stats()}')
+
+    def process_listing(self, mode, user, start, end, sort, order, stop_at_torrent_id):
+        """
+        List the torrents at JPS and process each one as soon as it is found, whilst BatchGroupDataPool retrieves the data of
+        the groups of the next few torrents. See iter_batch_jps_group_torrent_ids() for the parameters.
+        """
+        # pylint: disable=too-many-arguments
+        args = GetArgs()
+        torrent_ledger = GetTorrentLedger().torrent_ledger()
+        group_data_pool = BatchGroupDataPool(args.parsed.exccategory, GetConfig().jps_group_data_workers, self.run_journal)
+        pending_torrents = collections.deque()  # (jps_group_id, jps_torrent_id) found at JPS but not processed yet, in listing order
+        groups_recorded = set()
 
-    for jps_group_id, jps_torrent_id in batch_uploads.items():
         try:
-            logger.info('-------------------------')
-            jps_group_id, jps_group_page_text = get_jps_group_page(f"https://jpopsuki.eu/torrents.php?id={jps_group_id}")
-            group_data_output = GetGroupData(jps_group_id, jps_group_page_text)
-            batch_group_data[jps_group_id] = {}
-            batch_group_data[jps_group_id] = group_data_output.all()
-
-            if batch_group_data[jps_group_id]["category"] == excluded_category:
-                logger.debug(
-                    f'Excluding jps_group_id {jps_group_id} as it is {batch_group_data[jps_group_id]["category"]} group and these are being skipped')
-                batch_groups_excluded.append(jps_group_id)
-                continue
+            for listing_torrent in iter_batch_jps_group_torrent_ids(mode=mode, user=user, first=start, last=end, sort=sort, order=order,
+                                                                    freeleech=args.parsed.freeleech_only, run_journal=self.run_journal,
+                                                                    stop_at_torrent_id=stop_at_torrent_id):
+                if self.skip_listing_torrent(listing_torrent):
+                    continue
+
+                group_data_pool.submit(listing_torrent.jps_group_id)
+                pending_torrents.append((listing_torrent.jps_group_id, listing_torrent.jps_torrent_id))
+
+                # Do not let the listing get too far ahead of the group data being retrieved
+                while pending_torrents and (group_data_pool.done(pending_torrents[0][0]) or len(pending_torrents) > 2 * group_data_pool.workers):
+                    self.process_pending_torrent(*pending_torrents.popleft(), group_data_pool, groups_recorded)
+
+            while pending_torrents:
+                self.process_pending_torrent(*pending_torrents.popleft(), group_data_pool, groups_recorded)
+        except KeyboardInterrupt:  # Allow Ctrl-C to stop processing and still show the error dicts and dupe list so far
+            self.upload_immediately = True  # Do not start uploading after Ctrl-C in recent mode
+            self.interrupted = True
+            group_data_pool.shutdown(cancel_pending=True)
+        else:
+            group_data_pool.shutdown()
+
+        # Each torrent skipped by the ledger saves downloading it from JPS and the SM hash check, and the group page is saved too if no
+        # other torrent of the group needed it
+        torrent_ledger.torrents_skipped += self.ledger_skipped_torrents
+        torrent_ledger.jps_requests_saved += self.ledger_skipped_torrents \
+            + len(self.ledger_skipped_groups - set(group_data_pool.futures) - set(self.run_journal.group_data_results)
+                  - set(self.batch_group_results['batch_groups_excluded']))
+        torrent_ledger.sm_requests_saved += self.ledger_skipped_torrents
+
+        logger.info(f'Found {count_values_dict(self.batch_uploads)} torrents at JPS')
+        logger.debug(f'jps_group_ids and jps_torrent_ids found on all pages: {dict(self.batch_uploads)}')
+
+    def skip_listing_torrent(self, listing_torrent: ListingTorrent) -> bool:
+        """
+        Add a torrent found at JPS to batch_uploads{} and return True if it is skipped before any request is made for it
+        """
+        args = GetArgs()
+        torrent_ledger = GetTorrentLedger().torrent_ledger()
+        jps_group_id, jps_torrent_id = listing_torrent.jps_group_id, listing_torrent.jps_torrent_id
+        if jps_torrent_id in self.batch_uploads[jps_group_id]:  # Torrents can be listed again on the next page if JPS changes whilst paging
+            return True
+        self.batch_uploads[jps_group_id].append(jps_torrent_id)
+        if self.download_watcher is not None and jps_torrent_id in self.download_watcher:  # Collated by an earlier run, waiting to be uploaded
+            return True
+
+        # Skip torrents uploaded, or found to be duplicates, by an earlier run before any request is made for them. The torrents
+        # collated by the interrupted run being resumed are left to the journal.
+        if not args.parsed.reprocess and jps_torrent_id not in self.run_journal.collate_results \
+                and (ledger_outcome := torrent_ledger.final_outcome(jps_torrent_id)):
+            logger.debug(f'Skipping jps_torrent_id {jps_torrent_id} of jps_group_id {jps_group_id} as the ledger records it as '
+                         f'{ledger_outcome} by an earlier run')
+            self.ledger_skipped_torrents += 1
+            self.ledger_skipped_groups.add(jps_group_id)
+            return True
+
+        # Skip torrents before their group page is requested if the filters can be decided from the page of torrents
+        if listing_filter := decide_listing_filter(listing_torrent, args.parsed.exccategory, self.max_size):
+            logger.debug(f'Skipping jps_torrent_id {jps_torrent_id} of jps_group_id {jps_group_id} from the page of torrents: {listing_filter}')
+            if listing_filter == 'batch_groups_excluded':
+                if jps_group_id not in self.batch_group_results['batch_groups_excluded']:
+                    self.batch_group_results['batch_groups_excluded'].append(jps_group_id)
+            else:
+                self.batch_torrent_info[listing_filter] += 1
+            torrent_ledger.record(jps_group_id, jps_torrent_id, 'filtered', detail=listing_filter)
+            return True
+
+        return False
+
+    def process_pending_torrent(self, jps_group_id, jps_torrent_id, group_data_pool, groups_recorded):
+        """
+        Collate, and upload if upload_immediately, a torrent listed by process_listing() once the data of its group is retrieved
+
+        :param group_data_pool: BatchGroupDataPool the group has been submitted to
+        :param groups_recorded: set of the jps_group_ids whose data has been recorded into batch_group_results{} so far
+        """
+        if jps_group_id not in groups_recorded:
+            record_batch_group_data(self.batch_group_results, [jps_torrent_id], group_data_pool.result(jps_group_id))
+            groups_recorded.add(jps_group_id)
+        elif jps_group_id in self.batch_group_results['batch_group_errors']:
+            self.batch_group_results['batch_group_errors'][jps_group_id].append(jps_torrent_id)
+
+        for group_result, outcome in (('batch_group_errors', 'error'), ('batch_groups_excluded', 'filtered'), ('batch_groups_va_errors', 'error')):
+            if jps_group_id in self.batch_group_results[group_result]:
+                # Skip group if GetGroupData() failed or the group is being excluded by the '-exc' parameter, or if it is a 'V.A.' group
+                # and no contrib artists were set
+                GetTorrentLedger().torrent_ledger().record(jps_group_id, jps_torrent_id, outcome, detail=group_result)
+                return
+
+        self.collate_group_torrent(jps_group_id, jps_torrent_id)
+        if self.upload_immediately and jps_torrent_id in self.batch_collate_torrent_info:
+            self.upload_collated_torrent(jps_torrent_id, self.batch_collate_torrent_info[jps_torrent_id])
+
+    def collate_group_torrent(self, jps_group_id, jps_torrent_id):
+        """
+        Collate a torrent of a group whose group data has been retrieved, adding it to batch_collate_torrent_info{}. A torrent
+        collated by the interrupted run being resumed is taken from the journal.
+        """
+        torrent_ledger = GetTorrentLedger().torrent_ledger()
+        jps_group_data = get_jps_group_data_class(self.batch_group_results['batch_group_data'], jps_group_id)
+
+        try:
+            if (collate_torrent_info := self.run_journal.collate_result(jps_torrent_id, jps_group_data)) is None:
+                collate_torrent_info = collate(torrentids=[jps_torrent_id], torrentgroupdata=jps_group_data, max_size=self.max_size,
+                                               torrent_ledger=torrent_ledger)
+                record_collate_outcomes(torrent_ledger, jps_group_id, [jps_torrent_id], collate_torrent_info)
+                self.run_journal.record('collate', jps_group_id, jps_torrent_id, collate_torrent_info)
+            #logger.debug(f'collate_torrent_info: {json.dumps(collate_torrent_info, indent=2)}')
+            for collate_result_item, value in collate_torrent_info.items():
+                if isinstance(value, int):
+                    self.batch_torrent_info[collate_result_item] += value
+                elif isinstance(value, list):
+                    for item in value:
+                        self.batch_torrent_info[collate_result_item].append(item)
+                elif isinstance(value, dict):
+                    if collate_result_item != "jps_torrent_collated_data":
+                        raise RuntimeError('Expected only a dict with a parent dicts value of jps_torrent_collated_data')
+                    for collated_jps_torrent_id, collated_data in collate_torrent_info['jps_torrent_collated_data'].items():
+                        self.batch_collate_torrent_info[collated_jps_torrent_id] = {
+                            key: collated_data[key] for key in ('jps_torrent_object', 'torrentgroupdata', 'release_data_collated', 'sm_torrent_hash')
+                        }
+                else:
+                    raise RuntimeError('Expected either int, list or dict in collate_torrent_info.items() from collate()')
         except KeyboardInterrupt:  # Allow Ctrl-C to exit without showing the error multiple times and polluting the final error dict
-            break  # Still continue to get error dicts and dupe list so far
+            raise
         except Exception as exc:
-            # Catch all for any exception
-            va_no_contrib_artists_error = "V.A. torrent with to contrib artists set - torrent has no valid artists so this cannot be uploaded."
-            if str(exc) == va_no_contrib_artists_error:
-                logger.error(va_no_contrib_artists_error)
-                batch_groups_va_errors.append(jps_group_id)
-                continue
-            logger.exception(
-                f'Error with retrieving group data for jps_group_id {jps_group_id} jps_torrent_id {",".join(jps_torrent_id)}, skipping upload')
-            batch_group_errors[jps_group_id] = jps_torrent_id
-            continue
+            # Catch all for any collate() exception
+            logger.exception(f'Error with collating/retrieving release data for JPS group id'
+                             f'{jps_group_id} torrentid(s) {jps_torrent_id}, skipping upload')
+            self.batch_upload_collate_errors[jps_group_id].append(jps_torrent_id)
+            torrent_ledger.record(jps_group_id, jps_torrent_id, 'error', detail=str(exc))
 
-    batch_group_results = {
-        'batch_group_data': batch_group_data,
-        'batch_group_errors': batch_group_errors,
-        'batch_groups_excluded': batch_groups_excluded,
-        'batch_groups_va_errors': batch_groups_va_errors,
-    }
+    def upload_collated_torrent(self, jps_torrent_id, collate_torrent_info):
+        """
+        Prepare a collated torrent and upload it to SM
+        """
+        args = GetArgs()
+        torrent_ledger = GetTorrentLedger().torrent_ledger()
+        jps_group_id = collate_torrent_info['torrentgroupdata'].groupid
+        if jps_torrent_id in self.run_journal.uploaded:  # Uploaded by the interrupted run being resumed
+            self.sm_torrents_uploaded_count += 1
+            return
+        try:
+            sugoimusic_upload_data = prepare_torrent(jps_torrent_object=collate_torrent_info['jps_torrent_object'],
+                                                     torrent_group_data=collate_torrent_info['torrentgroupdata'],
+                                                     mediainfo=args.parsed.mediainfo,
+                                                     release_data_collated=collate_torrent_info['release_data_collated'])
+        except KeyboardInterrupt:  # Allow Ctrl-C to exit without showing the error multiple times and polluting the final error dict
+            raise
+        except Exception as exc:
+            # TODO These should all be custom exceptions
+            if str(exc).startswith('Mediainfo error - file/directory not found'):
+                # Need to get filename that was not found
+                missing_file = re.findall(r'Mediainfo error - file/directory not found: (.+) in any of the MediaDirectories', str(exc))
+                self.batch_upload_source_data_not_found.append(missing_file)
+            elif str(exc).startswith('You do not appear to have entered any MediaInfo data for your video upload.'):
+                self.batch_upload_mediainfo_not_submitted += 1
+            else:
+                logger.exception(exc)
+            torrent_ledger.record(jps_group_id, jps_torrent_id, 'error', detail=str(exc))
+            return
+        if not args.parsed.dryrun:
+            try:
+                upload_torrent(sugoimusic_upload_data, collate_torrent_info['jps_torrent_object'])
+            except Exception as exc:
+                # Catch all for any upload_torrent() exception
+                logger.exception(f"SM upload error with JPS torrent id {jps_torrent_id} - {collate_torrent_info['torrentgroupdata'].title} - {exc}")
+                self.sm_upload_errors += 1
+                torrent_ledger.record(jps_group_id, jps_torrent_id, 'error', detail=str(exc))
+                return
+            torrent_ledger.record(jps_group_id, jps_torrent_id, 'uploaded', sm_torrent_hash=collate_torrent_info['sm_torrent_hash'])
+            self.run_journal.record('uploaded', jps_torrent_id)
+            set_original_artists(collate_torrent_info['torrentgroupdata'].contribartists)
+            self.sm_torrents_uploaded_count += 1
+
+    def upload_downloaded_torrents(self):
+        """
+        Upload the torrents collated in recent mode as soon as their files have downloaded into the MediaDirectories, the daemon
+        uploads the torrents that are still downloading at a later run instead of waiting for them. Then download the SM torrents
+        of every torrent uploaded by the run.
+        """
+        args = GetArgs()
+        if not self.upload_immediately:
+            download_watcher = self.download_watcher
+            waiting_for_downloads = download_watcher is None
+            if waiting_for_downloads:
+                download_watcher = new_download_watcher()
+            for jps_torrent_id, collate_torrent_info in self.batch_collate_torrent_info.items():
+                download_watcher.add(jps_torrent_id, [collate_torrent_info['jps_torrent_object']], collate_torrent_info)
+
+            try:
+                if waiting_for_downloads:
+                    logger.info('Interim stats')
+                    self.batch_stats(final_stats=False)
+                    print(f'Waiting up to {GetConfig().download_timeout_mins:g} minutes for the files of each torrent to download, '
+                          f'or press Ctrl-C to continue immediately...')
+                    downloaded_torrents = download_watcher.wait()
+                else:
+                    downloaded_torrents = download_watcher.ready()
+                for jps_torrent_id, collate_torrent_info, _ in downloaded_torrents:
+                    self.upload_collated_torrent(jps_torrent_id, collate_torrent_info)
+            except KeyboardInterrupt:  # Allow Ctrl-C to exit without showing the error multiple times and polluting the final error dict
+                self.interrupted = True  # Still continue to get error dicts and dupe list so far
+
+        if not args.parsed.dryrun and self.sm_torrents_uploaded_count:
+            download_sm_uploaded_torrents(torrent_count=self.sm_torrents_uploaded_count)
 
-    return batch_group_results
+    def log_results(self):
+        """
+        Log the groups and torrents of the run that had errors or were skipped, so that they can be retried or cross seeded
+        """
+        batch_group_results = self.batch_group_results
+        if batch_group_results['batch_group_errors']:
+            logger.error('The following JPS groupid(s) (torrentid(s) shown for reference) had errors in retrieving group data, '
+                         'keep this data safe and you can possibly retry with it in a later version:')
+            logger.error(batch_group_results['batch_group_errors'])
+            logger.error(f'Total: {count_values_dict(batch_group_results["batch_group_errors"])}')
+        if batch_group_results['batch_groups_excluded']:
+            logger.info('The following groups were excluded due to user-specified filters:')
+            logger.info(f'{batch_group_results["batch_groups_excluded"]}\nTotal: {len(batch_group_results["batch_groups_excluded"])}')
+        if batch_group_results['batch_groups_va_errors']:
+            logger.warning('The following JPS groupid(s) were "bad V.A." groups - they are Various Artist groups with the artist set as "V.A." and'
+                           ' the contributing artists should be set as the actual list of artists, however these are missing:')
+            logger.warning(batch_group_results['batch_groups_va_errors'])
+            logger.warning(f'Total: {len(batch_group_results["batch_groups_va_errors"])}')
+        if self.batch_upload_collate_errors:
+            logger.error('The following JPS groupid(s) and corresponding torrentid(s) had errors either in collating/retrieving '
+                         'release data or in performing the actual upload to SM (although group data was retrieved OK), '
+                         'keep this data safe and you can possibly retry with it in a later version:')
+            logger.error(self.batch_upload_collate_errors)
+            logger.error(f'Total: {count_values_dict(self.batch_upload_collate_errors)}')
+        if self.batch_torrent_info['dupe_sm_ids']:  # Dupes found by decide_duplicate()
+            logger.warning('The following torrents have already been uploaded to the site, '
+                           'and were found by searching for the torrent hash on SM, the SM torrents were download so you can cross seed:')
+            logger.warning(f'SM duplicate torrent ids: {self.batch_torrent_info["dupe_sm_ids"]}'
+                           f'\nJPS duplicate torrent ids: {self.batch_torrent_info["dupe_jps_ids"]}'
+                           f'\nTotal: {len(self.batch_torrent_info["dupe_sm_ids"])}')
+        if self.batch_upload_source_data_not_found:
+            logger.error('The following file(s)/dir(s) were not found in your MediaDirectories specified in jps2sm.cfg and the upload was skipped:')
+            logger.error(self.batch_upload_source_data_not_found)
+            logger.error(f'Total: {len(self.batch_upload_source_data_not_found)}')
@@ -0,0 +1,256 @@
+"""
+On-disk caches used to avoid repeating work between runs
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+# Third-party packages
+import requests
+from requests.structures import CaseInsensitiveDict
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.constants import ResponseCacheTTLs
+from jps2sm.utils import GetArgs, GetConfig, get_state_dir
+
+
+class DiskCache:
+    """
+    Compressed on-disk cache. Each value is stored in a file named after the SHA-256 of its key, and once the cache is larger
+    than max_size_bytes the least recently used files are evicted.
+
+    :param cache_dir: Path: Directory to store the cache in
+    :param max_size_bytes: int: Maximum size of the cache on disk
+    """
+
+    def __init__(self, cache_dir: Path, max_size_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size_bytes = sum(cache_file.stat().st_size for cache_file in self.cache_files())
+
+    def cache_files(self):
+        """
+        Return all files in the cache
+        """
+        return self.cache_dir.glob('*/*.cache')
+
+    def key_path(self, key: str) -> Path:
+        """
+        Return the path of the file storing key
+        """
+        key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return Path(self.cache_dir, key_hash[:2], f'{key_hash}.cache')
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        Return the value stored for key and the time it was stored, or None if it is not cached
+
+        :param key: str
+        """
+        key_path = self.key_path(key)
+        try:
+            with open(key_path, "rb") as cache_file:
+                stored_time, value = pickle.loads(zlib.decompress(cache_file.read()))
+        except (FileNotFoundError, zlib.error, pickle.UnpicklingError, EOFError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:  # set() of another thread cannot evict the file whilst it is marked as recently used
+            try:
+                os.utime(key_path)  # Mark as recently used
+            except FileNotFoundError:  # Evicted since it was read
+                self.misses += 1
+                return None
+            self.hits += 1
+        return value, stored_time
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store value for key, evicting the least recently used values if the cache is too large
+
+        :param key: str
+        :param value: Any picklable value
+        """
+        key_path = self.key_path(key)
+        data = zlib.compress(pickle.dumps((time.time(), value)))
+        key_path.parent.mkdir(exist_ok=True)
+
+        with self.lock:
+            if key_path.exists():
+                self.size_bytes -= key_path.stat().st_size
+            with open(key_path, "wb") as cache_file:
+                cache_file.write(data)
+            self.size_bytes += len(data)
+
+            if self.size_bytes > self.max_size_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used files until the cache is 90% of max_size_bytes, the lock must be held by the caller
+        """
+        for cache_file in sorted(self.cache_files(), key=lambda cache_file: cache_file.stat().st_mtime):
+            if self.size_bytes <= self.max_size_bytes * 0.9:
+                break
+            self.size_bytes -= cache_file.stat().st_size
+            cache_file.unlink()
+            logger.trace(f'Evicted {cache_file} from cache')
+
+    def stats(self) -> str:
+        """
+        Return the hit/miss statistics of the cache
+        """
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups else 0
+        return f'{self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), {self.size_bytes / 1024 / 1024:.1f} MiB on disk'
+
+
+class ResponseCache:
+    """
+    Cache responses from JPS pages that rarely change, with a TTL for each type of page defined in ResponseCacheTTLs.
+
+    :param disk_cache: DiskCache to store the responses in
+    :param cache_mode: str: One of:
+        'off' to not use the cache,
+        'read-write' to use cached responses and cache new responses,
+        'read-only' to use cached responses but never cache new responses and
+        'refresh' to never use cached responses but cache new responses
+    """
+
+    def __init__(self, disk_cache: Optional[DiskCache], cache_mode: str):
+        self.disk_cache = disk_cache
+        self.cache_mode = cache_mode
+
+    @staticmethod
+    def get_ttl(url: str) -> Optional[int]:
+        """
+        Return the TTL in seconds for url, or None if url should not be cached
+        """
+        for url_pattern, ttl_hours in ResponseCacheTTLs.url_patterns.items():
+            if re.search(url_pattern, url):
+                return ttl_hours * 60 * 60
+        return None
+
+    def get(self, url: str) -> Optional[requests.Response]:
+        """
+        Return the cached response for url, or None if it is not cached, has expired or the cache is not being read
+
+        :param url: str
+        """
+        if self.cache_mode not in ('read-write', 'read-only') or (ttl := self.get_ttl(url)) is None:
+            return None
+
+        if (cached := self.disk_cache.get(url)) is None:
+            return None
+
+        cached_response, stored_time = cached
+        if time.time() - stored_time > ttl:
+            self.disk_cache.hits -= 1  # An expired response is a miss
+            self.disk_cache.misses += 1
+            return None
+
+        res = requests.Response()
+        res.status_code = cached_response['status_code']
+        res.url = cached_response['url']
+        res.encoding = cached_response['encoding']
+        res.headers = CaseInsensitiveDict(cached_response['headers'])
+        res._content = cached_response['content']  # pylint: disable=protected-access
+        logger.trace(f'Using cached response for {url}')
+        return res
+
+    def set(self, url: str, res: requests.Response) -> None:
+        """
+        Cache res for url if it is a successful response for a cacheable url and the cache is being written to
+
+        :param url: str
+        :param res: requests response
+        """
+        if self.cache_mode not in ('read-write', 'refresh') or self.get_ttl(url) is None or res.status_code != 200:
+            return
+        if any(error_string.encode() in res.content for error_string in ResponseCacheTTLs.error_strings):
+            return
+
+        self.disk_cache.set(url, {
+            'status_code': res.status_code,
+            'url': res.url,
+            'encoding': res.encoding,
+            'headers': dict(res.headers),
+            'content': res.content,
+        })
+
+
+class GetResponseCache:
+    """
+    Implement the JPS ResponseCache as a singleton, configured by --cache-mode and jps2sm.cfg
+    """
+
+    __response_cache = None
+    __response_cache_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        with GetResponseCache.__response_cache_lock:
+            if GetResponseCache.__response_cache is None:
+                args = GetArgs()
+                config = GetConfig()
+                disk_cache = None
+                # Every response must reach the session layer when recording, else it would be missing from the cassette. The
+                # responses of the fake sites of --load-test would be cached under the urls of the real JPS.
+                cache_mode = 'off' if args.parsed.record or args.parsed.load_test else args.parsed.cache_mode
+                if cache_mode != 'off':
+                    disk_cache = DiskCache(Path(get_state_dir(), 'http-cache'), config.cache_max_size_mb * 1024 * 1024)
+                GetResponseCache.__response_cache = ResponseCache(disk_cache, cache_mode)
+
+    def response_cache(self) -> ResponseCache:
+        """
+        Return singleton JPS ResponseCache
+        """
+        return GetResponseCache.__response_cache
+
+
+class GetMediainfoCache:
+    """
+    Implement the cache of get_mediainfo() results as a singleton DiskCache, configured by MediainfoCacheMaxSizeMB in jps2sm.cfg.
+    A result is keyed by the path, size and mtime of each file it was analysed from, so it is always used while the files are unchanged.
+    """
+
+    __mediainfo_cache = None
+    __mediainfo_cache_lock = threading.Lock()
+    __mediainfo_cache_created = False
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        with GetMediainfoCache.__mediainfo_cache_lock:
+            if not GetMediainfoCache.__mediainfo_cache_created:
+                config = GetConfig()
+                if config.mediainfo_cache_max_size_mb > 0:
+                    GetMediainfoCache.__mediainfo_cache = DiskCache(Path(get_state_dir(), 'mediainfo-cache'),
+                                                                    config.mediainfo_cache_max_size_mb * 1024 * 1024)
+                GetMediainfoCache.__mediainfo_cache_created = True
+
+    def mediainfo_cache(self) -> Optional[DiskCache]:
+        """
+        Return singleton DiskCache of get_mediainfo() results, or None if MediainfoCacheMaxSizeMB is 0
+        """
+        return GetMediainfoCache.__mediainfo_cache
@@ -0,0 +1,162 @@
+"""
+Record and replay every request made to JPS and SM, for deterministic offline runs and benchmarks
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import collections
+import datetime
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+# Third-party packages
+import requests
+from requests.structures import CaseInsensitiveDict
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.utils import GetArgs
+
+
+class Cassette:
+    """
+    Record every request/response pair to cassette_dir, or replay them from it without any network access.
+
+    The cassette is an index.jsonl file with one line of metadata per response, plus a file with the content of each response
+    in the responses directory. When replaying, responses to identical requests are served in the order they were recorded,
+    and the last one is served again once they have all been used.
+
+    :param cassette_dir: Path: Directory of the cassette
+    :param mode: str: 'record' or 'replay'
+    :param latency: None for no simulated latency when replaying, 'recorded' to wait for as long as the original request took
+                    or a float of seconds to wait for every request
+    """
+
+    def __init__(self, cassette_dir: Path, mode: str, latency: Union[None, str, float] = None):
+        self.cassette_dir = cassette_dir
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.index_file = Path(cassette_dir, 'index.jsonl')
+        self.responses_dir = Path(cassette_dir, 'responses')
+        self.recorded = collections.defaultdict(list)
+        self.replay_positions = collections.defaultdict(int)
+        self.response_count = 0
+
+        if mode == 'record':
+            self.responses_dir.mkdir(parents=True, exist_ok=True)
+            self.index_file.unlink(missing_ok=True)
+        elif mode == 'replay':
+            self.load_index()
+        else:
+            raise RuntimeError(f'Unknown cassette mode {mode}')
+
+    def load_index(self) -> None:
+        """
+        Load the index of a recorded cassette
+        """
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as index_file:
+                for line in index_file:
+                    entry = json.loads(line)
+                    self.recorded[entry['key']].append(entry)
+                    self.response_count += 1
+        except FileNotFoundError as exc:
+            raise RuntimeError(f'No cassette found in {self.cassette_dir}, record one first with --record') from exc
+
+        logger.debug(f'Loaded {self.response_count} recorded responses from {self.cassette_dir}')
+
+    @staticmethod
+    def request_key(method: str, url: str, post_data: Optional[Dict]) -> str:
+        """
+        Return the key identifying a request, post_data is included as the same url can be posted different data
+        """
+        post_data_hash = hashlib.sha1(json.dumps(post_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return f'{method.upper()} {url} {post_data_hash}'
+
+    def record(self, method: str, url: str, post_data: Optional[Dict], res: requests.Response) -> None:
+        """
+        Add the response res of a request to the cassette
+        """
+        with self.lock:
+            self.response_count += 1
+            response_file = f'{self.response_count:06d}.body'
+            with open(Path(self.responses_dir, response_file), "wb") as file:
+                file.write(res.content)
+
+            entry = {
+                'key': self.request_key(method, url, post_data),
+                'method': method.upper(),
+                'url': url,
+                'response_file': response_file,
+                'status_code': res.status_code,
+                'final_url': res.url,
+                'encoding': res.encoding,
+                'headers': dict(res.headers),
+                'elapsed': res.elapsed.total_seconds(),
+            }
+            with open(self.index_file, "a", encoding="utf-8") as index_file:
+                index_file.write(json.dumps(entry) + '\n')
+
+    def replay(self, method: str, url: str, post_data: Optional[Dict]) -> requests.Response:
+        """
+        Return the recorded response for a request, simulating latency if required
+        """
+        key = self.request_key(method, url, post_data)
+        with self.lock:
+            if not (entries := self.recorded.get(key)):
+                raise RuntimeError(f'No recorded response in cassette {self.cassette_dir} for {method.upper()} {url}')
+            entry = entries[min(self.replay_positions[key], len(entries) - 1)]
+            self.replay_positions[key] += 1
+
+        if self.latency == 'recorded':
+            time.sleep(entry['elapsed'])
+        elif self.latency:
+            time.sleep(float(self.latency))
+
+        res = requests.Response()
+        res.status_code = entry['status_code']
+        res.url = entry['final_url']
+        res.encoding = entry['encoding']
+        res.headers = CaseInsensitiveDict(entry['headers'])
+        res.elapsed = datetime.timedelta(seconds=entry['elapsed'])
+        with open(Path(self.responses_dir, entry['response_file']), "rb") as file:
+            res._content = file.read()  # pylint: disable=protected-access
+
+        return res
+
+
+class GetCassette:
+    """
+    Implement the Cassette set by --record or --replay as a singleton
+    """
+
+    __cassette = None
+    __cassette_handled = False
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        if GetCassette.__cassette_handled:
+            return
+
+        args = GetArgs()
+        if args.parsed.record:
+            GetCassette.__cassette = Cassette(Path(args.parsed.record), 'record')
+            logger.info(f'Recording all requests to {args.parsed.record}')
+        elif args.parsed.replay:
+            GetCassette.__cassette = Cassette(Path(args.parsed.replay), 'replay', args.parsed.replay_latency)
+            logger.info(f'Replaying all requests from {args.parsed.replay}')
+        GetCassette.__cassette_handled = True
+
+    def cassette(self) -> Optional[Cassette]:
+        """
+        Return singleton Cassette, or None if requests are not being recorded or replayed
+        """
+        return GetCassette.__cassette
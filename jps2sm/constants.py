@@ -102,6 +102,25 @@ class LoginParameters:
     sm_test_url = "https://sugoimusic.me/"
     sm_success = "Enabled users"
 
+    jps_quota_exceeded = '<title>Browse quota exceeded :: JPopsuki 2.0</title>'
+
+
+class ResponseCacheTTLs:
+    """
+    Store which JPS pages are cached by ResponseCache and for how long
+    """
+
+    # key: regex matching the url
+    # value: TTL in hours
+    url_patterns = {
+        r'torrents\.php\?id=\d+$': 12,  # Group page, seeders are used by filters so this cannot be cached too long
+        r'torrents\.php\?action=editgroup&groupid=\d+$': 7 * 24,  # Group description
+        r'artist\.php\?name=': 7 * 24,  # Artist page, used for category validation
+    }
+
+    # Error pages that JPS returns with a HTTP 200 status that must never be cached
+    error_strings = ('Database error.', 'Torrent not found')
+
 
 class DateRegexes:
     """
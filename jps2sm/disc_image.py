@@ -0,0 +1,483 @@
+"""
+Read the files of DVD and Bluray disc images in place, so that mediainfo can analyse them without extracting the image
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import io
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+# Third-party packages
+from loguru import logger
+
+SECTOR_SIZE = 2048
+UDF_ANCHOR_SECTOR = 256
+MPLS_TICKS_PER_MS = 45  # IN_time and OUT_time of playlist items are in 45 kHz ticks
+
+
+@dataclass(frozen=True)
+class DiscImageFile:
+    """
+    A file within a disc image, as the extents it occupies in the image
+
+    :param image_path: str: Path of the disc image
+    :param path: str: Path of the file within the image, eg. VIDEO_TS/VTS_01_1.VOB
+    :param extents: Tuple of (offset in the image, length) of each extent of the file, in order
+    """
+    image_path: str
+    path: str
+    extents: Tuple[Tuple[int, int], ...]
+
+    @property
+    def size(self) -> int:
+        """
+        Size of the file in bytes
+        """
+        return sum(length for _, length in self.extents)
+
+    @property
+    def suffix(self) -> str:
+        """
+        Extension of the file, as Path.suffix
+        """
+        return Path(self.path).suffix
+
+
+class DiscImageFileReader(io.RawIOBase):
+    """
+    Read-only, seekable file object of a DiscImageFile, reading its extents from the image in place
+
+    :param image_file: Disc image opened in binary mode
+    :param disc_image_file: DiscImageFile to read
+    """
+
+    def __init__(self, image_file: BinaryIO, disc_image_file: DiscImageFile):
+        super().__init__()
+        self.image_file = image_file
+        self.extents = disc_image_file.extents
+        self.size = disc_image_file.size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            self.position = offset
+        elif whence == os.SEEK_CUR:
+            self.position += offset
+        elif whence == os.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence {whence}')
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        bytes_read = 0
+        extent_start = 0
+        for extent_offset, extent_length in self.extents:
+            # Read from each extent that the position is in until the buffer is full, so reads span the extents of the file
+            if bytes_read < len(buffer) and extent_start <= self.position < extent_start + extent_length:
+                length = min(len(buffer) - bytes_read, extent_start + extent_length - self.position)
+                self.image_file.seek(extent_offset + self.position - extent_start)
+                data = self.image_file.read(length)
+                buffer[bytes_read:bytes_read + len(data)] = data
+                bytes_read += len(data)
+                self.position += len(data)
+                if len(data) < length:  # The image is truncated
+                    break
+            extent_start += extent_length
+
+        return bytes_read
+
+
+def list_iso9660_files(image_path: Union[str, Path]) -> List[DiscImageFile]:
+    """
+    List every file in the ISO 9660 file system of a disc image, by reading its directory table. DVD-Video images are ISO 9660
+    and UDF bridge discs, so the ISO 9660 file system has the same VIDEO_TS files as the UDF one.
+
+    :param image_path: Path of the disc image
+    :return: list of DiscImageFile
+    """
+    image_files = []
+    with open(image_path, "rb") as image_file:
+        # The volume descriptors start at sector 16, the primary volume descriptor holds the directory record of the root directory
+        sector = 16
+        while True:
+            image_file.seek(sector * SECTOR_SIZE)
+            volume_descriptor = image_file.read(SECTOR_SIZE)
+            if len(volume_descriptor) < SECTOR_SIZE or volume_descriptor[1:6] != b'CD001' or volume_descriptor[0] == 255:
+                raise RuntimeError(f'{image_path} does not have an ISO 9660 file system')
+            if volume_descriptor[0] == 1:
+                break
+            sector += 1
+
+        root_extent, root_length = struct.unpack_from('<I4xI', volume_descriptor, 156 + 2)
+        directories = [('', root_extent, root_length)]
+        visited_extents = set()
+        while directories:
+            directory_path, directory_extent, directory_length = directories.pop()
+            if directory_extent in visited_extents:  # Guard against a directory that loops back to a parent
+                continue
+            visited_extents.add(directory_extent)
+            image_file.seek(directory_extent * SECTOR_SIZE)
+            directory_data = image_file.read(directory_length)
+
+            offset = 0
+            multi_extent_extents = []
+            while offset < len(directory_data):
+                record_length = directory_data[offset]
+                if record_length == 0:  # Records do not cross sectors, the rest of the sector is padding
+                    offset = (offset // SECTOR_SIZE + 1) * SECTOR_SIZE
+                    continue
+                extent, data_length = struct.unpack_from('<I4xI', directory_data, offset + 2)
+                flags = directory_data[offset + 25]
+                name_length = directory_data[offset + 32]
+                name = directory_data[offset + 33:offset + 33 + name_length]
+                offset += record_length
+
+                if name in (b'\x00', b'\x01'):  # . and ..
+                    continue
+                name = name.decode('ascii', errors='replace').split(';')[0].rstrip('.')
+                path = f'{directory_path}/{name}' if directory_path else name
+                if flags & 0x02:
+                    directories.append((path, extent, data_length))
+                    continue
+                # Files larger than 4 GiB are recorded as several extents, all but the last flagged as continuing
+                multi_extent_extents.append((extent * SECTOR_SIZE, data_length))
+                if not flags & 0x80:
+                    image_files.append(DiscImageFile(str(image_path), path, tuple(multi_extent_extents)))
+                    multi_extent_extents = []
+
+    logger.debug(f'{len(image_files)} files found in the ISO 9660 file system of {image_path}')
+    return image_files
+
+
+class UdfFileSystem:
+    """
+    The UDF file system of a disc image, as written to Bluray discs (UDF 2.50, with a metadata partition) and DVDs (UDF 1.02).
+    Only what is needed to list the files and locate their data is read, so checksums and CRCs of descriptors are not checked.
+
+    :param image_file: Disc image opened in binary mode
+    :param image_path: Path of the disc image
+    """
+
+    def __init__(self, image_file: BinaryIO, image_path: Union[str, Path]):
+        self.image_file = image_file
+        self.image_path = str(image_path)
+        # Sector of the start of each partition, keyed by partition number
+        self.partition_starts: Dict[int, int] = {}
+        # Partition number of each partition reference number used by allocation descriptors, and the extents of the metadata
+        # file in the physical partition for a metadata partition
+        self.partition_maps: List[Tuple[int, Optional[List[Tuple[int, int]]]]] = []
+
+        anchor = self.read_sectors(UDF_ANCHOR_SECTOR, 1)
+        if self.tag_identifier(anchor) != 2:
+            raise RuntimeError(f'{image_path} does not have a UDF file system')
+        vds_length, vds_sector = struct.unpack_from('<II', anchor, 16)
+
+        # Volume descriptor sequence
+        logical_volume_descriptor = None
+        for sector in range(vds_sector, vds_sector + vds_length // SECTOR_SIZE):
+            descriptor = self.read_sectors(sector, 1)
+            tag_identifier = self.tag_identifier(descriptor)
+            if tag_identifier == 5:  # Partition descriptor
+                partition_number, = struct.unpack_from('<H', descriptor, 22)
+                self.partition_starts[partition_number], = struct.unpack_from('<I', descriptor, 188)
+            elif tag_identifier == 6:  # Logical volume descriptor
+                logical_volume_descriptor = descriptor
+            elif tag_identifier in (0, 8):  # Terminating descriptor, or the end of a sequence without one
+                break
+        if logical_volume_descriptor is None or not self.partition_starts:
+            raise RuntimeError(f'{image_path} has an incomplete UDF volume descriptor sequence')
+        logical_block_size, = struct.unpack_from('<I', logical_volume_descriptor, 212)
+        if logical_block_size != SECTOR_SIZE:
+            raise RuntimeError(f'{image_path} has an unsupported UDF logical block size of {logical_block_size}')
+        self.file_set_descriptor_location = struct.unpack_from('<IH', logical_volume_descriptor, 252)
+
+        partition_map_count, = struct.unpack_from('<I', logical_volume_descriptor, 268)
+        offset = 440
+        metadata_partitions = []
+        for _ in range(partition_map_count):
+            map_type, map_length = logical_volume_descriptor[offset], logical_volume_descriptor[offset + 1]
+            if map_type == 1:
+                partition_number, = struct.unpack_from('<H', logical_volume_descriptor, offset + 4)
+                self.partition_maps.append((partition_number, None))
+            elif map_type == 2 and logical_volume_descriptor[offset + 5:offset + 28].rstrip(b'\x00') == b'*UDF Metadata Partition':
+                partition_number, metadata_file_block = struct.unpack_from('<HI', logical_volume_descriptor, offset + 38)
+                metadata_partitions.append((len(self.partition_maps), metadata_file_block))
+                self.partition_maps.append((partition_number, []))
+            elif map_type == 2 and logical_volume_descriptor[offset + 5:offset + 28].rstrip(b'\x00') == b'*UDF Sparable Partition':
+                # Sparing only remaps defective blocks of rewritable discs, an image is read as the partition itself
+                partition_number, = struct.unpack_from('<H', logical_volume_descriptor, offset + 38)
+                self.partition_maps.append((partition_number, None))
+            else:
+                raise RuntimeError(f'{image_path} has an unsupported UDF partition map')
+            offset += map_length
+
+        # The file entries and directories of UDF 2.50 are in a metadata partition, which is the data of the metadata file
+        for partition_reference, metadata_file_block in metadata_partitions:
+            partition_number = self.partition_maps[partition_reference][0]
+            physical_reference = self.partition_maps.index((partition_number, None))
+            _, metadata_extents, _ = self.read_file_entry(physical_reference, metadata_file_block)
+            self.partition_maps[partition_reference] = (partition_number, metadata_extents)
+
+    def read_sectors(self, sector: int, count: int) -> bytes:
+        """
+        Read whole sectors of the image
+        """
+        self.image_file.seek(sector * SECTOR_SIZE)
+        return self.image_file.read(count * SECTOR_SIZE)
+
+    @staticmethod
+    def tag_identifier(descriptor: bytes) -> int:
+        """
+        Tag identifier of a descriptor, 0 if there is none
+        """
+        return struct.unpack_from('<H', descriptor)[0] if len(descriptor) >= 16 else 0
+
+    def image_extents(self, partition_reference: int, block: int, length: int) -> List[Tuple[int, int]]:
+        """
+        Locate an extent of a partition in the image
+
+        :param partition_reference: Partition reference number of the extent
+        :param block: Logical block number of the start of the extent in the partition
+        :param length: Length of the extent in bytes
+        :return: list of (offset in the image, length)
+        """
+        partition_number, metadata_extents = self.partition_maps[partition_reference]
+        if metadata_extents is None:
+            return [((self.partition_starts[partition_number] + block) * SECTOR_SIZE, length)]
+
+        # An extent of the metadata partition is at the same offset in the metadata file, which may be several extents itself
+        extents = []
+        offset = block * SECTOR_SIZE
+        metadata_extent_start = 0
+        for metadata_extent_offset, metadata_extent_length in metadata_extents:
+            if length and metadata_extent_start <= offset < metadata_extent_start + metadata_extent_length:
+                extent_length = min(length, metadata_extent_start + metadata_extent_length - offset)
+                extents.append((metadata_extent_offset + offset - metadata_extent_start, extent_length))
+                offset += extent_length
+                length -= extent_length
+            metadata_extent_start += metadata_extent_length
+        if length:
+            raise RuntimeError(f'{self.image_path} has a UDF extent beyond the end of its metadata partition')
+        return extents
+
+    def read_extents(self, extents: List[Tuple[int, int]]) -> bytes:
+        """
+        Read extents of the image, located by image_extents()
+        """
+        data = b''
+        for extent_offset, extent_length in extents:
+            self.image_file.seek(extent_offset)
+            data += self.image_file.read(extent_length)
+        return data
+
+    def read_file_entry(self, partition_reference: int, block: int) -> Tuple[int, List[Tuple[int, int]], Optional[bytes]]:
+        """
+        Read a file entry, or an extended file entry, and locate the data of its file
+
+        :param partition_reference: Partition reference number of the file entry
+        :param block: Logical block number of the file entry in the partition
+        :return: file_type, extents, embedded_data
+                 file_type: 4 for a directory, 5 for a file
+                 extents: list of (offset in the image, length) of the data of the file
+                 embedded_data: bytes of the data if it is stored in the file entry itself, otherwise None
+        """
+        file_entry = self.read_extents(self.image_extents(partition_reference, block, SECTOR_SIZE))
+        tag_identifier = self.tag_identifier(file_entry)
+        if tag_identifier == 261:  # File entry
+            extended_attributes_length, allocation_descriptors_length = struct.unpack_from('<II', file_entry, 168)
+            allocation_descriptors_offset = 176 + extended_attributes_length
+        elif tag_identifier == 266:  # Extended file entry
+            extended_attributes_length, allocation_descriptors_length = struct.unpack_from('<II', file_entry, 208)
+            allocation_descriptors_offset = 216 + extended_attributes_length
+        else:
+            raise RuntimeError(f'{self.image_path} has no UDF file entry at block {block} of partition reference {partition_reference}')
+        file_type = file_entry[27]
+        allocation_type = struct.unpack_from('<H', file_entry, 34)[0] & 0x07
+        information_length, = struct.unpack_from('<Q', file_entry, 56)
+        allocation_descriptors = file_entry[allocation_descriptors_offset:allocation_descriptors_offset + allocation_descriptors_length]
+
+        if allocation_type == 3:  # The data is embedded in the file entry
+            return file_type, [], allocation_descriptors[:information_length]
+
+        extents = []
+        offset = 0
+        while offset < len(allocation_descriptors):
+            if allocation_type == 0:  # short_ad, in the partition of the file entry
+                extent_length, extent_block = struct.unpack_from('<II', allocation_descriptors, offset)
+                extent_partition_reference = partition_reference
+                offset += 8
+            elif allocation_type == 1:  # long_ad
+                extent_length, extent_block, extent_partition_reference = struct.unpack_from('<IIH', allocation_descriptors, offset)
+                offset += 16
+            else:  # ext_ad
+                extent_length, extent_block, extent_partition_reference = struct.unpack_from('<I8xIH', allocation_descriptors, offset)
+                offset += 20
+            extent_type, extent_length = extent_length >> 30, extent_length & 0x3FFFFFFF
+            if extent_length == 0:
+                break
+            if extent_type == 3:  # The allocation descriptors continue in an allocation extent descriptor
+                continuation = self.read_extents(self.image_extents(extent_partition_reference, extent_block, SECTOR_SIZE))
+                continuation_length, = struct.unpack_from('<I', continuation, 20)
+                allocation_descriptors, offset = continuation[24:24 + continuation_length], 0
+                continue
+            if extent_type == 0:  # Unrecorded extents are never written by disc image authoring
+                extents.extend(self.image_extents(extent_partition_reference, extent_block, extent_length))
+
+        # The last extent can be rounded up to a whole block
+        truncated_extents = []
+        for extent_offset, extent_length in extents:
+            extent_length = min(extent_length, information_length)
+            if extent_length:
+                truncated_extents.append((extent_offset, extent_length))
+            information_length -= extent_length
+        return file_type, truncated_extents, None
+
+    def list_files(self) -> List[DiscImageFile]:
+        """
+        List every file in the file system, by walking its directories from the root directory
+
+        :return: list of DiscImageFile
+        """
+        file_set_descriptor_block, file_set_descriptor_reference = self.file_set_descriptor_location
+        file_set_descriptor = self.read_extents(self.image_extents(file_set_descriptor_reference, file_set_descriptor_block, SECTOR_SIZE))
+        if self.tag_identifier(file_set_descriptor) != 256:
+            raise RuntimeError(f'{self.image_path} has no UDF file set descriptor')
+        root_block, root_reference = struct.unpack_from('<IH', file_set_descriptor, 404)
+
+        image_files = []
+        directories = [('', root_reference, root_block)]
+        visited_file_entries = set()
+        while directories:
+            directory_path, directory_reference, directory_block = directories.pop()
+            if (directory_reference, directory_block) in visited_file_entries:  # Guard against a directory that loops back to a parent
+                continue
+            visited_file_entries.add((directory_reference, directory_block))
+            _, extents, directory_data = self.read_file_entry(directory_reference, directory_block)
+            if directory_data is None:
+                directory_data = self.read_extents(extents)
+
+            offset = 0
+            while offset + 38 <= len(directory_data):
+                if self.tag_identifier(directory_data[offset:offset + 16]) != 257:  # File identifier descriptor
+                    break
+                characteristics, identifier_length = directory_data[offset + 18], directory_data[offset + 19]
+                block, reference, implementation_use_length = struct.unpack_from('<4xIH6xH', directory_data, offset + 20)
+                identifier = directory_data[offset + 38 + implementation_use_length:offset + 38 + implementation_use_length + identifier_length]
+                offset += (38 + implementation_use_length + identifier_length + 3) & ~3
+
+                if characteristics & 0x0C:  # Parent directory, or deleted
+                    continue
+                name = identifier[1:].decode('utf-16-be' if identifier[:1] == b'\x10' else 'latin-1', errors='replace')
+                path = f'{directory_path}/{name}' if directory_path else name
+                if characteristics & 0x02:
+                    directories.append((path, reference, block))
+                    continue
+                file_type, extents, embedded_data = self.read_file_entry(reference, block)
+                if file_type == 5 and embedded_data is None:  # Files small enough to be embedded are never media files
+                    image_files.append(DiscImageFile(self.image_path, path, tuple(extents)))
+
+        return image_files
+
+
+def list_udf_files(image_path: Union[str, Path]) -> List[DiscImageFile]:
+    """
+    List every file in the UDF file system of a disc image, see UdfFileSystem
+
+    :param image_path: Path of the disc image
+    :return: list of DiscImageFile
+    """
+    with open(image_path, "rb") as image_file:
+        image_files = UdfFileSystem(image_file, image_path).list_files()
+
+    logger.debug(f'{len(image_files)} files found in the UDF file system of {image_path}')
+    return image_files
+
+
+def list_dvd_files(image_path: Union[str, Path]) -> List[DiscImageFile]:
+    """
+    List every file of a DVD image, from its ISO 9660 file system or, for a UDF only image, from its UDF file system
+
+    :param image_path: Path of the disc image
+    :return: list of DiscImageFile
+    """
+    try:
+        return list_iso9660_files(image_path)
+    except RuntimeError:
+        return list_udf_files(image_path)
+
+
+@dataclass(frozen=True)
+class BlurayPlaylist:
+    """
+    A playlist of a Bluray disc, from its BDMV/PLAYLIST/*.mpls file
+
+    :param path: str: Path of the playlist within the image
+    :param duration: float: Duration of the playlist, in ms
+    :param streams: Tuple of DiscImageFile of each M2TS stream the playlist plays, once each
+    """
+    path: str
+    duration: float
+    streams: Tuple[DiscImageFile, ...]
+
+    @property
+    def size(self) -> int:
+        """
+        Total size of the streams of the playlist in bytes
+        """
+        return sum(stream.size for stream in self.streams)
+
+
+def get_bluray_main_playlist(image_files: List[DiscImageFile]) -> BlurayPlaylist:
+    """
+    Find the main playlist of a Bluray disc, the one that plays the most stream data. Some discs have decoy playlists that repeat a
+    short stream many times, so the duration of a playlist is not used to find it.
+
+    :param image_files: list of DiscImageFile of every file of the disc, from list_udf_files()
+    :return: BlurayPlaylist
+    """
+    streams = {image_file.path.upper(): image_file for image_file in image_files}
+    playlists = []
+    for image_file in image_files:
+        if not (image_file.path.upper().startswith('BDMV/PLAYLIST/') and image_file.suffix.lower() == '.mpls'):
+            continue
+        with open(image_file.image_path, "rb") as disc_image:
+            playlist_data = DiscImageFileReader(disc_image, image_file).read()
+        if playlist_data[:4] != b'MPLS':
+            continue
+
+        playlist_start, = struct.unpack_from('>I', playlist_data, 8)
+        play_item_count, = struct.unpack_from('>H', playlist_data, playlist_start + 6)
+        duration = 0
+        playlist_streams = {}
+        offset = playlist_start + 10
+        for _ in range(play_item_count):
+            play_item_length, = struct.unpack_from('>H', playlist_data, offset)
+            clip_name = playlist_data[offset + 2:offset + 7].decode('ascii', errors='replace')
+            in_time, out_time = struct.unpack_from('>II', playlist_data, offset + 14)
+            duration += (out_time - in_time) / MPLS_TICKS_PER_MS
+            if (stream := streams.get(f'BDMV/STREAM/{clip_name}.M2TS')) is not None:
+                playlist_streams[stream.path] = stream
+            offset += 2 + play_item_length
+        if playlist_streams:
+            playlists.append(BlurayPlaylist(image_file.path, duration, tuple(playlist_streams.values())))
+
+    if not playlists:
+        raise RuntimeError(f'No playlist with M2TS streams was found in the Bluray image {image_files[0].image_path if image_files else ""}')
+    main_playlist = max(playlists, key=lambda playlist: (playlist.size, playlist.duration))
+    logger.debug(f'Main Bluray playlist is {main_playlist.path}, {main_playlist.duration}ms with {len(main_playlist.streams)} streams')
+    return main_playlist
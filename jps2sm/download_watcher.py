@@ -0,0 +1,162 @@
+"""
+Watch the MediaDirectories for the files of JPS torrents to finish downloading, so that they are prepared as soon as the data lands
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import time
+from io import BytesIO
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Third-party packages
+import torrent_parser as tp
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.media_index import GetMediaIndex, MediaIndex
+from jps2sm.utils import GetConfig
+
+
+def get_torrent_files(jps_torrent_object: BytesIO) -> Tuple[str, bool, List[Tuple[List[str], int]]]:
+    """
+    Return the file or directory name of a torrent and the path and length of each of its files
+
+    :param jps_torrent_object: bytes: BytesIO object of the JPS torrent
+    :return: torrent_name, torrent_has_directory, [(path within the directory, length)]
+    """
+    torrent_metadata = tp.TorrentFileParser(jps_torrent_object).parse()
+    torrent_name = torrent_metadata['info']['name']  # Directory if >1 file, otherwise it is filename
+    if 'files' in torrent_metadata['info']:
+        return torrent_name, True, [(file['path'], file['length']) for file in torrent_metadata['info']['files']]
+    return torrent_name, False, [([], torrent_metadata['info']['length'])]
+
+
+class DownloadWatcher:
+    """
+    Watch the MediaDirectories for the files of torrents being downloaded by the torrent client. A torrent is complete once every
+    file is found at its full size and none has been written to for settle_seconds, as many clients allocate the whole file before
+    its data is written. A torrent that is not complete after timeout_seconds is given up on, and is prepared without its files.
+
+    The file or directory of each torrent is looked up in the MediaIndex in the same way as get_media_location(), with the index
+    refreshed once for every torrent being watched.
+
+    :param media_index: MediaIndex of the MediaDirectories
+    :param timeout_seconds: float: Time to wait for each torrent, from when it is added
+    :param poll_seconds: float: Time between each refresh of the MediaIndex in wait()
+    :param settle_seconds: float: Time the files must not have been written to
+    """
+
+    def __init__(self, media_index: MediaIndex, timeout_seconds: float, poll_seconds: float = 30, settle_seconds: float = 30):
+        self.media_index = media_index
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.pending: Dict[str, Tuple[List[Tuple[str, bool, list]], float, Any]] = {}
+
+    def __contains__(self, jps_torrent_id: str) -> bool:
+        return jps_torrent_id in self.pending
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def add(self, jps_torrent_id: str, jps_torrent_objects: List[BytesIO], item: Any) -> None:
+        """
+        Watch for the files of the JPS torrents of jps_torrent_id
+
+        :param jps_torrent_id: str
+        :param jps_torrent_objects: list of the BytesIO objects of the JPS torrents whose files must be complete
+        :param item: Returned with jps_torrent_id by ready() and wait() once the files are complete or the timeout has passed
+        """
+        torrents_files = [get_torrent_files(jps_torrent_object) for jps_torrent_object in jps_torrent_objects]
+        self.pending[jps_torrent_id] = (torrents_files, monotonic() + self.timeout_seconds, item)
+
+    def find_media_locations(self) -> Dict[Tuple[str, bool], Path]:
+        """
+        Refresh the MediaIndex once, returning the location of the file or directory of every torrent being watched that is found
+        """
+        self.media_index.refresh()
+        wanted = {(torrent_name, torrent_has_directory)
+                  for torrents_files, _, _ in self.pending.values() for torrent_name, torrent_has_directory, _ in torrents_files}
+        media_locations = {}
+        for torrent_name, torrent_has_directory in wanted:
+            if (media_location := self.media_index.lookup(torrent_name, torrent_has_directory)) is not None:
+                media_locations[(torrent_name, torrent_has_directory)] = media_location
+
+        return media_locations
+
+    def torrent_complete(self, media_location: Optional[Path], torrent_files: List[Tuple[List[str], int]]) -> bool:
+        """
+        Return True if every file of a torrent is at its full size and has not been written to for settle_seconds
+
+        :param media_location: Path of the file or directory of the torrent, or None if it has not been found
+        :param torrent_files: list of the path within the directory and length of each file from get_torrent_files()
+        """
+        if media_location is None:
+            return False
+        settled_time = time.time() - self.settle_seconds
+        for file_path, length in torrent_files:
+            try:
+                file_stat = Path(media_location, *file_path).stat()
+            except OSError:
+                return False
+            if file_stat.st_size != length or file_stat.st_mtime > settled_time:
+                return False
+
+        return True
+
+    def ready(self) -> List[Tuple[str, Any, bool]]:
+        """
+        Stop watching, and return, every torrent whose files are complete or whose timeout has passed
+
+        :return: [(jps_torrent_id, item, complete)]: complete is False if the timeout passed
+        """
+        if not self.pending:
+            return []
+
+        media_locations = self.find_media_locations()
+        ready_torrents = []
+        for jps_torrent_id, (torrents_files, deadline, item) in list(self.pending.items()):
+            complete = all(self.torrent_complete(media_locations.get((torrent_name, torrent_has_directory)), torrent_files)
+                           for torrent_name, torrent_has_directory, torrent_files in torrents_files)
+            if complete:
+                logger.info(f'The files of JPS torrent id {jps_torrent_id} have finished downloading')
+            elif monotonic() >= deadline:
+                logger.warning(f'The files of JPS torrent id {jps_torrent_id} have not finished downloading after '
+                               f'{self.timeout_seconds / 60:.1f} minutes, continuing without waiting any longer')
+            else:
+                continue
+            del self.pending[jps_torrent_id]
+            ready_torrents.append((jps_torrent_id, item, complete))
+
+        return ready_torrents
+
+    def wait(self) -> Iterator[Tuple[str, Any, bool]]:
+        """
+        Yield every torrent being watched as soon as it is returned by ready(), until none are left. Ctrl-C whilst waiting stops
+        waiting and yields the torrents left without their files being complete.
+
+        :return: (jps_torrent_id, item, complete), see ready()
+        """
+        while self.pending:
+            yield from self.ready()
+            if not self.pending:
+                break
+            try:
+                sleep(self.poll_seconds)
+            except KeyboardInterrupt:
+                logger.info(f'Continuing with {len(self.pending)} torrents without waiting for their files to download')
+                pending, self.pending = self.pending, {}
+                for jps_torrent_id, (_, _, item) in pending.items():
+                    yield jps_torrent_id, item, False
+
+
+def new_download_watcher() -> DownloadWatcher:
+    """
+    Return a DownloadWatcher for the MediaDirectories, waiting DownloadTimeoutMins for each torrent
+    """
+    config = GetConfig()
+    return DownloadWatcher(GetMediaIndex().media_index(), 60 * config.download_timeout_mins, poll_seconds=config.download_poll_secs,
+                           settle_seconds=config.download_settle_secs)
@@ -0,0 +1,444 @@
+"""
+Local stand-in for JPS and SM, used to load test jps2sm without touching the live sites or their browse quotas
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+# Third-party packages
+import bencoding
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.batch import batch_mode
+from jps2sm.constants import LoginParameters
+from jps2sm.get_data import GetJPSUser
+from jps2sm.myloginsession import set_site_url_override
+from jps2sm.ratelimit import RateLimiter
+from jps2sm.utils import GetConfig, HandleCfgOutputDirs, fatal_error
+
+# Torrents shown on each page of a JPS torrents.php listing
+LISTING_PAGE_SIZE = 50
+
+
+@dataclass
+class FakeSiteSettings:
+    """
+    Behaviour of the fake sites
+
+    :param latency_ms: Time taken to respond to every request
+    :param error_rate: Fraction of requests that fail with a HTTP 503
+    :param quota_requests: Number of JPS requests allowed in quota_window_seconds before the browse quota is exceeded, 0 for no quota
+    :param quota_window_seconds: Length of the JPS browse quota window
+    :param duplicate_rate: Fraction of torrents that SM reports as already uploaded
+    """
+    latency_ms: int = 0
+    error_rate: float = 0.0
+    quota_requests: int = 0
+    quota_window_seconds: int = 3600
+    duplicate_rate: float = 0.0
+
+
+def substitute_ids(text: str, ids: Dict[str, str]) -> str:
+    """
+    Replace every whole number in text that is a key of ids with its value, in one pass so that replacements are not replaced again
+    """
+    ids_regex = r'(?<!\d)(' + '|'.join(map(re.escape, ids)) + r')(?!\d)'
+    return re.sub(ids_regex, lambda match: ids[match.group(1)], text)
+
+
+class FakeSiteTemplates:
+    """
+    Generate JPS and SM pages for groups fake groups, using the test fixtures in fixtures_dir as templates.
+
+    Fake group ids run from 1 to groups, each group uses one of the group page fixtures in turn and has the same number of
+    torrents as its fixture, with torrent ids of group id * 100 + n.
+
+    :param fixtures_dir: Path: Directory with the group-page-*, group-edit-page-* and user-page-snatched-* fixtures
+    :param groups: int: Number of fake groups
+    """
+
+    def __init__(self, fixtures_dir: Path, groups: int):
+        self.groups = groups
+        self.group_pages = []
+        for group_page_file in sorted(fixtures_dir.glob('group-page-*')):
+            group_page = group_page_file.read_text(encoding='utf-8')
+            template_group_id = re.findall(r'upload\.php\?groupid=(\d+)', group_page)[0]
+            template_torrent_ids = list(dict.fromkeys(re.findall(r"swapTorrent\('(\d+)'\)", group_page)))
+            self.group_pages.append((group_page, template_group_id, template_torrent_ids))
+
+        self.edit_group_pages = []
+        for edit_group_page_file in sorted(fixtures_dir.glob('group-edit-page-*')):
+            edit_group_page = edit_group_page_file.read_text(encoding='utf-8')
+            self.edit_group_pages.append((edit_group_page, re.findall(r'group-edit-page-(\d+)', edit_group_page_file.name)[0]))
+
+        self.index_page = Path(fixtures_dir, 'user-page-snatched-userid-1-page-1').read_text(encoding='utf-8')
+        self.listing_colhead = re.findall(r'<tr class="colhead">.*?</tr>', self.index_page, re.DOTALL)[0]
+        self.listing_rows = [(row, *re.findall(r'torrents\.php\?id=(\d+)&amp;torrentid=(\d+)', row)[0])
+                             for row in re.findall(r'<tr class="torrent">.*?</tr>', self.index_page, re.DOTALL)]
+
+        if not self.group_pages or not self.edit_group_pages or not self.listing_rows:
+            raise RuntimeError(f'Fixtures required for the fake sites not found in {fixtures_dir}')
+
+        self.listing = [(str(group_id), torrent_id)
+                        for group_id in range(1, groups + 1) for torrent_id in self.group_torrent_ids(group_id)]
+
+    def group_template(self, group_id: int) -> Tuple[str, str, List[str]]:
+        """
+        Return the group page fixture used for group_id with its original group id and torrent ids
+        """
+        return self.group_pages[(group_id - 1) % len(self.group_pages)]
+
+    def group_torrent_ids(self, group_id: int) -> List[str]:
+        """
+        Return the torrent ids of group_id
+        """
+        _, _, template_torrent_ids = self.group_template(group_id)
+        return [str(group_id * 100 + torrent_index) for torrent_index in range(len(template_torrent_ids))]
+
+    def all_group_torrent_ids(self) -> Dict[str, List[str]]:
+        """
+        Return every group and its torrent ids, in the format of get_batch_jps_group_torrent_ids()
+        """
+        all_group_torrent_ids = {}
+        for group_id, torrent_id in self.listing:
+            all_group_torrent_ids.setdefault(group_id, []).append(torrent_id)
+        return all_group_torrent_ids
+
+    def listing_pages(self) -> int:
+        """
+        Return the number of pages in the torrents.php listing
+        """
+        return max(math.ceil(len(self.listing) / LISTING_PAGE_SIZE), 1)
+
+    def group_page(self, group_id: int) -> str:
+        """
+        Return the torrents.php?id= page of group_id
+        """
+        group_page, template_group_id, template_torrent_ids = self.group_template(group_id)
+        ids = dict(zip(template_torrent_ids, self.group_torrent_ids(group_id)))
+        ids[template_group_id] = str(group_id)
+        return substitute_ids(group_page, ids)
+
+    def edit_group_page(self, group_id: int) -> str:
+        """
+        Return the torrents.php?action=editgroup page of group_id
+        """
+        edit_group_page, template_group_id = self.edit_group_pages[(group_id - 1) % len(self.edit_group_pages)]
+        return substitute_ids(edit_group_page, {template_group_id: str(group_id)})
+
+    def listing_page(self, page: int, mode: str, user: str) -> str:
+        """
+        Return page of the torrents.php listing, with a linkbox to the last page as JPS shows for user listings
+        """
+        rows = []
+        page_listing = itertools.islice(enumerate(self.listing), (page - 1) * LISTING_PAGE_SIZE, page * LISTING_PAGE_SIZE)
+        for listing_index, (group_id, torrent_id) in page_listing:
+            row, template_group_id, template_torrent_id = self.listing_rows[listing_index % len(self.listing_rows)]
+            rows.append(substitute_ids(row, {template_group_id: group_id, template_torrent_id: torrent_id}))
+
+        last_page_uri = f'page={self.listing_pages()}&amp;order_by=s3&amp;order_way=DESC&amp;type={mode}&amp;userid={user}&amp;disablegrouping=1'
+        linkbox = f'<div class="linkbox"><a href="torrents.php?{last_page_uri}" onclick="return loadHtml(\'torrents\', \'{last_page_uri}\');">' \
+                  f'<strong> Last &gt;&gt;</strong></a></div>'
+        torrent_table = f'<div id="ajax_torrents">{linkbox}\n<table class="torrent_table" id="torrent_table">\n' \
+                        f'{self.listing_colhead}\n{"".join(rows)}\n</table>\n{linkbox}'
+
+        return re.sub(r'<div id="ajax_torrents">.*?</table>\s*<div class="linkbox">.*?</div>', lambda _: torrent_table, self.index_page,
+                      count=1, flags=re.DOTALL)
+
+    @staticmethod
+    def torrent_file(torrent_id: str, site: str) -> bytes:
+        """
+        Return a valid multi-file torrent, unique to torrent_id and site
+        """
+        files = [{b'length': 1024 * track, b'path': [f'{track:02d} Track {track}.flac'.encode()]} for track in range(1, 11)]
+        piece_length = 16384
+        total_length = sum(file[b'length'] for file in files)
+        pieces = b''.join(hashlib.sha1(f'{site}-{torrent_id}-{piece}'.encode()).digest()
+                          for piece in range(math.ceil(total_length / piece_length)))
+
+        return bencoding.bencode({
+            b'announce': f'https://tracker.{site}.invalid/announce'.encode(),
+            b'info': {
+                b'files': files,
+                b'name': f'jps2sm fake torrent {torrent_id}'.encode(),
+                b'piece length': piece_length,
+                b'pieces': pieces,
+                b'private': 1,
+            },
+        })
+
+
+class FakeSiteServer(ThreadingHTTPServer):
+    """
+    Serve a fake JPS or SM on 127.0.0.1:port in a background thread, port 0 picks a free port
+
+    :param site: str: 'jps' or 'sm'
+    :param templates: FakeSiteTemplates
+    :param settings: FakeSiteSettings
+    :param port: int
+    """
+    daemon_threads = True
+
+    def __init__(self, site: str, templates: FakeSiteTemplates, settings: FakeSiteSettings, port: int = 0):
+        super().__init__(('127.0.0.1', port), FakeJPSHandler if site == 'jps' else FakeSMHandler)
+        self.site = site
+        self.templates = templates
+        self.settings = settings
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.errors_served = 0
+        self.quota_window_start = time.time()
+        self.quota_window_requests = 0
+        self.uploads = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the socket
+        """
+        self.shutdown()
+        self.server_close()
+
+    def count_request(self) -> bool:
+        """
+        Count a request against the browse quota, returning True if the quota has been exceeded
+        """
+        with self.lock:
+            self.requests_served += 1
+            if not self.settings.quota_requests:
+                return False
+            if time.time() - self.quota_window_start > self.settings.quota_window_seconds:
+                self.quota_window_start = time.time()
+                self.quota_window_requests = 0
+            self.quota_window_requests += 1
+            return self.quota_window_requests > self.settings.quota_requests
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    """
+    Common request handling for the fake sites, subclasses override route() to generate the pages
+    """
+    server: FakeSiteServer
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Handle GET
+        """
+        self.handle_request(b'')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Handle POST
+        """
+        self.handle_request(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def handle_request(self, body: bytes) -> None:
+        """
+        Simulate latency, errors and the browse quota then send the page generated by route()
+        """
+        settings = self.server.settings
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        time.sleep(settings.latency_ms / 1000)
+        quota_exceeded = self.server.count_request()
+
+        if url.path != '/login.php' and random.random() < settings.error_rate:
+            with self.server.lock:
+                self.server.errors_served += 1
+            self.send_page(503, 'text/html', b'<html><body>Service Unavailable</body></html>')
+        elif quota_exceeded and self.server.site == 'jps':
+            self.send_page(200, 'text/html', f'<html><head>{LoginParameters.jps_quota_exceeded}</head><body></body></html>'.encode())
+        else:
+            self.send_page(*self.route(url.path, query, body))
+
+    def send_page(self, status_code: int, content_type: str, content: bytes) -> None:
+        """
+        Send a response
+        """
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        if self.path == '/login.php':
+            self.send_header('Set-Cookie', f'session={self.server.site}fakesession; Path=/')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def route(self, path: str, query: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+        """
+        Return the status code, content type and content of the page at path, a 404 for any page the fake site does not have
+        """
+        # pylint: disable=unused-argument
+        return 404, 'text/html', b'<html><body>Not Found</body></html>'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """
+        Log requests with loguru rather than to stderr
+        """
+        logger.trace(f'Fake {self.server.site.upper()}: {format % args}')
+
+
+class FakeJPSHandler(FakeSiteHandler):
+    """
+    Fake JPS
+    """
+
+    def route(self, path: str, query: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+        templates = self.server.templates
+
+        if path in ('/', '/login.php', '/index.php'):
+            return 200, 'text/html', templates.index_page.encode()
+        if path == '/user.php' and query.get('action') == 'edit':
+            return 200, 'text/html', b'<html><body><div id="content"><div class="thin"><form id="userform">' \
+                                     b'<input id="browsejp" name="browsejp" type="checkbox"/></form></div></div></body></html>'
+        if path == '/artist.php':
+            return 200, 'text/html', b'<html><body><div id="content"><div class="thin"><div class="main_column">' \
+                                     b'<div class="box center">[Album]</div></div></div></div></body></html>'
+        if path == '/torrents.php':
+            if query.get('action') == 'editgroup':
+                return 200, 'text/html', templates.edit_group_page(int(query['groupid'])).encode()
+            if query.get('action') == 'download':
+                return 200, 'application/x-bittorrent', templates.torrent_file(query['id'], 'jps')
+            if 'id' in query:
+                group_id = int(query['id'])
+            elif 'torrentid' in query:
+                group_id = int(query['torrentid']) // 100
+            else:
+                return 200, 'text/html', templates.listing_page(int(query.get('page', 1)), query.get('type', ''), query.get('userid', '')).encode()
+            if not 1 <= group_id <= templates.groups:
+                return 200, 'text/html', b'<html><body><div class="thin"><h2>Error</h2><h3>Torrent not found</h3></div></body></html>'
+            return 200, 'text/html', templates.group_page(group_id).encode()
+
+        return super().route(path, query, body)
+
+
+class FakeSMHandler(FakeSiteHandler):
+    """
+    Fake SM
+    """
+
+    def route(self, path: str, query: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+        if path in ('/', '/login.php', '/index.php'):
+            return 200, 'text/html', f'<html><body>{LoginParameters.sm_success}</body></html>'.encode()
+        if path == '/torrents.php':
+            if query.get('action') == 'download':
+                return 200, 'application/x-bittorrent', self.server.templates.torrent_file(query['id'], 'sm')
+            return 200, 'text/html', b'<html><body><table id="torrent_details"><tr class="group_torrent"><td><span>' \
+                                     b'[<a href="torrents.php?action=download&amp;id=1&amp;authkey=fakeauthkey&amp;torrent_pass=faketorrentpass" ' \
+                                     b'title="Download" class="tooltip">DL</a>]</span></td></tr></table></body></html>'
+        if path == '/ajax.php' and query.get('action') == 'torrent':
+            if int(query['hash'][:8], 16) / 0xffffffff < self.server.settings.duplicate_rate:
+                duplicate = {'status': 'success', 'response': {'torrent': {'id': int(query['hash'][:6], 16)}}}
+                return 200, 'application/json', json.dumps(duplicate, separators=(',', ':')).encode()
+            return 200, 'application/json', b'{"status":"failure","error":"bad hash parameter"}'
+        if path == '/ajax.php' and query.get('action') == 'user_recents':
+            with self.server.lock:
+                uploads = self.server.uploads[-int(query.get('limit', 1)):]
+            user_recents = [{'torrentid': torrent_id,
+                             'torrentdl': f'https://sugoimusic.me/torrents.php?action=download&id={torrent_id}&authkey=fakeauthkey'}
+                            for torrent_id in uploads]
+            return 200, 'application/json', json.dumps({'status': 'success', 'response': {'uploads': user_recents}}, separators=(',', ':')).encode()
+        if path == '/upload.php':
+            with self.server.lock:
+                self.server.uploads.append(len(self.server.uploads) + 1)
+                group_id = len(self.server.uploads)
+            return 200, 'text/html', f'<html><body><input type="hidden" name="groupid" value="{group_id}" /></body></html>'.encode()
+        if path == '/artist.php':
+            return 200, 'text/html', b'<html><body>Your search did not match anything</body></html>'
+
+        return super().route(path, query, body)
+
+
+def run_load_test(groups: int) -> None:
+    """
+    Run batch_mode() against fake JPS and SM sites with groups groups, configured by the LoadTest section of jps2sm.cfg,
+    and report the throughput.
+
+    The torrents and the state of the run are kept in a temporary dir, so that the load test leaves the output dirs, the torrent
+    ledger and the JPS browse quota of real runs untouched.
+
+    :param groups: int: Number of fake groups
+    """
+    config = GetConfig()
+    fixtures_dir = Path(config.load_test_fixtures_dir)
+    if not fixtures_dir.is_dir():
+        fatal_error(f'Error: Load test fixtures dir {fixtures_dir} does not exist. Set FixturesDir in the LoadTest section of '
+                    f'jps2sm.cfg to the tests dir of the jps2sm source.')
+
+    with tempfile.TemporaryDirectory(prefix='jps2sm-load-test-') as load_test_dir:
+        GetConfig.state_dir = str(Path(load_test_dir, 'state'))
+        for cfg_key in HandleCfgOutputDirs.file_dir:
+            HandleCfgOutputDirs.file_dir[cfg_key] = Path(load_test_dir, cfg_key)
+            HandleCfgOutputDirs.file_dir[cfg_key].mkdir()
+        # requestsloginsession saves the login sessions of the fake sites to the home dir
+        home = os.environ.get('HOME')
+        os.environ['HOME'] = load_test_dir
+        try:
+            run_fake_sites_batch(groups, fixtures_dir)
+        finally:
+            if home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = home
+
+
+def run_fake_sites_batch(groups: int, fixtures_dir: Path) -> None:
+    """
+    Serve the fake JPS and SM sites, run batch_mode() against them and report the throughput
+
+    :param groups: int: Number of fake groups
+    :param fixtures_dir: Path: Directory with the fixtures used as templates for the fake sites
+    """
+    config = GetConfig()
+    settings = FakeSiteSettings(latency_ms=config.load_test_latency_ms,
+                                error_rate=config.load_test_error_rate,
+                                quota_requests=config.load_test_quota_requests,
+                                quota_window_seconds=config.load_test_quota_window_secs,
+                                duplicate_rate=config.load_test_duplicate_rate)
+    templates = FakeSiteTemplates(fixtures_dir, groups)
+    jps_server = FakeSiteServer('jps', templates, settings, config.load_test_jps_port)
+    sm_server = FakeSiteServer('sm', templates, settings, config.load_test_sm_port)
+    # The fake JPS enforces its own quota, so its requests are not paced and only pause when that quota has been exceeded
+    fake_jps_rate_limiter = RateLimiter(budget=sys.maxsize, window_seconds=1, pause_seconds=60 * config.jps_quota_exceeded_pause_mins)
+    set_site_url_override('jps', jps_server.url, fake_jps_rate_limiter)
+    set_site_url_override('sm', sm_server.url)
+    logger.info(f'Load testing with {groups} groups, fake JPS at {jps_server.url} and fake SM at {sm_server.url}')
+
+    start_time = time.monotonic()
+    try:
+        batch_mode(mode='snatched', user=GetJPSUser().user_id(), start=1, end=templates.listing_pages())
+    finally:
+        elapsed_seconds = time.monotonic() - start_time
+        jps_server.stop()
+        sm_server.stop()
+
+    torrents = len(templates.listing)
+    print(f'--------------------------------------------------------\nLoad test stats:'
+          f'\nGroups: {groups}, torrents: {torrents}, time taken: {elapsed_seconds:.1f} seconds'
+          f'\nGroups per minute: {60 * groups / elapsed_seconds:.1f}'
+          f'\nTorrents per minute: {60 * torrents / elapsed_seconds:.1f}'
+          f'\nJPS requests: {jps_server.requests_served} ({jps_server.requests_served / elapsed_seconds:.1f}/s), '
+          f'errors injected: {jps_server.errors_served}'
+          f'\nSM requests: {sm_server.requests_served} ({sm_server.requests_served / elapsed_seconds:.1f}/s), '
+          f'errors injected: {sm_server.errors_served}, uploads: {len(sm_server.uploads)}'
+          )
@@ -8,18 +8,21 @@ get_data defs for retrieving data from JPS
 # Standard library packages
 import sys
 import re
+import functools
 import itertools
 import json
 from dataclasses import dataclass
-from typing import Dict, List, Union, Tuple
+from typing import Dict, List, Optional, Union, Tuple
 
 # Third-party packages
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.dammit import EntitySubstitution
 from loguru import logger
 
 # jps2sm modules
 from jps2sm.myloginsession import jpopsuki, sugoimusic
 from jps2sm.constants import Categories, DateRegexes
+from jps2sm.html_parser import make_soup
 
 
 @dataclass
@@ -35,11 +38,17 @@ class JPSGroup:
     originalartist: str
     originaltitle: str
     torrent_table: str
-    groupdescription: str
     imagelink: str
     tagsall: str
     contribartists: str
 
+    @property
+    def groupdescription(self) -> str:
+        """
+        The group description is only retrieved from JPS when it is first needed, see get_group_description()
+        """
+        return get_group_description(self.groupid)
+
 
 def get_jps_group_data_class(batch_group_data: dict, jps_group_id: int) -> dataclass(JPSGroup):
     """
@@ -61,7 +70,6 @@ def get_jps_group_data_class(batch_group_data: dict, jps_group_id: int) -> datac
         originalartist=batch_group_data[jps_group_id]['originalartist'],
         originaltitle=batch_group_data[jps_group_id]['originaltitle'],
         torrent_table=batch_group_data[jps_group_id]['torrent_table'],
-        groupdescription=batch_group_data[jps_group_id]['groupdescription'],
         imagelink=batch_group_data[jps_group_id]['imagelink'],
         tagsall=batch_group_data[jps_group_id]['tagsall'],
         contribartists=batch_group_data[jps_group_id]['contribartists']
@@ -148,6 +156,170 @@ def get_date(torrent_description_page_h2_line, category):
             pass
 
 
+class GroupPageNodes:
+    """
+    Walk a JPS group page once, collecting the nodes that each field of GetGroupData is taken from, rather than running a
+    CSS select over the whole page for every field.
+
+    Each attribute holds the nodes a selector would have returned:
+        h2, h2_links: '.thin h2' (only the first) and '.thin h2 a'
+        h3s: '.thin h3'
+        torrent_table: '#content .thin .main_column .torrent_table tbody' (only the first)
+        image_links: '#content .thin .sidebar .box p a'
+        tag_links: 'a' within '#content .thin .sidebar .box ul.stats.nobullet li'
+        contrib_artist_items: '#content .thin .sidebar .box .body ul.stats.nobullet li'
+
+    :param soup: BeautifulSoup of a JPS group page
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self.h2 = None
+        self.h2_links = []
+        self.h3s = []
+        self.torrent_table = None
+        self.image_links = []
+        self.tag_links = []
+        self.contrib_artist_items = []
+
+        self.walk(soup, frozenset())
+
+    def walk(self, parent: Tag, ancestors: frozenset) -> None:
+        """
+        Collect the nodes within parent
+
+        :param parent: Tag
+        :param ancestors: frozenset of the steps of the selectors matched by the ancestors of parent's children
+        """
+        for tag in parent.children:
+            if not isinstance(tag, Tag):
+                continue
+
+            if tag.name == 'tbody' and 'torrent_table' in ancestors:
+                if self.torrent_table is None:
+                    self.torrent_table = tag
+                continue  # Nothing else is collected from within the torrent table
+
+            if matched := self.match(tag, ancestors):
+                self.walk(tag, ancestors | matched)
+            else:
+                self.walk(tag, ancestors)
+
+    def match(self, tag: Tag, ancestors: frozenset) -> set:
+        """
+        Collect tag if it is one of the nodes required, and return the selector steps it matches
+
+        :param tag: Tag
+        :param ancestors: frozenset of the selector steps matched by the ancestors of tag
+        """
+        matched = set()
+        name = tag.name
+        classes = tag.get('class') or ()
+
+        if name == 'h2' and 'thin' in ancestors:
+            if self.h2 is None:
+                self.h2 = tag
+            matched.add('thin_h2')
+        elif name == 'h3' and 'thin' in ancestors:
+            self.h3s.append(tag)
+        elif name == 'a':
+            if 'thin_h2' in ancestors:
+                self.h2_links.append(tag)
+            if 'box_p' in ancestors:
+                self.image_links.append(tag)
+            if 'stats_li' in ancestors:
+                self.tag_links.append(tag)
+        elif name == 'li':
+            if 'box_stats' in ancestors:
+                matched.add('stats_li')
+            if 'body_stats' in ancestors:
+                self.contrib_artist_items.append(tag)
+        elif name == 'p' and 'box' in ancestors:
+            matched.add('box_p')
+        elif name == 'ul' and 'stats' in classes and 'nobullet' in classes:
+            if 'box' in ancestors:
+                matched.add('box_stats')
+            if 'box_body' in ancestors:
+                matched.add('body_stats')
+
+        if tag.get('id') == 'content':
+            matched.add('content')
+        if classes:
+            if 'thin' in classes:
+                matched.add('thin')
+                if 'content' in ancestors:
+                    matched.add('content_thin')
+            if 'main_column' in classes and 'content_thin' in ancestors:
+                matched.add('main_column')
+            if 'torrent_table' in classes and 'main_column' in ancestors:
+                matched.add('torrent_table')
+            if 'sidebar' in classes and 'content_thin' in ancestors:
+                matched.add('sidebar')
+            if 'box' in classes and 'sidebar' in ancestors:
+                matched.add('box')
+            if 'body' in classes and 'box' in ancestors:
+                matched.add('box_body')
+
+        return matched - ancestors
+
+
+def escape_html(text: str) -> str:
+    """
+    Escape text as it is when a page is serialized, so values taken from nodes match those scraped from the page source
+
+    :param text: str of a NavigableString or attribute value
+    """
+    return EntitySubstitution.substitute_xml(text)
+
+
+def serialize_nodes(nodes) -> str:
+    """
+    Return the html of a sequence of sibling nodes
+    """
+    return ''.join(node.output_ready() if isinstance(node, NavigableString) else node.decode() for node in nodes)
+
+
+def get_original_artist_title(h3s: List[Tag]) -> Union[Tuple[str, str], None]:
+    """
+    Get the original artist and title of a JPS group, set in a h3 as '(<a href="artist.php?id=1">artist</a> - title)'
+
+    :param h3s: list of the h3 Tags in the group page
+    :return: Tuple of original artist and original title, or None if the group has neither
+    """
+    for h3 in h3s:
+        for artist_link in h3.find_all('a', recursive=False):
+            if list(artist_link.attrs) != ['href'] or not re.fullmatch(r'artist\.php\?id=[0-9]+', artist_link['href']):
+                continue
+            original_artist = artist_link.decode_contents()
+            after_artist = serialize_nodes(artist_link.next_siblings)
+            if original_artist and '\n' not in original_artist + after_artist and after_artist.startswith(' - ') \
+                    and after_artist.endswith(')') and len(after_artist) > 4:
+                return original_artist, after_artist[3:-1]
+    return None
+
+
+def get_contrib_artists(contrib_artist_items: List[Tag]) -> Dict[str, str]:
+    """
+    Get the contributing artists of a JPS group, each set as '<li><a href="artist.php?id=1" title="original artist">artist</a>'
+
+    :param contrib_artist_items: list of the li Tags of the artists in the group page sidebar
+    :return: dict of contribartists[artist] = original artist
+    """
+    contrib_artists = {}
+    for item in contrib_artist_items:
+        if item.attrs or not item.contents:
+            continue
+        artist_link = item.contents[0]
+        if not isinstance(artist_link, Tag) or artist_link.name != 'a' or list(artist_link.attrs) != ['href', 'title']:
+            continue
+        if not re.fullmatch(r'artist\.php\?id=[0-9]+', artist_link['href']) or '"' in artist_link['title']:
+            continue
+        if len(artist_link.contents) != 1 or type(artist_link.contents[0]) is not NavigableString:  # pylint: disable=unidiomatic-typecheck
+            continue
+        if re.fullmatch(r'[\w .-]+', artist := artist_link.contents[0]):
+            contrib_artists[str(artist)] = escape_html(artist_link['title'])
+    return contrib_artists
+
+
 class GetGroupData:
     """
     Retrieve group data of the group supplied from args.parsed.urls
@@ -163,7 +335,6 @@ class GetGroupData:
         self.originalartist: str = str()
         self.originaltitle: str = str()
         self.torrent_table: str = str()
-        self.groupdescription: str = str()
         self.imagelink: str = str()
         self.tagsall: str = str()
         self.contribartists: str = str()
@@ -175,14 +346,17 @@ class GetGroupData:
         """
         Get JPS group data
         """
-        soup = BeautifulSoup(jps_group_page_text, 'html5lib')
-        artist_line_link = soup.select('.thin h2 a')
-        original_title_line = soup.select('.thin h3')
+        soup = make_soup(jps_group_page_text, ['.thin h2', '#content .thin .main_column .torrent_table tbody'])
+        group_page_nodes = GroupPageNodes(soup)
+        if group_page_nodes.h2 is None:
+            logger.error(f'Error: Could not find the title of group {jps_group_id}, try adding --debug to see what could be wrong.')
+            raise Exception('JPS group title not found')
 
-        logger.debug(torrent_description_page_h2_line := str(soup.select('.thin h2')[0]))
+        # The title line is kept as html as JPS packs the category, artist, title and date into its text in several formats
+        logger.debug(torrent_description_page_h2_line := str(group_page_nodes.h2))
 
         if torrent_description_page_h2_line == "<h2>Error</h2>":
-            if error := str(soup.select('.thin h3')[0]):  # Try to grab error string
+            if error := str(group_page_nodes.h3s[0]):  # Try to grab error string
                 if error == "<h3>Torrent not found</h3>":
                     logger.error('JPS torrent not found')
                     raise Exception('JPS torrent not found')
@@ -198,7 +372,7 @@ class GetGroupData:
 
         logger.info(f'Category: {self.category}')
 
-        self.artist = get_artist(artist_line_link=artist_line_link,
+        self.artist = get_artist(artist_line_link=group_page_nodes.h2_links,
                                  torrent_description_page_h2_line=torrent_description_page_h2_line,
                                  category=self.category)
         logger.info(f'Artist(s): {self.artist}')
@@ -241,38 +415,24 @@ class GetGroupData:
                 self.title = titlemerged
 
         logger.info(f'Title: {self.title}')
-        try:
-            originalchars = re.findall(r'<a href="artist.php\?id=(?:[0-9]+)">(.+)</a> - (.+)\)</h3>', str(original_title_line))[0]
-            self.originalartist = originalchars[0]
-            self.originaltitle = originalchars[1]
+        if original_artist_title := get_original_artist_title(group_page_nodes.h3s):  # Do nothing if group has no original artist/title
+            self.originalartist, self.originaltitle = original_artist_title
             logger.info(f"Original artist: {self.originalartist} Original title: {self.originaltitle}")
-        except IndexError:  # Do nothing if group has no original artist/title
-            pass
-
-        self.torrent_table = str(soup.select('#content .thin .main_column .torrent_table tbody')[0])
 
-        # Does *not* require PU at JPS to show the edit page dialogue, just trying to submit it generates a 403.
-        self.groupdescription = get_group_description_bbcode(jps_group_id)
+        self.torrent_table = str(group_page_nodes.torrent_table)
 
-        logger.trace(f"Group description:\n{self.groupdescription}")
-
-        image = str(soup.select('#content .thin .sidebar .box p a'))
-        try:
-            self.imagelink = "https://jpopsuki.eu/" + re.findall(r'<a\s+(?:[^>]*?\s+)?href=\"([^\"]*)\"', image)[0]
+        if image_link := next((link['href'] for link in group_page_nodes.image_links if link.has_attr('href')), None):
+            self.imagelink = "https://jpopsuki.eu/" + escape_html(image_link)
             logger.info(f'Image link: {self.imagelink}')
-        except IndexError:  # No image for the group
+        else:  # No image for the group
             self.imagelink = None
 
-        tagsget = str(soup.select('#content .thin .sidebar .box ul.stats.nobullet li'))
-        tags = re.findall('searchtags=([^\"]+)', tagsget)
+        tags = [tag for link in group_page_nodes.tag_links if 'searchtags=' in link.get('href', '')
+                if (tag := escape_html(link['href']).split('searchtags=', 1)[1])]
         logger.info(f'Tags: {tags}')
         self.tagsall = ",".join(tags)
 
-        contrib_artists_li = str(soup.select('#content .thin .sidebar .box .body ul.stats.nobullet li'))
-        contrib_artists = re.findall(r'<li><a href="artist\.php\?id=(?:[0-9]+?)" title="([^"]*?)">([\w .-]+)</a>', contrib_artists_li)
-        self.contribartists = {}
-        for artist_pair in contrib_artists:
-            self.contribartists[artist_pair[1]] = artist_pair[0]  # Creates contribartists[artist] = origartist
+        self.contribartists = get_contrib_artists(group_page_nodes.contrib_artist_items)
 
         logger.info(f'Contributing artists: {self.contribartists}')
         if self.contribartists == {}:
@@ -293,12 +453,18 @@ class GetGroupData:
             'originalartist': self.originalartist,
             'originaltitle': self.originaltitle,
             'torrent_table': self.torrent_table,
-            'groupdescription': self.groupdescription,
             'imagelink': self.imagelink,
             'tagsall': self.tagsall,
             'contribartists': self.contribartists,
         }
 
+    @property
+    def groupdescription(self) -> str:
+        """
+        The group description is only retrieved from JPS when it is first needed, see get_group_description()
+        """
+        return get_group_description(self.jps_group_id)
+
     def __getattr__(self, item):
         """
         Allow each item to be returned as an attribute
@@ -314,6 +480,63 @@ def split_bad_multiple_artists(artists: str) -> List[str]:
     return re.split(', | x | & ', artists)
 
 
+@dataclass(frozen=True)
+class TorrentTableRelease:
+    """
+    Dataclass for the data of one release in the torrent table of a JPS group page
+    """
+    slashdata: str
+    size_no_units: str
+    size_units: str
+    completed: str
+    seeders: str
+    leechers: str
+    uploaddate: str
+    download_link: Optional[str]
+
+
+@functools.lru_cache(maxsize=64)
+def get_torrent_table_index(torrent_table: str) -> Dict[str, TorrentTableRelease]:
+    """
+    Split the torrent table of a JPS group page into its releases and index them by torrent id. Each release is only scanned
+    up to the start of the next release, so the time taken grows linearly with the number of releases in the group.
+
+    The index is cached as both get_release_data() and get_torrent_link() use it for the same torrent table.
+
+    :param torrent_table: str of torrent_table in JPS group page
+    :return: dict of TorrentTableRelease indexed by torrent id, in the order they are in the torrent table
+    """
+    download_links = {}
+    for download_link in re.finditer(r'torrents\.php\?action=download&amp;id=([0-9]+)&amp;authkey=(?:[^&]+)&amp;torrent_pass=(?:[^"]+)',
+                                     torrent_table):
+        download_links.setdefault(download_link.group(1), download_link.group(0))
+
+    release_rows = list(re.finditer(r"swapTorrent\('([0-9]+)'\);\">» (.+?(?=</a>))</a>(?:\s*)</td>(?:\s*)<td class=\"nobr\">(\d*(?:\.)?(?:\d{0,2})?) (\w{2})</td>"
+                                    r"(?:\s*)<td>([0-9,]{1,6})</td>(?:\s*)<td>([0-9,]{1,6})</td>(?:\s*)<td>([0-9,]{1,6})</td>", torrent_table, re.DOTALL))
+    upload_date_regex = re.compile(r'<blockquote>(?:\s*)Uploaded by <a href="user.php\?id=(?:[0-9]+)">(?:[\S]+)</a>  on <span title="(?:[^"]+)">([^<]+)</span>')
+
+    torrent_table_index = {}
+    for row_number, release_row in enumerate(release_rows):
+        jps_torrent_id, slashdata, size_no_units, size_units, completed, seeders, leechers = release_row.groups()
+        next_release_start = release_rows[row_number + 1].start() if row_number + 1 < len(release_rows) else len(torrent_table)
+        if not (upload_date := upload_date_regex.search(torrent_table, release_row.end(), next_release_start)):
+            logger.warning(f'No upload date found for torrent {jps_torrent_id}, skipping it')
+            continue
+
+        torrent_table_index[jps_torrent_id] = TorrentTableRelease(
+            slashdata=slashdata,
+            size_no_units=size_no_units,
+            size_units=size_units,
+            completed=completed,
+            seeders=seeders,
+            leechers=leechers,
+            uploaddate=upload_date.group(1),
+            download_link=download_links.get(jps_torrent_id),
+        )
+
+    return torrent_table_index
+
+
 def get_release_data(jps_torrent_ids: List[str], torrent_table: str, date: str) -> Dict[str, Dict[str, Union[List[str], str]]]:
     # TODO When upgrading to 3.9+ the 'List[str]' can be changed to 'list[str]' and  'Union[list, str]' can be 'list | str'. See PEP 585
     """
@@ -336,29 +559,23 @@ def get_release_data(jps_torrent_ids: List[str], torrent_table: str, date: str)
                        ...
     """
 
-    # print(torrent_table)
     freeleech_text = '<strong>Freeleech!</strong>'
-    release_data_raw = re.findall(r"swapTorrent\('([0-9]+)'\);\">» (.+?(?=</a>))</a>(?:\s*)</td>(?:\s*)<td class=\"nobr\">(\d*(?:\.)?(?:\d{0,2})?) (\w{2})</td>(?:\s*)<td>([0-9,]{1,6})</td>(?:\s*)<td>([0-9,]{1,6})</td>(?:\s*)<td>([0-9,]{1,6})</td>.*?<blockquote>(?:\s*)Uploaded by <a href=\"user.php\?id=(?:[0-9]+)\">(?:[\S]+)</a>  on <span title=\"(?:[^\"]+)\">([^<]+)</span>", torrent_table, re.DOTALL)
-    logger.trace(f'Pre-processed release_data: {json.dumps(release_data_raw, indent=2)}')
+    torrent_table_index = get_torrent_table_index(torrent_table)
 
-    release_data = {}
-
-    try:
-        # Create exception if no release data was found, else these get silently skipped in collate() as the response is null.
-        test = release_data_raw[0]
-    except IndexError:
+    # Create exception if no release data was found, else these get silently skipped in collate() as the response is null.
+    if not torrent_table_index:
         raise RuntimeError(f'No release data found for {jps_torrent_ids}')
 
-    for release in release_data_raw:
-        jps_torrent_id = release[0]
+    release_data = {}
+    for jps_torrent_id, release in torrent_table_index.items():
         release_data[jps_torrent_id] = {}
-        release_data[jps_torrent_id]['slashdata'] = ([i.split(' / ') for i in [release[1]]])[0]
-        release_data[jps_torrent_id]['uploaddate'] = release[7]
-        release_data[jps_torrent_id]['size_no_units'] = release[2]
-        release_data[jps_torrent_id]['size_units'] = release[3]
-        release_data[jps_torrent_id]['completed'] = release[4]
-        release_data[jps_torrent_id]['seeders'] = release[5]
-        release_data[jps_torrent_id]['leechers'] = release[6]
+        release_data[jps_torrent_id]['slashdata'] = release.slashdata.split(' / ')
+        release_data[jps_torrent_id]['uploaddate'] = release.uploaddate
+        release_data[jps_torrent_id]['size_no_units'] = release.size_no_units
+        release_data[jps_torrent_id]['size_units'] = release.size_units
+        release_data[jps_torrent_id]['completed'] = release.completed
+        release_data[jps_torrent_id]['seeders'] = release.seeders
+        release_data[jps_torrent_id]['leechers'] = release.leechers
 
     logger.debug(f'Entire group contains: {json.dumps(release_data, indent=2)}')
 
@@ -383,6 +600,22 @@ def get_release_data(jps_torrent_ids: List[str], torrent_table: str, date: str)
     return release_data
 
 
+@functools.lru_cache(maxsize=256)
+def get_group_description(jps_group_id: str) -> str:
+    """
+    Return the group description of a JPS group, memoized by group id until batch_mode() starts its next run. The description is
+    retrieved from the edit group page, an extra request for every group, so it is only retrieved once prepare_torrent() needs it
+    rather than for groups that are excluded or whose torrents are all skipped.
+
+    :param jps_group_id: JPS group id
+    :return: bbcode: group description with bbcode
+    """
+    # Does *not* require PU at JPS to show the edit page dialogue, just trying to submit it generates a 403.
+    group_description = get_group_description_bbcode(str(jps_group_id))
+    logger.trace(f"Group description:\n{group_description}")
+    return group_description
+
+
 def get_group_description_bbcode(jps_group_id: str) -> str:
     """
     Retrieve original bbcode from edit group url and reformat any JPS style bbcode
@@ -391,7 +624,7 @@ def get_group_description_bbcode(jps_group_id: str) -> str:
     :return: bbcode: group description with bbcode
     """
     edit_group_page = jpopsuki(f"https://jpopsuki.eu/torrents.php?action=editgroup&groupid={jps_group_id}")
-    soup = BeautifulSoup(edit_group_page.text, 'html5lib')
+    soup = make_soup(edit_group_page.text, ['textarea[name="body"]'])
     bbcode = soup.find("textarea", {"name": "body"}).string
 
     if bbcode is None:  # Group description is empty
@@ -429,7 +662,7 @@ def get_jps_user_id() -> int:
     """
 
     res = jpopsuki("https://jpopsuki.eu/", True)
-    soup = BeautifulSoup(res.text, 'html5lib')
+    soup = make_soup(res.text, ['.username'])
     href = soup.select('.username')[0]['href']
     jps_user_id = re.match(r"user\.php\?id=(\d+)", href).group(1)
 
@@ -473,7 +706,7 @@ def get_user_keys() -> Dict[str, str]:
     """
 
     smpage = sugoimusic("https://sugoimusic.me/torrents.php?id=118", test_login=True)  # Arbitrary page on SM that has authkey
-    soup = BeautifulSoup(smpage.text, 'html5lib')
+    soup = make_soup(smpage.text, ['#torrent_details .group_torrent > td > span > .tooltip'])
     sm_torrent_link = str(soup.select_one('#torrent_details .group_torrent > td > span > .tooltip'))
 
     return {
@@ -490,5 +723,6 @@ def get_torrent_link(torrentid: str, torrent_table: str) -> str:
     :param torrent_table: str of torrent_table in JPS group page
     :return: torrentlink: URI of torrent link
     """
-    torrentlink = re.findall(rf'torrents\.php\?action=download&amp;id={torrentid}&amp;authkey=(?:[^&]+)&amp;torrent_pass=(?:[^"]+)', torrent_table)[0]
-    return torrentlink
+    if not (release := get_torrent_table_index(torrent_table).get(torrentid)) or not release.download_link:
+        raise IndexError(f'No download link found for torrent {torrentid}')
+    return release.download_link
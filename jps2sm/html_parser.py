@@ -0,0 +1,78 @@
+"""
+Parse JPS and SM pages with a selectable BeautifulSoup parser
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+from typing import Iterable
+
+# Third-party packages
+from bs4 import BeautifulSoup, Comment, Tag
+from bs4.builder import LXMLTreeBuilder
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.utils import GetArgs, GetConfig
+
+
+def get_html_parser() -> str:
+    """
+    Return the parser set by --html-parser, or HTMLParser in jps2sm.cfg
+    """
+    return GetArgs().parsed.html_parser or GetConfig().html_parser
+
+
+def add_implied_tbody(soup: BeautifulSoup) -> None:
+    """
+    Wrap rows that are direct children of a table in a tbody, as html5lib does when a page omits it
+
+    :param soup: BeautifulSoup parsed with lxml
+    """
+    for table in soup.find_all('table'):
+        for row in table.find_all('tr', recursive=False):
+            if row.parent is not table:  # Already wrapped with a previous row
+                continue
+            tbody = soup.new_tag('tbody')
+            row.insert_before(tbody)
+            # html5lib keeps the tbody open, including the whitespace between rows, until the next tag that is not a row
+            while (node := tbody.next_sibling) is not None:
+                if isinstance(node, Tag) and node.name != 'tr':
+                    break
+                if not isinstance(node, (Tag, Comment)) and node.strip():
+                    break
+                tbody.append(node.extract())
+
+
+def lxml_soup(page_text: str) -> BeautifulSoup:
+    """
+    Parse page_text with lxml, producing the same tree as html5lib for the pages jps2sm scrapes.
+
+    With every parser but html5lib, BeautifulSoup collapses whitespace-only strings that are not within one of the
+    preserve_whitespace_tags, so [document], the root of every page, is added to keep them everywhere. lxml also does not
+    add the tbody that html5lib implies.
+
+    :param page_text: str of the page
+    """
+    builder = LXMLTreeBuilder(preserve_whitespace_tags={BeautifulSoup.ROOT_TAG_NAME, 'pre', 'textarea'})
+    soup = BeautifulSoup(page_text, builder=builder)
+    add_implied_tbody(soup)
+    return soup
+
+
+def make_soup(page_text: str, required_selectors: Iterable[str] = ()) -> BeautifulSoup:
+    """
+    Parse a JPS or SM page with the parser set by get_html_parser(). If lxml is used but does not find every one of
+    required_selectors, the page is probably malformed in a way that lxml handles differently, so it is parsed again with html5lib.
+
+    :param page_text: str of the page
+    :param required_selectors: CSS selectors the page must have for it to be scraped
+    :return: soup: BeautifulSoup
+    """
+    if get_html_parser() == 'lxml':
+        soup = lxml_soup(page_text)
+        if all(soup.select_one(required_selector) is not None for required_selector in required_selectors):
+            return soup
+        logger.debug(f'lxml did not find all of {required_selectors}, parsing again with html5lib')
+
+    return BeautifulSoup(page_text, 'html5lib')
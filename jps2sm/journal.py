@@ -0,0 +1,199 @@
+"""
+Journal the work completed by a batch run, so that an interrupted run can be continued with --resume
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import io
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+# Third-party packages
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.save_data import load_jps_torrent
+from jps2sm.utils import GetArgs, fatal_error, get_state_dir
+
+
+class RunJournal:
+    """
+    Journal of the units of work a batch run has completed: the last page of torrents, each page of torrents retrieved, the data
+    of each group, each torrent collated and each torrent uploaded. Every unit is appended to the journal file as soon as it is
+    complete, so that a run stopped by Ctrl-C, a crash or the JPS quota can be continued with --resume RUN_ID without repeating
+    any of them. Errors are not journaled, so they are retried by the resumed run.
+
+    :param run_id: str
+    :param journal_path: Path of the journal file, or None to keep the journal in memory only
+    """
+
+    def __init__(self, run_id: str, journal_path: Optional[Path]):
+        self.run_id = run_id
+        self.journal_path = journal_path
+        self.lock = threading.Lock()
+        self.batch_args: Dict[str, Any] = {}
+        self.last_page: Optional[int] = None
+        self.pages: Dict[int, list] = {}
+        self.group_data_results: Dict[str, tuple] = {}
+        self.collate_results: Dict[str, tuple] = {}
+        self.uploaded: Set[str] = set()
+
+        if self.journal_path is not None and self.journal_path.exists():
+            self.load()
+
+    def load(self) -> None:
+        """
+        Load every unit from the journal file. If the run crashed whilst a unit was being written it is incomplete, so it is
+        removed and the work is done again.
+        """
+        with open(self.journal_path, "r+b") as journal_file:
+            complete_size = 0
+            while True:
+                try:
+                    record_type, values = pickle.load(journal_file)
+                except (EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+                    break
+                self.apply(record_type, *values)
+                complete_size = journal_file.tell()
+            journal_file.truncate(complete_size)
+
+    def apply(self, record_type: str, *values) -> None:
+        """
+        Apply a unit of work to the journal
+
+        :param record_type: str: One of 'batch_args', 'last_page', 'page', 'group_data', 'collate' or 'uploaded'
+        :param values: The values of the unit, see record()
+        """
+        if record_type == 'batch_args':
+            self.batch_args = values[0]
+        elif record_type == 'last_page':
+            self.last_page = values[0]
+        elif record_type == 'page':
+            page, listing_torrents = values
+            self.pages[page] = listing_torrents
+        elif record_type == 'group_data':
+            self.group_data_results[values[0][0]] = values[0]
+        elif record_type == 'collate':
+            jps_group_id, jps_torrent_id, collate_torrent_info = values
+            self.collate_results[jps_torrent_id] = (jps_group_id, collate_torrent_info)
+        elif record_type == 'uploaded':
+            self.uploaded.add(values[0])
+        else:
+            raise RuntimeError(f'Unknown journal record type {record_type}')
+
+    def record(self, record_type: str, *values) -> None:
+        """
+        Journal a completed unit of work:
+            'batch_args' with a dict of the arguments of batch_mode() and the batch filters,
+            'last_page' with the last page of torrents,
+            'page' with the page number and its list of ListingTorrent,
+            'group_data' with the result of retrieve_batch_group_data(),
+            'collate' with the jps_group_id, jps_torrent_id and the dict returned by collate() for it, or
+            'uploaded' with the jps_torrent_id
+
+        :param record_type: str
+        :param values: The values of the unit
+        """
+        if record_type == 'collate':
+            jps_group_id, jps_torrent_id, collate_torrent_info = values
+            # The torrent is read again from the file saved by collate(), and the group data is journaled separately
+            collate_torrent_info = dict(collate_torrent_info)
+            collate_torrent_info['jps_torrent_collated_data'] = {
+                collated_jps_torrent_id: {
+                    'release_data_collated': collated_data['release_data_collated'],
+                    'sm_torrent_hash': collated_data['sm_torrent_hash'],
+                } for collated_jps_torrent_id, collated_data in collate_torrent_info['jps_torrent_collated_data'].items()
+            }
+            values = (jps_group_id, jps_torrent_id, collate_torrent_info)
+
+        with self.lock:
+            self.apply(record_type, *values)
+            if self.journal_path is not None:
+                with open(self.journal_path, "ab") as journal_file:
+                    journal_file.write(pickle.dumps((record_type, values)))
+
+    def collate_result(self, jps_torrent_id: str, torrent_group_data) -> Optional[dict]:
+        """
+        Return the dict collate() returned for a torrent when it was journaled, with the JPS torrents it collated loaded again,
+        or None if it was not collated by the run
+
+        :param jps_torrent_id: str
+        :param torrent_group_data: JPSGroup data of the group of the torrent
+        """
+        if jps_torrent_id not in self.collate_results:
+            return None
+
+        _, collate_torrent_info = self.collate_results[jps_torrent_id]
+        collate_torrent_info = dict(collate_torrent_info)
+        collate_torrent_info['jps_torrent_collated_data'] = {
+            collated_jps_torrent_id: {
+                'jps_torrent_object': io.BytesIO(load_jps_torrent(collated_jps_torrent_id, torrent_group_data.torrent_table)),
+                'torrentgroupdata': torrent_group_data,
+                'release_data_collated': collated_data['release_data_collated'],
+                'sm_torrent_hash': collated_data['sm_torrent_hash'],
+            } for collated_jps_torrent_id, collated_data in collate_torrent_info['jps_torrent_collated_data'].items()
+        }
+        return collate_torrent_info
+
+    def finish(self) -> None:
+        """
+        Delete the journal of a run that completed, as there is nothing to resume
+        """
+        if self.journal_path is not None:
+            self.journal_path.unlink(missing_ok=True)
+
+
+def get_runs_dir() -> Path:
+    """
+    Return the directory the journals of batch runs are kept in, creating it if required
+    """
+    runs_dir = Path(get_state_dir(), 'runs')
+    runs_dir.mkdir(exist_ok=True)
+
+    return runs_dir
+
+
+def start_run_journal(batch_args: Dict[str, Any]) -> RunJournal:
+    """
+    Start the journal of a new batch run
+
+    :param batch_args: dict of the arguments of batch_mode() and the batch filters, restored by --resume
+    """
+    args = GetArgs()
+    run_id = run_start = time.strftime('%Y%m%d-%H%M%S')
+    # A load test, recording or replay is never resumed
+    if args.parsed.load_test or args.parsed.record or args.parsed.replay:
+        run_journal = RunJournal(run_id, None)
+    else:
+        run_number = 1
+        while Path(get_runs_dir(), f'{run_id}.journal').exists():  # Another run started in the same second
+            run_number += 1
+            run_id = f'{run_start}-{run_number}'
+        run_journal = RunJournal(run_id, Path(get_runs_dir(), f'{run_id}.journal'))
+        logger.info(f'Batch run id is {run_id}, if the run is interrupted continue it with --resume {run_id}')
+    run_journal.record('batch_args', batch_args)
+
+    return run_journal
+
+
+def load_run_journal(run_id: str) -> RunJournal:
+    """
+    Load the journal of an interrupted batch run for --resume
+
+    :param run_id: str
+    """
+    journal_path = Path(get_runs_dir(), f'{run_id}.journal')
+    if not journal_path.exists():
+        fatal_error(f'Error: No interrupted batch run {run_id} found in {get_runs_dir()}')
+
+    run_journal = RunJournal(run_id, journal_path)
+    if not run_journal.batch_args:
+        fatal_error(f'Error: The journal of batch run {run_id} is empty')
+    logger.info(f'Resuming batch run {run_id}: {len(run_journal.pages)} pages of torrents, {len(run_journal.group_data_results)} groups, '
+                f'{len(run_journal.collate_results)} torrents collated and {len(run_journal.uploaded)} torrents uploaded already')
+
+    return run_journal
@@ -5,20 +5,24 @@ jps2sm main defs
 # pylint appears to have a bug where it cannot import despite python itself being able to
 
 # Standard library packages
+import multiprocessing
 import re
 
 # Third-party packages
-from bs4 import BeautifulSoup
 from loguru import logger
 
 # jps2sm modules
 from jps2sm.get_data import GetGroupData, GetJPSUser, get_jps_group_page
 from jps2sm.prepare_data import collate, prepare_torrent
 from jps2sm.save_data import download_sm_uploaded_torrents
-from jps2sm.batch import batch_mode
+from jps2sm.batch import batch_mode, daemon_mode, resume_batch_mode
+from jps2sm.download_watcher import new_download_watcher
+from jps2sm.fakeserver import run_load_test
+from jps2sm.media_index import run_media_index_command
 from jps2sm.upload_data import set_original_artists, upload_torrent
 from jps2sm.utils import fatal_error, GetArgs, handle_cfg_media_roots, setup_logging
 from jps2sm.myloginsession import jpopsuki
+from jps2sm.html_parser import make_soup
 
 
 def detect_display_swapped_names(userid):
@@ -28,7 +32,7 @@ def detect_display_swapped_names(userid):
     :return: True if enabled (bad) or False if disabled (OK)
     """
     user_profile_page = jpopsuki(f"https://jpopsuki.eu/user.php?action=edit&userid={userid}")
-    soup = BeautifulSoup(user_profile_page.text, 'html5lib')
+    soup = make_soup(user_profile_page.text, ['#content .thin #userform'])
     user_form = str(soup.select('#content .thin #userform'))
 
     # We do both string matches to be extra safe due to the havoc it causes if the user has original characters in torrent lists switched on
@@ -47,6 +51,7 @@ def main():
     """
     Entry point
     """
+    multiprocessing.freeze_support()  # The processes of GetMediainfoPool are spawned, which frozen builds must support
     args = GetArgs()
     setup_logging(args.parsed.debug)
 
@@ -59,6 +64,15 @@ def main():
     if args.parsed.mediainfo:
         handle_cfg_media_roots()
 
+    if args.parsed.load_test:
+        run_load_test(args.parsed.load_test)
+        return
+
+    if args.parsed.media_index:
+        handle_cfg_media_roots()
+        run_media_index_command(args.parsed.media_index)
+        return
+
     jps_user = GetJPSUser()
     jps_user_id = jps_user.user_id()
     logger.debug(f"JPopsuki user id is {jps_user_id}")
@@ -86,6 +100,10 @@ def main():
         batch_mode_user = args.parsed.batchuser or jps_user_id
         batch_mode(mode=args.parsed.batch, user=batch_mode_user, start=args.parsed.batchstart,
                    end=args.parsed.batchend, sort=args.parsed.batchsort, order=args.parsed.batchsortorder)
+    elif args.parsed.resume:
+        resume_batch_mode(args.parsed.resume)
+    elif args.parsed.daemon:
+        daemon_mode(user=args.parsed.batchuser or jps_user_id)
     else:
         # If we reach here something has gone very wrong with parsing args
         raise RuntimeError('Argument handling error')
@@ -113,10 +131,18 @@ def non_batch_upload(jps_torrent_id=None, jps_urls=None, dry_run=None, mediainfo
 
     collate_torrent_info = collate(torrentids=jps_torrent_ids, torrentgroupdata=jps_group_data)
 
+    collated_torrents = [(collated_jps_torrent_id, data, True)
+                         for collated_jps_torrent_id, data in collate_torrent_info['jps_torrent_collated_data'].items()]
     if wait_for_jps_dl:
-        input('When these files have been downloaded press enter to continue...')
-
-    for _, data in collate_torrent_info['jps_torrent_collated_data'].items():
+        # Prepare each torrent as soon as its files have downloaded into the MediaDirectories
+        download_watcher = new_download_watcher()
+        for collated_jps_torrent_id, data, _ in collated_torrents:
+            download_watcher.add(collated_jps_torrent_id, [data['jps_torrent_object']], data)
+        print(f'Waiting up to {download_watcher.timeout_seconds / 60:g} minutes for the files of each torrent to download, '
+              f'or press Ctrl-C to continue immediately...')
+        collated_torrents = download_watcher.wait()
+
+    for _, data, _ in collated_torrents:
         sugoimusic_upload_data = prepare_torrent(jps_torrent_object=data['jps_torrent_object'],
                                                  torrent_group_data=data['torrentgroupdata'],
                                                  mediainfo=mediainfo,
@@ -0,0 +1,183 @@
+"""
+Ledger of the JPS torrents processed in batch mode, so that later runs skip the torrents already uploaded or found to be duplicates
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+# Third-party packages
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.utils import GetArgs, get_state_dir
+
+
+class TorrentLedger:
+    """
+    SQLite ledger of the outcome of every JPS torrent processed in batch mode, keyed by JPS torrent id and by the info hash the
+    torrent has on SM, once that is known. The outcome is one of:
+        'uploaded' when the torrent was uploaded to SM,
+        'dupe' when it was found on SM by its info hash, with the SM torrent id of the duplicate,
+        'filtered' when it was skipped by a filter, with the filter as the detail, or
+        'error' when it could not be processed, with the error as the detail.
+
+    Only 'uploaded' and 'dupe' are final. Filters are chosen for each run, and seeders and errors change, so filtered torrents and
+    torrents with errors are processed again by the next run. A final outcome is never replaced by one that is not final.
+
+    The ledger also keeps cursors, the highest JPS torrent id processed by a listing such as recent mode.
+
+    :param ledger_path: Path of the database, or ':memory:' for a ledger that is discarded after the run
+    :param read_only: bool: Consult the ledger but never record any outcome, as for --dryrun
+    """
+    final_outcomes = ('uploaded', 'dupe')
+
+    def __init__(self, ledger_path: Union[Path, str], read_only: bool = False):
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.torrents_skipped = 0
+        self.jps_requests_saved = 0
+        self.sm_requests_saved = 0
+
+        self.connection = sqlite3.connect(str(ledger_path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS torrents ('
+                                    'jps_torrent_id TEXT PRIMARY KEY, '
+                                    'jps_group_id TEXT, '
+                                    'outcome TEXT NOT NULL, '
+                                    'sm_torrent_id INTEGER, '
+                                    'sm_torrent_hash TEXT, '
+                                    'detail TEXT, '
+                                    'first_processed REAL NOT NULL, '
+                                    'last_processed REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS torrents_sm_torrent_hash ON torrents (sm_torrent_hash)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS cursors ('
+                                    'cursor_name TEXT PRIMARY KEY, '
+                                    'jps_torrent_id INTEGER NOT NULL, '
+                                    'last_processed REAL NOT NULL)')
+
+    def final_outcome(self, jps_torrent_id: str) -> Optional[str]:
+        """
+        Return the outcome of a torrent if an earlier run recorded a final outcome for it, else None
+
+        :param jps_torrent_id: str
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT outcome FROM torrents WHERE jps_torrent_id = ?', (str(jps_torrent_id),)).fetchone()
+        if row is None or row[0] not in self.final_outcomes:
+            return None
+        return row[0]
+
+    def dupe_sm_torrent_id(self, sm_torrent_hash: str) -> Optional[int]:
+        """
+        Return the SM torrent id of a duplicate already found with the same info hash, so SM does not need to be asked again
+
+        :param sm_torrent_hash: str: Info hash crafted by get_sm_torrent_hash()
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT sm_torrent_id FROM torrents WHERE sm_torrent_hash = ? AND outcome = 'dupe' "
+                                          "AND sm_torrent_id IS NOT NULL", (sm_torrent_hash,)).fetchone()
+        if row is None:
+            return None
+        self.sm_requests_saved += 1
+        return row[0]
+
+    def record(self, jps_group_id: str, jps_torrent_id: str, outcome: str, sm_torrent_id: Optional[int] = None,
+               sm_torrent_hash: Optional[str] = None, detail: Optional[str] = None) -> None:
+        """
+        Record the outcome of processing a torrent, see TorrentLedger for the outcomes
+
+        :param jps_group_id: str
+        :param jps_torrent_id: str
+        :param outcome: str
+        :param sm_torrent_id: int: SM torrent id of the duplicate for 'dupe'
+        :param sm_torrent_hash: str: Info hash crafted by get_sm_torrent_hash(), if the torrent was downloaded
+        :param detail: str: Filter or error for 'filtered' and 'error'
+        """
+        if self.read_only:
+            return
+
+        final_outcomes_sql = ', '.join(f"'{final_outcome}'" for final_outcome in self.final_outcomes)
+        processed_time = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO torrents (jps_torrent_id, jps_group_id, outcome, sm_torrent_id, sm_torrent_hash, detail, '
+                'first_processed, last_processed) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (jps_torrent_id) DO UPDATE SET last_processed = excluded.last_processed, '
+                'jps_group_id = excluded.jps_group_id, '
+                'outcome = excluded.outcome, sm_torrent_id = excluded.sm_torrent_id, detail = excluded.detail, '
+                'sm_torrent_hash = COALESCE(excluded.sm_torrent_hash, torrents.sm_torrent_hash) '
+                f'WHERE excluded.outcome IN ({final_outcomes_sql}) OR torrents.outcome NOT IN ({final_outcomes_sql})',
+                (str(jps_torrent_id), str(jps_group_id), outcome, sm_torrent_id, sm_torrent_hash, detail, processed_time, processed_time))
+        logger.trace(f'Recorded jps_torrent_id {jps_torrent_id} as {outcome} in the ledger')
+
+    def cursor(self, cursor_name: str) -> Optional[int]:
+        """
+        Return the highest JPS torrent id processed by the listing cursor_name, or None if it has never been processed
+
+        :param cursor_name: str
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT jps_torrent_id FROM cursors WHERE cursor_name = ?', (cursor_name,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_cursor(self, cursor_name: str, jps_torrent_id: int) -> None:
+        """
+        Advance the cursor of the listing cursor_name to jps_torrent_id, a cursor never moves back
+
+        :param cursor_name: str
+        :param jps_torrent_id: int: Highest JPS torrent id processed
+        """
+        if self.read_only:
+            return
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO cursors (cursor_name, jps_torrent_id, last_processed) VALUES (?, ?, ?) '
+                'ON CONFLICT (cursor_name) DO UPDATE SET jps_torrent_id = excluded.jps_torrent_id, last_processed = excluded.last_processed '
+                'WHERE excluded.jps_torrent_id > cursors.jps_torrent_id',
+                (cursor_name, int(jps_torrent_id), time.time()))
+
+    def stats(self) -> str:
+        """
+        Return how many torrents the ledger skipped and the requests that saved
+        """
+        return f'{self.torrents_skipped} torrents skipped as processed in an earlier run, saving {self.jps_requests_saved} JPS requests ' \
+               f'and {self.sm_requests_saved} SM requests'
+
+
+class GetTorrentLedger:
+    """
+    Implement the TorrentLedger as a singleton, stored in the State directory
+    """
+
+    __torrent_ledger = None
+    __torrent_ledger_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        with GetTorrentLedger.__torrent_ledger_lock:
+            if GetTorrentLedger.__torrent_ledger is None:
+                args = GetArgs()
+                # A load test, recording or replay must neither skip the torrents of earlier runs nor be recorded for later runs
+                if args.parsed.load_test or args.parsed.record or args.parsed.replay:
+                    ledger_path = ':memory:'
+                else:
+                    ledger_path = Path(get_state_dir(), 'ledger.sqlite3')
+                GetTorrentLedger.__torrent_ledger = TorrentLedger(ledger_path, read_only=args.parsed.dryrun)
+
+    def torrent_ledger(self) -> TorrentLedger:
+        """
+        Return singleton TorrentLedger
+        """
+        return GetTorrentLedger.__torrent_ledger
@@ -0,0 +1,208 @@
+"""
+Persistent index of the names of the files and directories in the MediaDirectories, so that media is found without walking them
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Union
+
+# Third-party packages
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.utils import GetArgs, GetConfig, get_state_dir
+
+
+class MediaIndex:
+    """
+    SQLite index of every file and directory in the MediaDirectories by name, so that get_media_location() finds the source data of
+    a torrent with a single lookup rather than walking every MediaDirectories root.
+
+    The index is refreshed incrementally: the mtime of every directory is kept, and only a directory whose mtime has changed, ie.
+    an entry in it was added, removed or renamed, is listed again. A refresh therefore reads one stat per directory rather than
+    every file. The index is rebuilt if the MediaDirectories are changed.
+
+    :param index_path: Path of the database, or ':memory:' for an index that is discarded after the run
+    :param media_roots: Sanitised MediaDirectories from cfg
+    """
+    racy_seconds = 2  # Coarsest mtime resolution of the filesystems media is kept on, FAT and SMB shares
+
+    def __init__(self, index_path: Union[Path, str], media_roots: List[str]):
+        self.media_roots = media_roots
+        self.lock = threading.Lock()
+        self.last_refresh: Optional[float] = None  # monotonic time of the last refresh by this process
+
+        self.connection = sqlite3.connect(str(index_path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS directories ('
+                                    'path TEXT PRIMARY KEY, '
+                                    'mtime_ns INTEGER NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                                    'path TEXT PRIMARY KEY, '
+                                    'parent TEXT NOT NULL, '
+                                    'name TEXT NOT NULL, '
+                                    'is_directory INTEGER NOT NULL, '
+                                    'is_symlink INTEGER NOT NULL, '
+                                    'root_index INTEGER NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS entries_name ON entries (name, is_directory)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+        if self.meta('media_roots') != json.dumps(media_roots):
+            self.clear()
+
+    def meta(self, key: str) -> Optional[str]:
+        """
+        Return a value kept about the index, or None if it is not set
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def clear(self) -> None:
+        """
+        Empty the index, so that the next refresh lists every directory of the MediaDirectories
+        """
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM directories')
+            self.connection.execute('DELETE FROM entries')
+            self.connection.execute('DELETE FROM meta')
+            self.connection.execute("INSERT INTO meta (key, value) VALUES ('media_roots', ?)", (json.dumps(self.media_roots),))
+        self.last_refresh = None
+
+    def remove_tree(self, path: str) -> None:
+        """
+        Remove a directory that no longer exists, and everything below it, from the index. Must be called with the lock held.
+        """
+        # Everything below path starts with path and os.sep, ie. sorts between path + os.sep and the next character after os.sep
+        below_start, below_end = path + os.sep, path + chr(ord(os.sep) + 1)
+        for table in ('directories', 'entries'):
+            self.connection.execute(f'DELETE FROM {table} WHERE path = ? OR (path >= ? AND path < ?)', (path, below_start, below_end))
+
+    def refresh(self, max_age_seconds: float = 0) -> None:
+        """
+        Bring the index up to date with the MediaDirectories, listing only the directories that have changed since the last refresh
+
+        :param max_age_seconds: Do not refresh if this process refreshed the index less than max_age_seconds ago
+        """
+        if self.last_refresh is not None and time.monotonic() - self.last_refresh < max_age_seconds:
+            return
+
+        refresh_start = time.monotonic()
+        directories_listed = 0
+        with self.lock, self.connection:
+            for root_index, media_root in enumerate(self.media_roots):
+                directories = [media_root]
+                while directories:
+                    directory = directories.pop()
+                    try:
+                        mtime_ns = os.stat(directory).st_mtime_ns
+                    except OSError:
+                        self.remove_tree(directory)
+                        continue
+
+                    row = self.connection.execute('SELECT mtime_ns FROM directories WHERE path = ?', (directory,)).fetchone()
+                    if row is not None and row[0] == mtime_ns:
+                        directories.extend(sub_dir for sub_dir, in self.connection.execute(
+                            'SELECT path FROM entries WHERE parent = ? AND is_directory = 1 AND is_symlink = 0', (directory,)))
+                        continue
+
+                    directories_listed += 1
+                    try:
+                        with os.scandir(directory) as dir_entries:
+                            # As os.walk(), symlinks to directories are directories but are not followed
+                            listing = [(dir_entry.path, dir_entry.name, dir_entry.is_dir(), dir_entry.is_symlink())
+                                       for dir_entry in dir_entries]
+                    except OSError as dir_exc:
+                        logger.warning(f'Unable to index media directory {directory}: {dir_exc}')
+                        continue
+
+                    listed_paths = {path for path, _, _, _ in listing}
+                    for removed_path, in self.connection.execute('SELECT path FROM entries WHERE parent = ?', (directory,)).fetchall():
+                        if removed_path not in listed_paths:
+                            self.remove_tree(removed_path)
+                    self.connection.executemany(
+                        'INSERT OR REPLACE INTO entries (path, parent, name, is_directory, is_symlink, root_index) VALUES (?, ?, ?, ?, ?, ?)',
+                        [(path, directory, name, is_directory, is_symlink, root_index) for path, name, is_directory, is_symlink in listing])
+                    if time.time() - mtime_ns / 1e9 < self.racy_seconds:
+                        # The directory could change again within the resolution of its mtime, so list it again on the next refresh
+                        mtime_ns = -1
+                    self.connection.execute('INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)', (directory, mtime_ns))
+                    directories.extend(path for path, _, is_directory, is_symlink in listing if is_directory and not is_symlink)
+
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_refresh', ?)", (str(time.time()),))
+        self.last_refresh = time.monotonic()
+        logger.debug(f'Refreshed the media index in {self.last_refresh - refresh_start:.1f} seconds, '
+                     f'{directories_listed} directories listed')
+
+    def lookup(self, media_name: str, directory: bool) -> Optional[Path]:
+        """
+        Return the location of the file or directory media_name in the first of the MediaDirectories it is found in, or None
+
+        :param media_name: str name of the file or directory
+        :param directory: boolean true if dir, false if file
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT path FROM entries WHERE name = ? AND is_directory = ? ORDER BY root_index, path LIMIT 1',
+                                          (media_name, int(directory))).fetchone()
+        return None if row is None else Path(row[0])
+
+    def stats(self) -> str:
+        """
+        Return the number of files and directories indexed and when the index was last refreshed
+        """
+        with self.lock:
+            directories, files = self.connection.execute('SELECT SUM(is_directory), SUM(1 - is_directory) FROM entries').fetchone()
+        last_refresh = self.meta('last_refresh')
+        last_refresh = 'never' if last_refresh is None else time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(last_refresh)))
+        return f'{files or 0} files and {directories or 0} directories indexed in {", ".join(self.media_roots)}, last refreshed {last_refresh}'
+
+
+class GetMediaIndex:
+    """
+    Implement the MediaIndex as a singleton, stored in the State directory
+    """
+
+    __media_index = None
+    __media_index_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        with GetMediaIndex.__media_index_lock:
+            if GetMediaIndex.__media_index is None:
+                args = GetArgs()
+                config = GetConfig()
+                if args.parsed.load_test or args.parsed.record or args.parsed.replay:
+                    index_path = ':memory:'
+                else:
+                    index_path = Path(get_state_dir(), 'media-index.sqlite3')
+                GetMediaIndex.__media_index = MediaIndex(index_path, config.media_roots)
+
+    def media_index(self) -> MediaIndex:
+        """
+        Return singleton MediaIndex
+        """
+        return GetMediaIndex.__media_index
+
+
+def run_media_index_command(command: str) -> None:
+    """
+    Rebuild the media index, or show what it holds, for --media-index
+
+    :param command: str: 'rebuild' or 'show'
+    """
+    media_index = GetMediaIndex().media_index()
+    if command == 'rebuild':
+        media_index.clear()
+        media_index.refresh()
+    print(f'Media index: {media_index.stats()}')
@@ -6,20 +6,32 @@ mediainfo processing
 # pylint: disable=fixme
 
 # Standard library packages
+import functools
+import json
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import ctypes
 from io import BytesIO
-from typing import List, Tuple, Dict, Union
+from dataclasses import dataclass
+from typing import BinaryIO, Tuple, Dict, List, Optional, Union
 from pathlib import Path
-import tempfile
 
 # Third-party modules
 from pymediainfo import MediaInfo
 import torrent_parser as tp
-from pyunpack import Archive
 from loguru import logger
 
 # jps2sm modules
+from jps2sm.__init__ import __version__
+from jps2sm.cache import GetMediainfoCache
+from jps2sm.disc_image import DiscImageFile, DiscImageFileReader, get_bluray_main_playlist, list_dvd_files, list_udf_files
 from jps2sm.utils import GetConfig
+from jps2sm.media_index import GetMediaIndex, MediaIndex
+
+MEDIAINFO_BUFFER_SIZE = 64 * 1024  # Bytes fed to libmediainfo at a time when reading a file object, as MediaInfo.parse()
 
 
 def validate_container(file_extension: str) -> str:
@@ -66,8 +78,8 @@ def validate_codec(codec: str) -> str:
 
 def get_mediainfo(jps_torrent_object: BytesIO, media: str) -> Tuple[str, Dict[str, str]]:
     """
-    Get filename(s) of video files in the torrent and run mediainfo and capture the output, extract if DVD found (Blurays not yet supported)
-    then set the appropriate fields for the upload
+    Get filename(s) of video files in the torrent and run mediainfo and capture the output, reading the video files of DVD and Bluray
+    ISOs in place, then set the appropriate fields for the upload
 
     :param jps_torrent_object: bytes: BytesIO object of the JPS torrent
     :param media: str Validated media from collate()
@@ -76,7 +88,6 @@ def get_mediainfo(jps_torrent_object: BytesIO, media: str) -> Tuple[str, Dict[st
             releaseadtaout: Fields gathered from mediainfo for SM upload
     """
 
-    config = GetConfig()
     torrent_metadata = tp.TorrentFileParser(jps_torrent_object).parse()
     torrent_name = torrent_metadata['info']['name']  # Directory if >1 file, otherwise it is filename
     # print(torrentmetadata)
@@ -88,56 +99,79 @@ def get_mediainfo(jps_torrent_object: BytesIO, media: str) -> Tuple[str, Dict[st
     torrent_has_directory = bool('files' in torrent_metadata['info'].keys())
 
     logger.info(f'According to torrent metadata the dir/file is is {torrent_name}')
-    file_path = get_media_location(torrent_name, torrent_has_directory, config.media_roots)
+    file_path = get_media_location(torrent_name, torrent_has_directory, GetMediaIndex().media_index())
+
+    # Use the result of an earlier analysis of the same files if none of them have changed since
+    if torrent_has_directory:
+        media_files = [Path(*[file_path, *file['path']]) for file in torrent_metadata['info']['files']]
+    else:
+        media_files = [file_path]
+    # Files larger than MediainfoReadLimitMB are analysed from their start and end only, unless fields are missing from that
+    read_limit = GetConfig().mediainfo_read_limit_mb * 1024 * 1024 or None
+    mediainfo_cache = GetMediainfoCache().mediainfo_cache()
+    mediainfo_cache_key = get_mediainfo_cache_key(media_files, media, read_limit) if mediainfo_cache is not None else None
+    if mediainfo_cache_key is not None and (cached_mediainfo := mediainfo_cache.get(mediainfo_cache_key)) is not None:
+        logger.info(f'Using the mediainfo of {torrent_name} cached when it was last analysed')
+        return cached_mediainfo[0]
+
+    # Each file is parsed once, for its text output, its duration and the SM video fields if it is the main file
+    parsed_media_files = {}
     if not torrent_has_directory:
         release_data_from_mediainfo['multiplefiles'] = False
-        mediainfo_whole_str += str(MediaInfo.parse(file_path, output=""))
-        release_data_from_mediainfo['duration'] += get_mediainfo_duration(file_path)
+        parsed_media_files[file_path] = parse_media_file(file_path, read_limit)
         file_for_sm_upload_video_fields = file_path
     else:
         release_data_from_mediainfo['multiplefiles'] = True
-        for file in torrent_metadata['info']['files']:
-            file_name = os.path.join(*[file_path, *file['path']])  # Each file in the directory of source data for the torrent
-            mediainfo_whole_str += str(MediaInfo.parse(file_name, output=""))
-            release_data_from_mediainfo['duration'] += get_mediainfo_duration(file_name)  # TODO should this reference file_path directly?
+        # Each file in the directory of source data for the torrent
+        parsed_media_files.update(zip(media_files, parse_media_files(media_files, read_limit)))
         # Get biggest file and mediainfo on this to set the fields for the release
         max_file = max(torrent_metadata['info']['files'], key=lambda x: x['length'])  # returns {'length': int, 'path': [str]} of largest file
         # Assume the largest file is the main file that should populate SM upload fields
         file_for_sm_upload_video_fields = Path(*[file_path, *max_file['path']])
+    for parsed_media_file in parsed_media_files.values():
+        mediainfo_whole_str += parsed_media_file.text
+        release_data_from_mediainfo['duration'] += parsed_media_file.duration
 
     if file_for_sm_upload_video_fields is None:
         raise RuntimeError("Error in parsing torrent meta data to get the filename used for populating the SM media fields.")
 
     if file_for_sm_upload_video_fields.suffix == '.iso' and media == 'DVD':
-        # If DVD, extract the ISO and run mediainfo against appropriate files, if BR we skip as pyunpack (patool/7z) cannot extract them
+        # If DVD, run mediainfo against appropriate files read in place from the ISO
+        release_data_from_mediainfo['container'] = 'ISO'
+        logger.info(f'Reading the files of ISO {file_for_sm_upload_video_fields} to obtain mediainfo on it...')
+        isovideoextensions = ('.vob',)
+        image_files = list_dvd_files(file_for_sm_upload_video_fields)
+        # Only gather mediainfo for DVD video files
+        iso_video_files = [image_file for image_file in image_files if image_file.suffix.lower() in isovideoextensions]
+        for iso_video_file, parsed_media_file in zip(iso_video_files, parse_media_files(iso_video_files, read_limit)):
+            parsed_media_files[iso_video_file] = parsed_media_file
+            mediainfo_whole_str += parsed_media_file.text
+            release_data_from_mediainfo['duration'] += parsed_media_file.duration
+
+        # Assume the largest file is the main file that should populate SM upload fields
+        file_for_sm_upload_video_fields = max(image_files, key=lambda image_file: image_file.size)
+        if file_for_sm_upload_video_fields not in parsed_media_files:
+            parsed_media_files[file_for_sm_upload_video_fields] = parse_media_file(file_for_sm_upload_video_fields, read_limit)
+
+    elif file_for_sm_upload_video_fields.suffix == '.iso' and media == 'Bluray':
+        # If BR, run mediainfo against the largest M2TS stream of the main playlist, read in place from the UDF file system of the ISO.
+        # A disc can have hundreds of streams, so only this one is analysed.
         release_data_from_mediainfo['container'] = 'ISO'
-        logger.info(f'Extracting ISO {file_for_sm_upload_video_fields} to obtain mediainfo on it...')
-        isovideoextensions = ('.vob', '.m2ts')
-        tempdir = tempfile.TemporaryDirectory()
-        Archive(file_for_sm_upload_video_fields).extractall(tempdir.name)
-        dir_files = []
-        for root, sub_folder, files in os.walk(tempdir.name):
-            for item in files:
-                filenamewithpath = os.path.join(root, item)
-                dir_files.append(filenamewithpath)
-                if list(filter(filenamewithpath.lower().endswith,
-                               isovideoextensions)):  # Only gather mediainfo for DVD video files (BR when supported)
-                    mediainfo_whole_str += str(MediaInfo.parse(filenamewithpath, text=True))
-                    release_data_from_mediainfo['duration'] += get_mediainfo_duration(filenamewithpath)
-
-        filesize = lambda f: os.path.getsize(f)
-        file_for_sm_upload_video_fields = sorted(dir_files, key=filesize)[-1]  # Assume the largest file is the main file that should populate SM upload fields
-
-    # Now we have decided which file will have its mediainfo parsed for SM fields, parse its mediainfo
+        logger.info(f'Reading the main playlist of Bluray ISO {file_for_sm_upload_video_fields} to obtain mediainfo on it...')
+        main_playlist = get_bluray_main_playlist(list_udf_files(file_for_sm_upload_video_fields))
+        file_for_sm_upload_video_fields = max(main_playlist.streams, key=lambda stream: stream.size)
+        parsed_media_files[file_for_sm_upload_video_fields] = parse_media_file(file_for_sm_upload_video_fields, read_limit)
+        mediainfo_whole_str += parsed_media_files[file_for_sm_upload_video_fields].text
+        # The main feature is often split across several streams, so the duration is that of the whole playlist
+        release_data_from_mediainfo['duration'] += main_playlist.duration
+
+    # Now we have decided which file will have its mediainfo parsed for SM fields, use its mediainfo
     logger.debug(f'file_for_sm_upload_video_fields is {file_for_sm_upload_video_fields}')
-    mediainfo_release_data = MediaInfo.parse(file_for_sm_upload_video_fields)
+    mediainfo_release_data = parsed_media_files[file_for_sm_upload_video_fields].media_info
     # Remove path to file in case it reveals usernames etc.
     replacement = str(Path(file_path).parent)
     mediainfo_whole_str = mediainfo_whole_str.replace(replacement, '')
 
-    if Path(file_for_sm_upload_video_fields).suffix == '.iso' and media == 'DVD':
-        tempdir.cleanup()  # TODO This looks like it can be moved to the if block above
-
     mediainfo_general = mediainfo_video = mediainfo_audio = None
 
     for track in mediainfo_release_data.tracks:
@@ -159,9 +193,43 @@ def get_mediainfo(jps_torrent_object: BytesIO, media: str) -> Tuple[str, Dict[st
     release_data_from_mediainfo.update(video_fields_from_mediainfo)
 
     logger.debug(f'Mediainfo interpreted data: {release_data_from_mediainfo}')
+    if mediainfo_cache_key is not None:
+        mediainfo_cache.set(mediainfo_cache_key, (mediainfo_whole_str, release_data_from_mediainfo))
     return mediainfo_whole_str, release_data_from_mediainfo
 
 
+def get_mediainfo_cache_key(media_files: List[Path], media: str, read_limit: Optional[int]) -> Optional[str]:
+    """
+    Return the key of the result of get_mediainfo() in the mediainfo cache: the path, size and mtime of every file of the torrent,
+    the media, the read limit and the versions of libmediainfo and jps2sm, as any of them can change the result.
+    None if a file cannot be read.
+
+    :param media_files: list of Path of every file of the torrent
+    :param media: str Validated media from collate()
+    :param read_limit: Maximum number of bytes read of each file, None for no limit
+    """
+    media_file_keys = []
+    for media_file in media_files:
+        try:
+            media_file_stat = media_file.stat()
+        except OSError:
+            return None
+        media_file_keys.append([str(media_file.resolve()), media_file_stat.st_size, media_file_stat.st_mtime_ns])
+
+    return json.dumps({'files': media_file_keys, 'media': media, 'read_limit': read_limit,
+                       'mediainfo': get_mediainfo_version(), 'jps2sm': __version__})
+
+
+@functools.lru_cache(maxsize=None)
+def get_mediainfo_version() -> str:
+    """
+    Return the version of libmediainfo
+    """
+    lib, handle, lib_version_str, _ = MediaInfo._get_library()  # pylint: disable=protected-access
+    lib.MediaInfo_Delete(handle)
+    return lib_version_str
+
+
 def get_video_fields_from_mediainfo(general: Dict, video: Dict, audio: Dict) -> Dict:
     """
     Determine the SM video fields from mediainfo track data
@@ -178,7 +246,7 @@ def get_video_fields_from_mediainfo(general: Dict, video: Dict, audio: Dict) ->
     video_fields_from_mediainfo['container'] = validate_container(general['file_extension'].upper())
     if file_extension == 'VOB':
         video_fields_from_mediainfo['category'] = 'DVD'
-    elif file_extension == 'M2TS':  # Not used yet as we cannot handle Bluray / UDF
+    elif file_extension == 'M2TS':
         video_fields_from_mediainfo['category'] = 'Bluray'
 
     # Video track
@@ -232,54 +300,263 @@ def determine_interfaced(video_track_mediainfo):
         return 'Progressive'
 
 
-def get_mediainfo_duration(filename: Union[str, Path]) -> float:
+@dataclass(frozen=True)
+class ParsedMediaFile:
+    """
+    Mediainfo of a file from a single parse by parse_media_file()
+
+    :param text: str: Text output of mediainfo, as submitted in the 'mediainfo' field
+    :param media_info: MediaInfo with the tracks of the file
+    """
+    text: str
+    media_info: MediaInfo
+
+    @property
+    def duration(self) -> float:
+        """
+        Duration in the 'General' track, in ms
+        """
+        return get_mediainfo_duration(self.media_info)
+
+
+def parse_media_file_outputs(filename: Union[str, Path, DiscImageFile], read_limit: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Parse a file with mediainfo once, rendering both its text output and the XML output that MediaInfo reads its tracks from.
+    MediaInfo.parse() renders a single output for each parse, so this sets up libmediainfo with the same options as it, which
+    is why setup.cfg only allows the pymediainfo versions whose MediaInfo._get_library() and options these have been checked against.
+    Only strings are returned so that it can be run by the processes of GetMediainfoPool.
+
+    A file larger than read_limit is first parsed from at most read_limit bytes of it, see feed_mediainfo_buffer(), and only read
+    in full if that parse is missing any of the fields that get_mediainfo() needs.
+
+    :param filename: Path of the file, or a DiscImageFile to read from within its disc image
+    :param read_limit: Maximum number of bytes to read of the file before falling back to reading all of it, None for no limit
+    :return: mediainfo_text, mediainfo_xml
+    """
+    if read_limit is not None:
+        size = filename.size if isinstance(filename, DiscImageFile) else os.path.getsize(filename)
+        if size > read_limit:
+            mediainfo_text, mediainfo_xml = read_media_file_outputs(filename, read_limit)
+            if has_required_mediainfo_fields(MediaInfo(mediainfo_xml)):
+                return mediainfo_text, mediainfo_xml
+            logger.info(f'Mediainfo from {read_limit} bytes of the start and end of {filename} is missing fields, reading all of it')
+
+    return read_media_file_outputs(filename)
+
+
+def read_media_file_outputs(filename: Union[str, Path, DiscImageFile], read_limit: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Parse a file with libmediainfo, see parse_media_file_outputs()
+
+    :param filename: Path of the file, or a DiscImageFile to read from within its disc image
+    :param read_limit: Maximum number of bytes to read of the file, None to let libmediainfo read as much as it needs
+    :return: mediainfo_text, mediainfo_xml
+    """
+    # pylint: disable=protected-access
+    lib, handle, _, lib_version = MediaInfo._get_library()
+    xml_option = "OLDXML" if lib_version >= (17, 10) else "XML"  # The XML option was renamed starting with version 17.10
+    if lib_version >= (18, 3):
+        lib.MediaInfo_Option(handle, "Cover_Data", "")
+    lib.MediaInfo_Option(handle, "CharSet", "UTF-8")
+    lib.MediaInfo_Option(handle, "Complete", "1")
+    lib.MediaInfo_Option(handle, "ParseSpeed", "0.5")
+    lib.MediaInfo_Option(handle, "LegacyStreamDisplay", "")
+    try:
+        if isinstance(filename, DiscImageFile):
+            # The name is only used for the 'Complete name' and the file extension, the file is read from the image
+            lib.MediaInfo_Option(handle, "File_FileName", filename.path)
+            with open(filename.image_path, "rb") as image_file:
+                feed_mediainfo_buffer(lib, handle, DiscImageFileReader(image_file, filename), filename.size, read_limit)
+        elif read_limit is not None:
+            lib.MediaInfo_Option(handle, "File_FileName", str(filename))
+            with open(filename, "rb") as media_file:
+                feed_mediainfo_buffer(lib, handle, media_file, os.fstat(media_file.fileno()).st_size, read_limit)
+        elif lib.MediaInfo_Open(handle, str(filename)) == 0:
+            if not os.path.exists(filename):
+                raise FileNotFoundError(filename)
+            raise RuntimeError(f'An error occured while opening {filename} with libmediainfo')
+        lib.MediaInfo_Option(handle, "Inform", "")
+        mediainfo_text = lib.MediaInfo_Inform(handle, 0)
+        lib.MediaInfo_Option(handle, "Inform", xml_option)
+        mediainfo_xml = lib.MediaInfo_Inform(handle, 0)
+    finally:
+        lib.MediaInfo_Close(handle)
+        lib.MediaInfo_Delete(handle)
+
+    return mediainfo_text, mediainfo_xml
+
+
+def feed_mediainfo_buffer(lib, handle, reader: BinaryIO, size: int, read_limit: Optional[int] = None) -> int:
+    """
+    Feed a file object to libmediainfo through its buffer API, seeking wherever libmediainfo asks to read next,
+    as MediaInfo.parse() does for file objects.
+
+    With a read_limit, the file is read as a head window of the first half of read_limit bytes, which has the stream info, and a tail
+    window of the last half, which has the last timestamps that the duration is from. Seeks that libmediainfo asks for still count
+    towards read_limit, so no more than read_limit bytes are read.
+
+    :param lib: libmediainfo from MediaInfo._get_library()
+    :param handle: libmediainfo handle
+    :param reader: Seekable file object to read from
+    :param size: Size of the file in bytes
+    :param read_limit: Maximum number of bytes to read, None to read as much as libmediainfo asks for
+    :return: Number of bytes read
+    """
+    no_seek = ctypes.c_uint64(-1).value
+    tail_window_start = None if read_limit is None else max(0, size - read_limit // 2)
+    bytes_read = 0
+    lib.MediaInfo_Open_Buffer_Init(handle, size, 0)
+    while read_limit is None or bytes_read < read_limit:
+        if tail_window_start is not None and bytes_read >= read_limit - read_limit // 2 and reader.tell() < tail_window_start:
+            # The head window has been read and libmediainfo has not asked to skip ahead itself, so skip to the tail window once
+            reader.seek(tail_window_start)
+            lib.MediaInfo_Open_Buffer_Init(handle, size, reader.tell())
+            tail_window_start = None
+        buffer = reader.read(MEDIAINFO_BUFFER_SIZE if read_limit is None else min(MEDIAINFO_BUFFER_SIZE, read_limit - bytes_read))
+        if not buffer:
+            break
+        bytes_read += len(buffer)
+        if lib.MediaInfo_Open_Buffer_Continue(handle, buffer, len(buffer)) & 0x08:  # Finished
+            break
+        seek = lib.MediaInfo_Open_Buffer_Continue_GoTo_Get(handle)
+        if seek != no_seek:
+            reader.seek(seek)
+            lib.MediaInfo_Open_Buffer_Init(handle, size, reader.tell())
+    lib.MediaInfo_Open_Buffer_Finalize(handle)
+    return bytes_read
+
+
+def has_required_mediainfo_fields(media_info: MediaInfo) -> bool:
+    """
+    Return if mediainfo has every field that get_mediainfo() uses: the duration, and the fields of the SM video fields
+    from each video and audio track, of which there must be at least one
+
+    :param media_info: MediaInfo of a file
+    """
+    required_fields = {
+        'General': ('duration', 'file_extension'),
+        'Video': ('commercial_name', 'width', 'height'),
+        'Audio': ('format',),
+    }
+    if not media_info.video_tracks and not media_info.audio_tracks:
+        return False
+    for track in media_info.tracks:
+        if any(getattr(track, field) is None for field in required_fields.get(track.track_type, ())):
+            return False
+    return True
+
+
+def parse_media_file(filename: Union[str, Path, DiscImageFile], read_limit: Optional[int] = None) -> ParsedMediaFile:
+    """
+    Parse a file with mediainfo once, see parse_media_file_outputs()
+
+    :param filename: Path of the file
+    :param read_limit: Maximum number of bytes to read of the file before falling back to reading all of it, None for no limit
+    :return: ParsedMediaFile
+    """
+    mediainfo_text, mediainfo_xml = parse_media_file_outputs(filename, read_limit)
+    return ParsedMediaFile(text=mediainfo_text, media_info=MediaInfo(mediainfo_xml))
+
+
+def parse_media_files(filenames: List[Union[Path, DiscImageFile]], read_limit: Optional[int] = None) -> List[ParsedMediaFile]:
     """
-    Get duration in mediainfo for filename
+    Parse several files with mediainfo, in parallel with the processes of GetMediainfoPool if there is more than one
+
+    :param filenames: list of Path of the files, or of DiscImageFile
+    :param read_limit: Maximum number of bytes to read of each file before falling back to reading all of it, None for no limit
+    :return: list of ParsedMediaFile, in the order of filenames
+    """
+    mediainfo_pool = GetMediainfoPool().mediainfo_pool()
+    if mediainfo_pool is not None and len(filenames) > 1:
+        try:
+            # map() returns the results in the order of filenames, so the text output and duration are the same as parsing them in turn
+            return [ParsedMediaFile(text=mediainfo_text, media_info=MediaInfo(mediainfo_xml))
+                    for mediainfo_text, mediainfo_xml in mediainfo_pool.map(parse_media_file_outputs, filenames, [read_limit] * len(filenames))]
+        except BrokenProcessPool:
+            logger.warning('A mediainfo process exited unexpectedly, analysing the files without the process pool')
+            GetMediainfoPool.disable()
+
+    return [parse_media_file(filename, read_limit) for filename in filenames]
+
 
-    :param filename:
+class GetMediainfoPool:
+    """
+    Implement the pool of processes that parse_media_files() analyses files with as a singleton, with MediainfoWorkers processes
+    set in jps2sm.cfg. The processes are spawned rather than forked, as batch mode has other threads running.
+    """
+
+    __mediainfo_pool = None
+    __mediainfo_pool_lock = threading.Lock()
+    __mediainfo_pool_created = False
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        with GetMediainfoPool.__mediainfo_pool_lock:
+            if not GetMediainfoPool.__mediainfo_pool_created:
+                config = GetConfig()
+                if config.mediainfo_workers > 1:
+                    GetMediainfoPool.__mediainfo_pool = ProcessPoolExecutor(max_workers=config.mediainfo_workers,
+                                                                            mp_context=multiprocessing.get_context('spawn'))
+                GetMediainfoPool.__mediainfo_pool_created = True
+
+    @staticmethod
+    def disable() -> None:
+        """
+        Stop using the pool, after one of its processes has exited unexpectedly
+        """
+        with GetMediainfoPool.__mediainfo_pool_lock:
+            GetMediainfoPool.__mediainfo_pool = None
+            GetMediainfoPool.__mediainfo_pool_created = True
+
+    def mediainfo_pool(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Return singleton ProcessPoolExecutor, or None if MediainfoWorkers is 1
+        """
+        return GetMediainfoPool.__mediainfo_pool
+
+
+def get_mediainfo_duration(media_info: MediaInfo) -> float:
+    """
+    Get duration in the mediainfo of a file
+
+    :param media_info: MediaInfo of the file
     :return: float ms
     """
-    mediainfo_for_duration = MediaInfo.parse(filename)
-    for track in mediainfo_for_duration.tracks:
+    for track in media_info.tracks:
         if track.track_type == 'General':
             if track.duration is None:
                 return 0
-            logger.info(f'Mediainfo duration: {filename} {track.duration}')
+            logger.info(f'Mediainfo duration: {track.complete_name} {track.duration}')
             return float(track.duration)  # time in ms
 
     raise RuntimeError('Bad mediainfo presented to get_mediainfo_duration. Missing "General" track type')
 
 
-def get_media_location(media_name: str, directory: bool, media_roots: List[str]) -> Path:
+def get_media_location(media_name: str, directory: bool, media_index: MediaIndex) -> Path:
     """
     Find the location of the directory or file of the source data for get_mediainfo()
 
     :param media_name: str name of the file or directory
     :param directory: boolean true if dir, false if file
-    :param media_roots: Sanitised MediaDirectories from cfg
+    :param media_index: MediaIndex of the MediaDirectories
 
     :return: full path to file/dir
     """
 
-    # Find the file/dir and stop on the first hit, hopefully OS-side disk cache will mean this will not take too long
-
-    media_location = None
+    # Look the file/dir up in the media index, only refreshing the index if it is not found or it has been moved since it was indexed
+    config = GetConfig()
     logger.info(f'Searching for {media_name}...')
 
-    for media_dir_search in media_roots:
-        for dir_name, dir_names, filenames in os.walk(media_dir_search):
-            if directory is True:
-                for sub_dir_name in dir_names:
-                    if sub_dir_name == media_name:
-                        media_location = os.path.join(dir_name, sub_dir_name)
-                        return Path(media_dir_search, media_location)
-            else:
-                for filename in filenames:
-                    if filename == media_name:
-                        media_location = os.path.join(dir_name, filename)
-                        return Path(media_dir_search, media_location)
+    media_location = media_index.lookup(media_name, directory)
+    if media_location is None or not media_location.exists():
+        media_index.refresh(max_age_seconds=config.media_index_refresh_secs)
+        media_location = media_index.lookup(media_name, directory)
+    if media_location is not None:
+        return media_location
 
     # If we get this far the media was not found
-    media_not_found_error_msg = f'Mediainfo error - file/directory not found: {media_name} in any of the MediaDirectories specified: {media_roots}'
+    media_not_found_error_msg = f'Mediainfo error - file/directory not found: {media_name} in any of the MediaDirectories specified: {media_index.media_roots}'
     logger.error(media_not_found_error_msg)
     raise RuntimeError(media_not_found_error_msg)
@@ -4,12 +4,319 @@ Handle login sessions for JPS and SM
 # pylint: disable=no-name-in-module,import-error
 # pylint appears to have a bug where it cannot import despite python itself being able to
 
+# Standard library packages
+import os
+import pickle
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
 # Third-party packages
+from loguru import logger
 from requestsloginsession import RequestsLoginSession
 
 # jps2sm modules
 from jps2sm.utils import GetConfig
 from jps2sm.constants import LoginParameters
+from jps2sm.ratelimit import GetJPSRateLimiter, RateLimiter
+from jps2sm.cache import GetResponseCache
+from jps2sm.cassette import Cassette, GetCassette
+
+# Number of times a request is retried after pausing if the site reports its quota has been exceeded
+QUOTA_EXCEEDED_RETRIES = 3
+
+# Minimum number of seconds between saves of the session file by retrieve_content(), so that every request does not rewrite it
+SESSION_SAVE_INTERVAL_SECS = 60
+
+
+class CountingLoginSession(RequestsLoginSession):
+    """
+    RequestsLoginSession that counts the number of real logins it performs, rather than re-using a cached session.
+
+    The session is shared by the worker threads of batch mode, so the session file is saved under save_lock, at most every
+    SESSION_SAVE_INTERVAL_SECS rather than after every request, and without the os.umask(0) of RequestsLoginSession that
+    would change the permissions of files created by the other threads.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.logins = 0
+        self.save_lock = threading.Lock()
+        self.last_saved = 0.0
+        super().__init__(*args, **kwargs)
+
+    def login(self) -> None:
+        """
+        Login or load the session from the session file, saving the session with the next request
+        """
+        super().login()
+        self.last_saved = 0.0
+
+    def create_new_session(self):
+        """
+        Create a new requests.Session() and login, counting the login
+        """
+        self.logins += 1
+        return super().create_new_session()
+
+    def save_session_to_cache(self) -> None:
+        """
+        Save the session to the session file, replacing it in one step so that it is never left truncated
+        """
+        with self.save_lock:
+            self.last_saved = time.time()
+            temp_session_file = self.session_file.with_name(f'{self.session_file.name}.{os.getpid()}.{threading.get_ident()}')
+            descriptor = os.open(temp_session_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(descriptor, "wb") as session_file:
+                pickle.dump(self.session, session_file)
+            os.replace(temp_session_file, self.session_file)
+
+    def retrieve_content(self, url: str, method: str = "get", post_data=None, post_data_files=None, **kwargs):
+        """
+        Get/Post content with the session, saving the session if it has not been saved recently
+
+        :param url: URL to get/post
+        :param method: HTML method
+        :param post_data: Parameters to send in POST
+        :param post_data_files: Files to send in POST
+        :return: requests response
+        """
+        if method == 'get':
+            res = self.session.get(url, proxies=self.proxies, **kwargs)
+        else:
+            res = self.session.post(url, data=post_data, proxies=self.proxies, files=post_data_files, **kwargs)
+
+        if time.time() - self.last_saved >= SESSION_SAVE_INTERVAL_SECS:
+            self.save_session_to_cache()
+
+        return res
+
+
+class SiteSession:
+    """
+    Hold a single RequestsLoginSession for a site for the lifetime of the process, so that every request re-uses the same
+    requests.Session() and its keep-alive connection pool instead of building a new session (and logging in) each time.
+
+    The site is only logged into again if a response shows that the session has expired.
+
+    :param login_url: URL used to login to the site
+    :param test_url: URL used to test that the login has succeeded
+    :param success_string: String to search for in test_url to ascertain if the login has succeeded
+    :param login_data: Credentials in the format of: {'username' : 'userstr', 'password' : 'passstr' }
+    :param rate_limiter: RateLimiter every request must acquire a token from, if any
+    :param quota_exceeded_string: String the site responds with when the rate_limiter quota has been exceeded
+    :param cassette: Cassette to record every response to or replay every response from, if any
+    :param site_url_override: URL to send every request for the site to instead, eg. the fake site of fakeserver
+    """
+    # The login parameters, the pooled session and how requests are paced and recorded are all state of the site that every
+    # request needs, so they are held together rather than split into objects that would only be used by this class
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, login_url: str, test_url: str, success_string: str, login_data: Dict[str, str], *,
+                 rate_limiter: RateLimiter = None, quota_exceeded_string: str = None, cassette: Cassette = None,
+                 site_url_override: str = None):
+        # pylint: disable=too-many-arguments
+        self.site_url = f'{urlparse(login_url).scheme}://{urlparse(login_url).netloc}'
+        self.site_url_override = site_url_override
+        self.login_url = self.override_url(login_url)
+        self.test_url = self.override_url(test_url)
+        self.success_string = success_string
+        self.login_data = login_data
+        self.rate_limiter = rate_limiter
+        self.quota_exceeded_string = quota_exceeded_string
+        self.cassette = cassette
+        self.login_session = None
+        self.login_tested = False
+        self.login_lock = threading.Lock()
+        self.stats = {
+            'connections_opened': 0,
+            'connections_reused': 0,
+        }
+
+    def override_url(self, url: str) -> str:
+        """
+        Return url with the site replaced by site_url_override, if set
+
+        :param url: URL of the site
+        """
+        if self.site_url_override is None or not url.startswith(self.site_url):
+            return url
+        return self.site_url_override + url[len(self.site_url):]
+
+    def get_login_session(self, test_login: bool = False) -> RequestsLoginSession:
+        """
+        Return the login session for the site, creating it on first use
+
+        :param test_login: Test the login if it has not already been tested
+        """
+        with self.login_lock:
+            if self.login_session is None:
+                self.login_session = CountingLoginSession(self.login_url, self.login_data, self.test_url, self.success_string, test_login)
+                self.login_tested = test_login
+            elif test_login and not self.login_tested:
+                self.login_session.test_login()
+                self.login_tested = True
+
+        return self.login_session
+
+    def relogin(self) -> None:
+        """
+        Force a new login, keeping the connection statistics of the requests.Session() that is being replaced
+        """
+        with self.login_lock:
+            self.add_pool_stats(self.stats)
+            self.login_session.force_login = True
+            self.login_session.login()
+            self.login_session.force_login = False
+
+    def session_expired(self, res) -> bool:
+        """
+        Detect if the site has redirected us to the login page, meaning that the session has expired
+
+        :param res: requests response
+        """
+        return bool(res.history) and urlparse(res.url).path == urlparse(self.login_url).path
+
+    def retrieve_content(self, url: str, method: str = "get", post_data=None, post_data_files=None, test_login: bool = False):
+        """
+        Get/Post content with the site's login session, logging in again once if the session has expired and pausing then
+        retrying if the quota of the site has been exceeded. Every attempt, including the retries, takes a token from rate_limiter.
+
+        :param url: URL to get/post
+        :param method: HTML method
+        :param post_data: Parameters to send in POST
+        :param post_data_files: Files to send in POST
+        :param test_login: Test the login if it has not already been tested
+        :return: requests response
+        """
+        if self.cassette is not None and self.cassette.mode == 'replay':
+            return self.cassette.replay(method, url, post_data)
+
+        request_url = self.override_url(url)
+        quota_exceeded_pauses = 0
+        relogged_in = False
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            res = self.get_login_session(test_login).retrieve_content(request_url, method, post_data, post_data_files)
+
+            if self.session_expired(res) and not relogged_in:
+                logger.debug(f'Session for {self.login_url} has expired, logging in again')
+                self.relogin()
+                relogged_in = True
+                self.rewind_files(post_data_files)
+                continue
+
+            if self.quota_exceeded_string is None or self.quota_exceeded_string.encode() not in res.content:
+                if self.cassette is not None:
+                    self.cassette.record(method, url, post_data, res)
+                return res
+
+            if quota_exceeded_pauses == QUOTA_EXCEEDED_RETRIES:
+                raise RuntimeError(f'Quota still exceeded after pausing {QUOTA_EXCEEDED_RETRIES} times when retrieving {url}')
+            quota_exceeded_pauses += 1
+            relogged_in = False  # The session may expire during the pause
+            if self.rate_limiter is not None:
+                self.rate_limiter.quota_exceeded()
+            self.rewind_files(post_data_files)
+
+    @staticmethod
+    def rewind_files(post_data_files) -> None:
+        """
+        Rewind the file objects of post_data_files, as they are consumed by a POST that then needs to be retried
+        """
+        for file_tuple in (post_data_files or {}).values():
+            file_tuple[1].seek(0)
+
+    def add_pool_stats(self, stats: Dict[str, int]) -> None:
+        """
+        Add the connection statistics of the current requests.Session() connection pools to stats
+
+        :param stats: dict with connections_opened and connections_reused keys
+        """
+        if self.login_session is None:
+            return
+
+        for adapter in self.login_session.session.adapters.values():
+            pool_manager = getattr(adapter, 'poolmanager', None)  # Adapters replaced by requests_mock have no pool manager
+            if pool_manager is None:
+                continue
+            for pool_key in pool_manager.pools.keys():
+                pool = pool_manager.pools[pool_key]
+                stats['connections_opened'] += pool.num_connections
+                stats['connections_reused'] += max(pool.num_requests - pool.num_connections, 0)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Return the connection pool and login statistics of the site
+        """
+        stats = dict(self.stats)
+        self.add_pool_stats(stats)
+        stats['logins'] = self.login_session.logins if self.login_session is not None else 0
+        return stats
+
+
+site_sessions: Dict[str, SiteSession] = {}
+site_sessions_lock = threading.Lock()
+site_url_overrides: Dict[str, str] = {}
+site_rate_limiter_overrides: Dict[str, RateLimiter] = {}
+
+
+def set_site_url_override(site: str, url: str, rate_limiter: RateLimiter = None) -> None:
+    """
+    Send every request for 'jps' or 'sm' to url instead, must be called before the SiteSession of the site is created
+
+    :param site: str: 'jps' or 'sm'
+    :param url: str: eg. http://127.0.0.1:8081
+    :param rate_limiter: RateLimiter to pace the requests to url with instead of the JPS RateLimiter, as its quota and persisted
+                         state belong to the real site
+    """
+    site_url_overrides[site] = url
+    if rate_limiter is not None:
+        site_rate_limiter_overrides[site] = rate_limiter
+
+
+def get_site_session(site: str) -> SiteSession:
+    """
+    Return the SiteSession for 'jps' or 'sm', creating it on first use
+
+    :param site: str: 'jps' or 'sm'
+    """
+    with site_sessions_lock:
+        if site not in site_sessions:
+            config = GetConfig()
+            if site == 'jps':
+                rate_limiter = site_rate_limiter_overrides.get(site)
+                if rate_limiter is None:
+                    rate_limiter = GetJPSRateLimiter().rate_limiter()
+                site_sessions[site] = SiteSession(LoginParameters.jps_login_url,
+                                                  LoginParameters.jps_test_url,
+                                                  LoginParameters.jps_success,
+                                                  {'username': config.jps_user, 'password': config.jps_pass},
+                                                  rate_limiter=rate_limiter,
+                                                  quota_exceeded_string=LoginParameters.jps_quota_exceeded,
+                                                  cassette=GetCassette().cassette(),
+                                                  site_url_override=site_url_overrides.get(site))
+            elif site == 'sm':
+                site_sessions[site] = SiteSession(LoginParameters.sm_login_url,
+                                                  LoginParameters.sm_test_url,
+                                                  LoginParameters.sm_success,
+                                                  {'username': config.sm_user, 'password': config.sm_pass},
+                                                  rate_limiter=site_rate_limiter_overrides.get(site),
+                                                  cassette=GetCassette().cassette(),
+                                                  site_url_override=site_url_overrides.get(site))
+            else:
+                raise RuntimeError(f'Unknown site {site}')
+
+    return site_sessions[site]
+
+
+def session_pool_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Return the connection pool and login statistics for every site used so far
+    """
+    return {site: site_session.pool_stats() for site, site_session in site_sessions.items()}
 
 
 def jpopsuki(url, test_login=False):
@@ -21,14 +328,14 @@ def jpopsuki(url, test_login=False):
     :return: data
     """
 
-    config = GetConfig()
-    login_data = {'username': config.jps_user, 'password': config.jps_pass}
-    jps_session = RequestsLoginSession(LoginParameters.jps_login_url,
-                                       login_data,
-                                       LoginParameters.jps_test_url,
-                                       LoginParameters.jps_success, test_login)
+    response_cache = GetResponseCache().response_cache()
+    if (res := response_cache.get(url)) is not None:
+        return res
+
+    res = get_site_session('jps').retrieve_content(url, test_login=test_login)
+    response_cache.set(url, res)
 
-    return jps_session.retrieve_content(url)
+    return res
 
 
 def sugoimusic(url, method="get", post_data=None, post_data_files=None, test_login=False):
@@ -43,12 +350,4 @@ def sugoimusic(url, method="get", post_data=None, post_data_files=None, test_log
     :return: data
     """
 
-    config = GetConfig()
-    login_data = {'username': config.sm_user, 'password': config.sm_pass}
-    sm_session = RequestsLoginSession(LoginParameters.sm_login_url,
-                                      login_data,
-                                      LoginParameters.sm_test_url,
-                                      LoginParameters.sm_success,
-                                      test_login)
-
-    return sm_session.retrieve_content(url, method, post_data, post_data_files)
+    return get_site_session('sm').retrieve_content(url, method, post_data, post_data_files, test_login=test_login)
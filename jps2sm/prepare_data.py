@@ -15,7 +15,6 @@ import json
 import re
 
 import humanfriendly
-from datasize import DataSize
 from loguru import logger
 
 # jps2sm modules
@@ -23,12 +22,12 @@ from jps2sm.constants import VideoOptions, Categories, DateRegexes
 from jps2sm.get_data import get_release_data
 from jps2sm.mediainfo import get_mediainfo
 from jps2sm.save_data import get_jps_torrent, download_jps_torrent, download_sm_torrent
-from jps2sm.utils import GetConfig, GetArgs, decide_duplicate
+from jps2sm.utils import GetConfig, GetArgs, decide_duplicate, get_sm_torrent_hash
 from jps2sm.validation import validate_jps_video_data, validate_jps_bitrate, decide_exc_filter, decide_music_performance, \
-    get_alternate_fansub_category_id, decide_ep
+    get_alternate_fansub_category_id, decide_ep, decide_max_size
 
 
-def collate(torrentids, torrentgroupdata, max_size=None):
+def collate(torrentids, torrentgroupdata, max_size=None, torrent_ledger=None):
     """
     Collate and validate data ready for upload to SM
 
@@ -43,6 +42,7 @@ def collate(torrentids, torrentgroupdata, max_size=None):
             Always a single torrentid unless specifying a group url in --url mode
     :param torrentgroupdata: dictionary with torrent group data from getgroupdata[]
     :param max_size: str: Maximum size with unit specified, currently only used by recent mode
+    :param torrent_ledger: TorrentLedger: Ledger of earlier batch runs, used to find duplicates without asking SM, batch mode only
     """
     config = GetConfig()
     args = GetArgs()
@@ -50,20 +50,17 @@ def collate(torrentids, torrentgroupdata, max_size=None):
     jps_torrent_downloaded_count = skipped_max_size = skipped_low_seeders = skipped_exc_filter = skipped_dupe_torrent_hash = 0
     dupe_jps_ids = []
     dupe_sm_ids = []
+    dupe_sm_torrent_hashes = []
     jps_torrent_collated_data = {}
 
     for jps_torrent_id, release_data in get_release_data(torrentids, torrentgroupdata.torrent_table, torrentgroupdata.date).items():
 
         logger.info(f'Now processing: {jps_torrent_id} {release_data}')
 
-        if max_size:
-            good_jps_format = release_data['size_units'][:1] + "i" + release_data['size_units'][1:]  # JPS uses 'GB' when it means 'GiB' etc.
-            jps_torrent_size_in_bytes = DataSize(release_data['size_no_units'] + good_jps_format)
-            cfg_max_size_in_bytes = DataSize(max_size)
-            if jps_torrent_size_in_bytes > cfg_max_size_in_bytes:
-                skipped_max_size += 1
-                logger.debug(f"Skipping as torrent is > {max_size}")
-                continue
+        if max_size and decide_max_size(release_data['size_no_units'], release_data['size_units'], max_size):
+            skipped_max_size += 1
+            logger.debug(f"Skipping as torrent is > {max_size}")
+            continue
 
         if int(release_data['seeders']) < config.jps_min_seeders:
             logger.debug(f'Skipping as torrent has < {config.jps_min_seeders} seeder(s)')
@@ -173,7 +170,12 @@ def collate(torrentids, torrentgroupdata, max_size=None):
         jps_torrent_file = get_jps_torrent(jps_torrent_id, torrentgroupdata.torrent_table)
         jps_torrent_object = io.BytesIO(jps_torrent_file.content)  # Keep file in memory as it could be processed and deleted by a torrent client
 
-        if dupe_sugoimusic_torrent_id := decide_duplicate(jps_torrent_object):
+        sm_torrent_hash = get_sm_torrent_hash(jps_torrent_object)
+        if torrent_ledger is not None and (dupe_sugoimusic_torrent_id := torrent_ledger.dupe_sm_torrent_id(sm_torrent_hash)):
+            logger.debug(f'Duplicate of SM torrent {dupe_sugoimusic_torrent_id} found with the torrent hash in the ledger')
+        else:
+            dupe_sugoimusic_torrent_id = decide_duplicate(jps_torrent_object, sm_torrent_hash)
+        if dupe_sugoimusic_torrent_id:
             skipped_dupe_torrent_hash += 1
 
         if dupe_sugoimusic_torrent_id and config.skip_dupes:
@@ -196,12 +198,14 @@ def collate(torrentids, torrentgroupdata, max_size=None):
             logger.warning(dupe_error_msg)
             dupe_jps_ids.append(int(jps_torrent_id))
             dupe_sm_ids.append(int(dupe_sugoimusic_torrent_id))
+            dupe_sm_torrent_hashes.append(sm_torrent_hash)
             continue
 
         jps_torrent_collated_data[jps_torrent_id] = {}
         jps_torrent_collated_data[jps_torrent_id]['jps_torrent_object'] = jps_torrent_object
         jps_torrent_collated_data[jps_torrent_id]['torrentgroupdata'] = torrentgroupdata
         jps_torrent_collated_data[jps_torrent_id]['release_data_collated'] = release_data_collated
+        jps_torrent_collated_data[jps_torrent_id]['sm_torrent_hash'] = sm_torrent_hash
 
     collate_torrent_info = {
         'jps_torrent_collated_data': jps_torrent_collated_data,
@@ -212,6 +216,7 @@ def collate(torrentids, torrentgroupdata, max_size=None):
         'skipped_torrents_duplicate': skipped_dupe_torrent_hash,
         'dupe_jps_ids': dupe_jps_ids,
         'dupe_sm_ids': dupe_sm_ids,
+        'dupe_sm_torrent_hashes': dupe_sm_torrent_hashes,
     }
 
     return collate_torrent_info
@@ -0,0 +1,196 @@
+"""
+Rate limit requests to JPS to stay within its browse quota
+"""
+# pylint: disable=no-name-in-module,import-error
+# pylint appears to have a bug where it cannot import despite python itself being able to
+
+# Standard library packages
+import atexit
+import json
+import threading
+import time
+from pathlib import Path
+
+# Third-party packages
+from loguru import logger
+
+# jps2sm modules
+from jps2sm.utils import GetConfig, get_state_dir
+
+# Minimum number of seconds between saves of the bucket by acquire(), so that every request does not rewrite the state file
+STATE_SAVE_INTERVAL_SECS = 10
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter shared by every JPS request.
+
+    The bucket holds up to budget tokens and is refilled at budget tokens per window_seconds, each request takes a token and
+    waits for one to be refilled if the bucket is empty. Requests are also spaced at least min_interval_seconds apart, so that a
+    full bucket is not spent in a single burst. The bucket is saved to state_file so that runs following each other still share
+    the same quota.
+
+    JPS appears to implement the browse quota as a counter that is reset every 30/60 mins, so if the quota is exceeded
+    regardless the bucket is emptied and further requests are paused for pause_seconds.
+
+    :param budget: int: Maximum number of requests in window_seconds
+    :param window_seconds: int: Length of the quota window
+    :param pause_seconds: int: Time to pause all requests for when the quota has been exceeded
+    :param state_file: Path: File to persist the bucket in, or None to not persist it
+    :param min_interval_seconds: float: Minimum time between the start of requests
+    """
+
+    def __init__(self, budget: int, window_seconds: int, pause_seconds: int, state_file: Path = None, min_interval_seconds: float = 0.0):
+        self.budget = budget
+        self.window_seconds = window_seconds
+        self.pause_seconds = pause_seconds
+        self.state_file = state_file
+        self.min_interval_seconds = min_interval_seconds
+        self.lock = threading.Lock()
+        self.tokens = float(budget)
+        self.last_refill = time.time()
+        self.paused_until = 0.0
+        self.next_request_time = 0.0
+        self.last_saved = 0.0
+        self.requests_made = 0
+        self.time_waited = 0.0
+        self.waiting_threads = 0
+        self.waiting_since = 0.0
+
+        self.load_state()
+
+    def load_state(self) -> None:
+        """
+        Load the bucket saved by a previous run, if any
+        """
+        if self.state_file is None or not self.state_file.exists():
+            return
+
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+            self.tokens = min(float(state['tokens']), self.budget)
+            self.last_refill = float(state['last_refill'])
+            self.paused_until = float(state['paused_until'])
+        except (ValueError, KeyError) as exc:
+            logger.debug(f'Ignoring bad rate limiter state file {self.state_file}: {exc}')
+
+    def save_state(self) -> None:
+        """
+        Save the bucket so that it is used by the next run
+        """
+        if self.state_file is None:
+            return
+
+        self.last_saved = time.time()
+        with open(self.state_file, "w", encoding="utf-8") as state_file:
+            json.dump({'tokens': self.tokens, 'last_refill': self.last_refill, 'paused_until': self.paused_until}, state_file)
+
+    def refill(self, now: float) -> None:
+        """
+        Add the tokens refilled since the last refill
+        """
+        refill_rate = self.budget / self.window_seconds
+        self.tokens = min(self.budget, self.tokens + (now - self.last_refill) * refill_rate)
+        self.last_refill = now
+
+    def time_until_available(self, requests_needed: int = 1) -> float:
+        """
+        Return the number of seconds until requests_needed requests can be made without exceeding the budget
+
+        :param requests_needed: int
+        """
+        with self.lock:
+            now = time.time()
+            self.refill(now)
+            pause_seconds = max(self.paused_until - now, 0)
+            tokens_after_pause = min(self.budget, self.tokens + pause_seconds * self.budget / self.window_seconds)
+            tokens_short = max(requests_needed - tokens_after_pause, 0)
+            interval_seconds = max(self.next_request_time - now, 0) + (requests_needed - 1) * self.min_interval_seconds
+            return max(pause_seconds + tokens_short * self.window_seconds / self.budget, interval_seconds)
+
+    def acquire(self) -> None:
+        """
+        Take a token for a request, sleeping until one is available.
+
+        time_waited is the wall clock time during which at least one thread was waiting, rather than the sum of every thread's
+        waits, so that it is not multiplied by the number of threads waiting at once.
+        """
+        waiting = False
+        try:
+            while True:
+                with self.lock:
+                    now = time.time()
+                    self.refill(now)
+                    if now >= self.paused_until and now >= self.next_request_time and self.tokens >= 1:
+                        self.tokens -= 1
+                        self.requests_made += 1
+                        self.next_request_time = now + self.min_interval_seconds
+                        if now - self.last_saved >= STATE_SAVE_INTERVAL_SECS:
+                            self.save_state()
+                        return
+                    wait_seconds = max(self.paused_until - now, self.next_request_time - now,
+                                       (1 - self.tokens) * self.window_seconds / self.budget)
+                    if not waiting:
+                        waiting = True
+                        if self.waiting_threads == 0:
+                            self.waiting_since = now
+                        self.waiting_threads += 1
+
+                if wait_seconds >= 1:
+                    logger.debug(f'Rate limiting JPS requests, waiting {wait_seconds:.1f} seconds')
+                time.sleep(wait_seconds)
+        finally:
+            if waiting:
+                with self.lock:
+                    self.waiting_threads -= 1
+                    if self.waiting_threads == 0:
+                        self.time_waited += time.time() - self.waiting_since
+
+    def quota_exceeded(self) -> None:
+        """
+        Empty the bucket and pause all requests as JPS has reported that the quota has been exceeded
+        """
+        with self.lock:
+            self.tokens = 0
+            self.last_refill = time.time()
+            self.paused_until = self.last_refill + self.pause_seconds
+            self.save_state()
+
+        logger.warning(f'Browse quota exceeded at JPS, pausing requests for {self.pause_seconds / 60:.0f} minutes...')
+
+    def close(self) -> None:
+        """
+        Save the bucket, including the requests made since acquire() last saved it
+        """
+        with self.lock:
+            self.save_state()
+
+
+class GetJPSRateLimiter:
+    """
+    Implement the JPS RateLimiter as a singleton, configured from jps2sm.cfg
+    """
+
+    __rate_limiter = None
+    __rate_limiter_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Implement singleton
+        """
+        with GetJPSRateLimiter.__rate_limiter_lock:
+            if GetJPSRateLimiter.__rate_limiter is None:
+                config = GetConfig()
+                GetJPSRateLimiter.__rate_limiter = RateLimiter(budget=config.jps_request_budget,
+                                                               window_seconds=60 * config.jps_request_budget_window_mins,
+                                                               pause_seconds=60 * config.jps_quota_exceeded_pause_mins,
+                                                               state_file=Path(get_state_dir(), 'jps-rate-limit.json'),
+                                                               min_interval_seconds=config.jps_min_request_interval_secs)
+                atexit.register(GetJPSRateLimiter.__rate_limiter.close)
+
+    def rate_limiter(self) -> RateLimiter:
+        """
+        Return singleton JPS RateLimiter
+        """
+        return GetJPSRateLimiter.__rate_limiter
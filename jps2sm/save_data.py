@@ -106,6 +106,34 @@ def get_jps_torrent(jps_torrent_id: str, torrent_table: str):
     return jps_torrent_file
 
 
+def get_jps_torrent_path(jps_torrent_id: str) -> Path:
+    """
+    Return the path the JPS torrent is saved to by download_jps_torrent()
+
+    :param jps_torrent_id: JPS torrent ID
+    """
+    output_dir = output.file_dir['jpstorrents']
+    jps_torrent_filename = get_valid_filename(f'JPS-{jps_torrent_id}.torrent')
+
+    return Path(output_dir, jps_torrent_filename)
+
+
+def load_jps_torrent(jps_torrent_id: str, torrent_table: str) -> bytes:
+    """
+    Return the content of a JPS torrent, reading the file saved by download_jps_torrent() if there is one instead of downloading it again
+
+    :param jps_torrent_id: JPS torrent ID
+    :param torrent_table: Torrent table from JPS group page
+    """
+    jps_torrent_path = get_jps_torrent_path(jps_torrent_id)
+    try:
+        with open(jps_torrent_path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        logger.debug(f'{jps_torrent_path} not found, downloading JPS torrent {jps_torrent_id} again')
+        return get_jps_torrent(jps_torrent_id, torrent_table).content
+
+
 def download_jps_torrent(jps_torrent_id: str, jps_torrent_file):
     """
     Save the JPS torrent
@@ -114,10 +142,7 @@ def download_jps_torrent(jps_torrent_id: str, jps_torrent_file):
     :param jps_torrent_file: requests() object of the JPS torrent
     """
 
-    output_dir = output.file_dir['jpstorrents']
-    jps_torrent_filename = get_valid_filename(f'JPS-{jps_torrent_id}.torrent')
-
-    jps_torrent_path = Path(output_dir, jps_torrent_filename)
+    jps_torrent_path = get_jps_torrent_path(jps_torrent_id)
 
     with open(jps_torrent_path, "wb") as file:
         file.write(jps_torrent_file.content)
@@ -8,11 +8,11 @@ All defs that upload data to SM
 import re
 
 # Third-party packages
-from bs4 import BeautifulSoup
 from loguru import logger
 
 # jps2sm modules
 from jps2sm.get_data import GetSMUser
+from jps2sm.html_parser import make_soup
 from jps2sm.myloginsession import sugoimusic
 from jps2sm.save_data import save_sm_html_debug_output
 
@@ -40,7 +40,7 @@ def set_original_artists(contrib_artists) -> None:
             logger.debug(f"Artist {artist} does not yet exist at SM so orig_artist cannot be set")
             return
 
-        soup = BeautifulSoup(sugoimusic_artist_page.text, 'html5lib')
+        soup = make_soup(sugoimusic_artist_page.text, ['#content .thin .header .linkbox'])
         linkbox = str(soup.select('#content .thin .header .linkbox'))
         artistid = re.findall(r'href="artist\.php\?action=edit&amp;artistid=([0-9]+)"', linkbox)[0]
 
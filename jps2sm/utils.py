@@ -89,6 +89,10 @@ class GetArgs:
         jps2sm_core_args.add_argument("-S", "--batchseeding", help="alias to --batch seeding", dest="batch", const="seeding", action="store_const")
         jps2sm_core_args.add_argument("-SN", "--batchsnatched", help="alias to --batch snatched", dest="batch", const="snatched", action="store_const")
         jps2sm_core_args.add_argument("-R", "--batchrecent", help="alias to --batch recent", dest="batch", const="recent", action="store_const")
+        jps2sm_core_args.add_argument("-D", "--daemon", help="Mirror recent uploads to JPS continuously, running --batch recent every DaemonPollMins set in jps2sm.cfg", action="store_true")
+        jps2sm_core_args.add_argument("-rs", "--resume", help="Continue the interrupted batch run RUN_ID, with the batch arguments it was started with", metavar="RUN_ID", type=str)
+        jps2sm_core_args.add_argument("-MI", "--media-index", help="Rebuild the index of the files in MediaDirectories, or show what it holds", choices=['rebuild', 'show'])
+        jps2sm_core_args.add_argument("-lt", "--load-test", help="Load test jps2sm with LOAD_TEST groups on local fake JPS and SM sites, configured by the LoadTest section in jps2sm.cfg", type=int)
 
         batch_mode_args = parser.add_argument_group(title="Batch mode (--batch MODE) optional arguments")
         batch_mode_args.add_argument("-b", "--batchuser", help="User id for batch user operations, default is user id of SM Username specified in jps2sm.cfg", type=int)
@@ -100,15 +104,26 @@ class GetArgs:
         batch_mode_args.add_argument("-exf", "--excaudioformat", help="Exclude an audioformat from upload", type=str)
         batch_mode_args.add_argument("-exm", "--excmedia", help="Exclude a media from upload", type=str)
         batch_mode_args.add_argument("-fl", "--freeleech-only", help="Include only freeleech torrents", action="store_true")
+        batch_mode_args.add_argument("-rp", "--reprocess", help="Process torrents again even if the ledger records them as uploaded or duplicates by an earlier run", action="store_true")
 
         parser.add_argument('-v', '--version', action='version', version='%(prog)s ' + __version__)
         parser.add_argument('-d', '--debug', help='Enable debug mode', action='store_true')
         parser.add_argument("-n", "--dryrun", help="Just parse JPS data and show the output, do not upload the torrent(s) to SM", action="store_true")
-        parser.add_argument("-w", "--wait-for-jps-dl", help="Wait for JPS file to be downloaded", action="store_true")
+        parser.add_argument("-w", "--wait-for-jps-dl", help="Wait for the files of the JPS torrent(s) to be downloaded into MediaDirectories before uploading", action="store_true")
         parser.add_argument("-m", "--mediainfo",
                             help="Search and get mediainfo data from the source file(s) in the directories specified by MediaDirectories. Extract data to set codec, resolution, audio format and container fields as well as the mediainfo field itself.",
                             action="store_true")
         parser.add_argument("-c", "--cfg-file", help="Use a custom config file location", type=str)
+        parser.add_argument("-hp", "--html-parser", help="Parser used to scrape JPS and SM pages, overrides HTMLParser in jps2sm.cfg, lxml (default) is faster than html5lib", choices=['lxml', 'html5lib'])
+        parser.add_argument("-cm", "--cache-mode", help="Cache JPS group, edit group and artist pages on disk: off (default), read-write, read-only or refresh",
+                            choices=['off', 'read-write', 'read-only', 'refresh'], default='off')
+
+        cassette_args = parser.add_argument_group(title="Record and replay optional arguments")
+        cassette_args = cassette_args.add_mutually_exclusive_group()
+        cassette_args.add_argument("-rec", "--record", help="Record every request to JPS and SM and its response to the directory RECORD", type=str)
+        cassette_args.add_argument("-rep", "--replay", help="Replay the responses recorded with --record in the directory REPLAY instead of accessing JPS and SM", type=str)
+        parser.add_argument("-rl", "--replay-latency", help="Simulate latency when using --replay, either a number of seconds for every request or 'recorded' to use the recorded response times",
+                            type=lambda latency: latency if latency == 'recorded' else float(latency))
 
         GetArgs.parsed = parser.parse_args()
 
@@ -178,6 +193,7 @@ class GetConfig:
             fatal_error(f'Error: Config file {config_file} not found.')
         jps = 'JPopSuki'
         sugoi = 'SugoiMusic'
+        load_test = 'LoadTest'
         config = configparser.ConfigParser()
         config.read(config_file)
         GetConfig.jps_user = config.get(jps, 'User')
@@ -186,10 +202,35 @@ class GetConfig:
         GetConfig.sm_pass = config.get(sugoi, 'Password')
         GetConfig.media_roots = [x.strip() for x in config.get('Media', 'MediaDirectories').split(',')]  # Remove whitespace after comma if any
         GetConfig.directories = config.items('Directories')
+        GetConfig.state_dir = config.get('Directories', 'State', fallback='jps2sm-state')
         GetConfig.skip_dupes = config.getboolean(sugoi, 'SkipDuplicates', fallback=False)
         GetConfig.jps_min_seeders = config.getint(jps, 'MinSeeders', fallback=1)
         GetConfig.max_size_recent_mode = config.get(jps, 'MaxSizeRecentMode', fallback=None)
         GetConfig.wait_time_recent_mode = config.get(jps, 'WaitTimeRecentModeMins', fallback=20)
+        GetConfig.recent_mode_max_pages = config.getint(jps, 'RecentModeMaxPages', fallback=10)
+        GetConfig.daemon_poll_mins = config.getfloat(jps, 'DaemonPollMins', fallback=5)
+        GetConfig.download_timeout_mins = config.getfloat('Media', 'DownloadTimeoutMins', fallback=float(GetConfig.wait_time_recent_mode))
+        GetConfig.download_poll_secs = config.getfloat('Media', 'DownloadPollSecs', fallback=30)
+        GetConfig.download_settle_secs = config.getfloat('Media', 'DownloadSettleSecs', fallback=30)
+        GetConfig.media_index_refresh_secs = config.getfloat('Media', 'MediaIndexRefreshSecs', fallback=60)
+        GetConfig.mediainfo_cache_max_size_mb = config.getint('Media', 'MediainfoCacheMaxSizeMB', fallback=64)
+        GetConfig.mediainfo_workers = config.getint('Media', 'MediainfoWorkers', fallback=1)
+        GetConfig.mediainfo_read_limit_mb = config.getint('Media', 'MediainfoReadLimitMB', fallback=0)
+        GetConfig.jps_request_budget = config.getint(jps, 'RequestBudget', fallback=1000)
+        GetConfig.jps_request_budget_window_mins = config.getint(jps, 'RequestBudgetWindowMins', fallback=60)
+        GetConfig.jps_min_request_interval_secs = config.getfloat(jps, 'MinRequestIntervalSecs', fallback=0.5)
+        GetConfig.jps_group_data_workers = config.getint(jps, 'GroupDataWorkers', fallback=2)
+        GetConfig.jps_quota_exceeded_pause_mins = config.getint(jps, 'QuotaExceededPauseMins', fallback=15)
+        GetConfig.cache_max_size_mb = config.getint(jps, 'CacheMaxSizeMB', fallback=512)
+        GetConfig.html_parser = config.get('Parsing', 'HTMLParser', fallback='lxml')
+        GetConfig.load_test_latency_ms = config.getint(load_test, 'LatencyMs', fallback=200)
+        GetConfig.load_test_error_rate = config.getfloat(load_test, 'ErrorRate', fallback=0.0)
+        GetConfig.load_test_quota_requests = config.getint(load_test, 'QuotaRequests', fallback=0)
+        GetConfig.load_test_quota_window_secs = config.getint(load_test, 'QuotaWindowSecs', fallback=3600)
+        GetConfig.load_test_duplicate_rate = config.getfloat(load_test, 'DuplicateRate', fallback=0.1)
+        GetConfig.load_test_jps_port = config.getint(load_test, 'JPSPort', fallback=8081)
+        GetConfig.load_test_sm_port = config.getint(load_test, 'SMPort', fallback=8082)
+        GetConfig.load_test_fixtures_dir = config.get(load_test, 'FixturesDir', fallback='tests')
 
         logger.debug(f"Config file used: {config_file}")
 
@@ -227,6 +268,20 @@ class HandleCfgOutputDirs:
         return HandleCfgOutputDirs.item
 
 
+def get_state_dir() -> Path:
+    """
+    Return the directory where jps2sm keeps data that persists between runs, creating it if required.
+    A relative path is relative to the home directory, as with the other Directories in jps2sm.cfg.
+    """
+    config = GetConfig()
+    state_dir = Path(config.state_dir)
+    if not state_dir.is_absolute():
+        state_dir = Path(Path.home(), state_dir)
+    state_dir.mkdir(parents=True, exist_ok=True)
+
+    return state_dir
+
+
 def handle_cfg_media_roots() -> None:
     """
     Sanitise media_roots cfg, check they are dirs and not files and report error if they do not exist.
@@ -243,17 +298,13 @@ def handle_cfg_media_roots() -> None:
         fatal_error('Error: --mediainfo requires you to configure MediaDirectories in jps2sm.cfg for mediainfo to find your file(s).')
 
 
-def decide_duplicate(jps_torrent_object):
+def get_sm_torrent_hash(jps_torrent_object) -> str:
     """
-    Detect if a torrent is a duplicate by crafting the torrent hash and then sending this to SM.
-
-    This is useful for mediainfo (-m) uploads as it avoids the need to search for the file(s) and
-    the mediainfo data before doing the upload, only having to find that it is a duplicate anyway.
+    Craft the info hash the JPS torrent will have once it is uploaded to SM, ie. with the source set to SugoiMusic
 
-    jps_torrent_object: bytes: BytesIO object of the JPS torrent
+    :param jps_torrent_object: bytes: BytesIO object of the JPS torrent
+    :return: hashed_info: str: hex digest of the SM torrent info hash
     """
-    from jps2sm.myloginsession import sugoimusic
-
     torrent_hashcheckdata = tp.TorrentFileParser(jps_torrent_object).parse()
     torrent_hashcheckdata["info"]["source"] = 'SugoiMusic'
     file_descriptor, temp_torrent_file = tempfile.mkstemp()
@@ -270,7 +321,23 @@ def decide_duplicate(jps_torrent_object):
     os.remove(temp_torrent_file)
 
     logger.trace(hashed_info)
+    return hashed_info
+
+
+def decide_duplicate(jps_torrent_object, hashed_info=None):
+    """
+    Detect if a torrent is a duplicate by crafting the torrent hash and then sending this to SM.
+
+    This is useful for mediainfo (-m) uploads as it avoids the need to search for the file(s) and
+    the mediainfo data before doing the upload, only having to find that it is a duplicate anyway.
+
+    jps_torrent_object: bytes: BytesIO object of the JPS torrent
+    hashed_info: str: The torrent hash, if it has already been crafted with get_sm_torrent_hash()
+    """
+    from jps2sm.myloginsession import sugoimusic
 
+    if hashed_info is None:
+        hashed_info = get_sm_torrent_hash(jps_torrent_object)
     hashcheckjson = sugoimusic('https://sugoimusic.me/ajax.php?action=torrent&hash=' + hashed_info)
 
     if hashcheckjson.text == '{"status":"failure","error":"bad hash parameter"}':
@@ -8,13 +8,14 @@ Perform validation of JPS data
 import re
 
 # Third-party packages
-from bs4 import BeautifulSoup
 import torrent_parser as tp
+from datasize import DataSize
 from loguru import logger
 
 # jps2sm modules
 from jps2sm.myloginsession import jpopsuki
 from jps2sm.constants import Categories, VideoOptions
+from jps2sm.html_parser import make_soup
 from jps2sm.utils import GetArgs
 
 
@@ -37,7 +38,7 @@ def decide_music_performance(artists, multiple_files, duration):
 
     # Single file
     jps_artist_page = jpopsuki(f"https://jpopsuki.eu/artist.php?name={artists[0]}")
-    soup = BeautifulSoup(jps_artist_page.text, 'html5lib')
+    soup = make_soup(jps_artist_page.text)
     categories_box = str(soup.select('#content .thin .main_column .box.center'))
     categories = re.findall(r'\[(.+)\]', categories_box)
     if any({*Categories.NonTVCategories} & {*categories}):  # Exclude any TV Shows for being mislabeled as Music Performance
@@ -58,7 +59,7 @@ def get_alternate_fansub_category_id(artist, group_name):
     :return: int alternative category ID based on Categories.SM()
     """
     jps_artist_page = jpopsuki(f"https://jpopsuki.eu/artist.php?name={artist}")
-    soup = BeautifulSoup(jps_artist_page.text, 'html5lib')
+    soup = make_soup(jps_artist_page.text)
     categories_box = str(soup.select('#content .thin .main_column .box.center'))
     categories = re.findall(r'\[(.+)\]', categories_box)
 
@@ -191,6 +192,38 @@ def decide_exc_filter(audioformat, media, releasedata):
     return False
 
 
+def get_exc_filter_fields(category, slash_data):
+    """
+    Return the audioformat and media of a JPS release that collate() passes to decide_exc_filter(), or None if collate() does
+    not apply the exclusion filters to it as it is a video torrent or not a Music or Video category.
+
+    :param category: str: JPS category of the group
+    :param slash_data: list: Slash separated release data of the torrent
+    :return: Tuple of audioformat and media, or None
+    """
+    if slash_data[0] in VideoOptions.badformats and (slash_data[1:2] and slash_data[1] in VideoOptions.VideoMedias
+                                                     or slash_data[2:3] and slash_data[2] in VideoOptions.VideoMedias):
+        return None  # Video torrent
+    if category in Categories.Music and len(slash_data) >= 3:
+        return slash_data[0], slash_data[2]
+    if category in Categories.Video and len(slash_data) >= 2:
+        return slash_data[0], slash_data[1]
+    return None
+
+
+def decide_max_size(size_no_units, size_units, max_size):
+    """
+    Return if a JPS torrent is larger than max_size
+
+    :param size_no_units: str: Size of the torrent as shown by JPS, eg '340.05'
+    :param size_units: str: Units of the size as shown by JPS, eg 'MB'
+    :param max_size: str: Maximum size with unit specified
+    :return: boolean: True or False
+    """
+    good_jps_format = size_units[:1] + "i" + size_units[1:]  # JPS uses 'GB' when it means 'GiB' etc.
+    return DataSize(size_no_units + good_jps_format) > DataSize(max_size)
+
+
 def decide_ep(jps_torrent_object, uploaddata):
     """
     Return if Album upload should be an EP or not.
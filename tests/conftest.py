@@ -0,0 +1,46 @@
+"""
+Fixtures shared by all tests
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from jps2sm.utils import GetConfig
+
+real_home = os.environ.get('HOME')
+
+
+def pytest_configure():
+    """
+    Point HOME at a temporary dir before the tests are collected, as the output dirs are created relative to it when
+    jps2sm.save_data is imported, so that the session files and output dirs written by the tests do not end up in the real ones
+    """
+    os.environ['HOME'] = tempfile.mkdtemp(prefix='jps2sm-tests-home-')
+
+
+def pytest_unconfigure():
+    """
+    Remove the temporary HOME and restore the real one
+    """
+    shutil.rmtree(os.environ['HOME'], ignore_errors=True)
+    if real_home is None:
+        del os.environ['HOME']
+    else:
+        os.environ['HOME'] = real_home
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_state_dir(tmp_path_factory):
+    """
+    Point the State dir at a temporary dir, even if an absolute one is configured in jps2sm.cfg, so that the rate limiter
+    state and indexes written by the tests do not end up in the real one. Requests to the mocked and fake sites are not spaced
+    apart either.
+    """
+    state_dir = tmp_path_factory.mktemp('jps2sm-state')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        GetConfig()
+        monkeypatch.setattr(GetConfig, 'state_dir', str(state_dir))
+        monkeypatch.setattr(GetConfig, 'jps_min_request_interval_secs', 0)
+        yield state_dir
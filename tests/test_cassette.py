@@ -0,0 +1,30 @@
+"""
+Run tests for Cassette
+"""
+from pathlib import Path
+
+from jps2sm.cassette import Cassette
+from jps2sm.myloginsession import SiteSession, LoginParameters
+
+
+def test_cassette(requests_mock, tmp_path):
+    """
+    Test that responses recorded by a SiteSession are replayed in order without accessing the site
+    """
+    requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+    requests_mock.get("https://jpopsuki.eu/torrents.php?id=1", [{'text': 'First group page'}, {'text': 'Second group page'}])
+    login_data = {'username': 'jpsuser123', 'password': 'jpspass123'}
+    cassette_dir = Path(tmp_path, 'cassette')
+
+    recording_session = SiteSession(LoginParameters.jps_login_url, LoginParameters.jps_test_url, LoginParameters.jps_success, login_data,
+                                    cassette=Cassette(cassette_dir, 'record'))
+    recording_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1")
+    recording_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1")
+    request_count = requests_mock.call_count
+
+    replaying_session = SiteSession(LoginParameters.jps_login_url, LoginParameters.jps_test_url, LoginParameters.jps_success, login_data,
+                                    cassette=Cassette(cassette_dir, 'replay'))
+    assert replaying_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1").text == 'First group page'
+    assert replaying_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1").text == 'Second group page'
+    assert replaying_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1").text == 'Second group page'
+    assert requests_mock.call_count == request_count
@@ -0,0 +1,44 @@
+"""
+Run tests for daemon_mode()
+"""
+from pathlib import Path
+
+from jps2sm.batch import daemon_mode, get_recent_cursor, set_recent_cursors
+from jps2sm.ledger import TorrentLedger
+
+
+def test_daemon_mode(mocker):
+    """
+    Test that a failed run does not stop the daemon, that the torrents waiting for their files to download are kept between runs
+    and that Ctrl-C stops it
+    """
+    batch_mode = mocker.patch("jps2sm.batch.batch_mode", side_effect=[True, RuntimeError('JPS is down'), True, False])
+    sleep = mocker.patch("jps2sm.batch.sleep")
+
+    daemon_mode(user=1)
+
+    assert batch_mode.call_count == 4
+    assert sleep.call_count == 3
+    assert all(call.kwargs['mode'] == 'recent' for call in batch_mode.call_args_list)
+    assert len({id(call.kwargs['download_watcher']) for call in batch_mode.call_args_list}) == 1
+
+
+def test_recent_cursors(mocker, tmp_path):
+    """
+    Test that the recent mode cursor advances past the torrents waiting for their files to download, and that they are only found
+    again by the first run after the daemon is restarted
+    """
+    torrent_ledger = TorrentLedger(Path(tmp_path, 'ledger.sqlite3'))
+    download_watcher = mocker.MagicMock(pending={'105': None, '107': None})
+    download_watcher.__bool__.return_value = True
+
+    set_recent_cursors(torrent_ledger, 'recent', {'1': ['101', '105'], '2': ['107', '110']}, download_watcher)
+    assert get_recent_cursor(torrent_ledger, 'recent', download_watcher) == 110
+    assert get_recent_cursor(torrent_ledger, 'recent', None) == 104
+
+    download_watcher.pending = {'107': None}
+    set_recent_cursors(torrent_ledger, 'recent', {}, download_watcher)
+    assert get_recent_cursor(torrent_ledger, 'recent', None) == 106
+
+    set_recent_cursors(torrent_ledger, 'recent', {'3': ['112']}, None)
+    assert get_recent_cursor(torrent_ledger, 'recent', None) == 112
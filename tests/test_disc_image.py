@@ -0,0 +1,233 @@
+"""
+Run tests for reading the files of disc images in place
+"""
+import struct
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+import torrent_parser as tp
+from pymediainfo import MediaInfo
+
+from jps2sm.disc_image import SECTOR_SIZE, DiscImageFileReader, get_bluray_main_playlist, list_dvd_files, list_iso9660_files, list_udf_files
+from jps2sm.media_index import MediaIndex
+from jps2sm.mediainfo import ParsedMediaFile, get_mediainfo
+
+
+def directory_record(name: bytes, extent: int, data_length: int, flags: int = 0) -> bytes:
+    """
+    ISO 9660 directory record of a file or directory
+    """
+    record = struct.pack('<BBIIII7xBBBHHB', 0, 0, extent, 0, data_length, 0, flags, 0, 0, 1, 1, len(name)) + name
+    record += b'\x00' * (len(record) % 2)
+    return bytes([len(record)]) + record[1:]
+
+
+def make_iso(image_path: Path) -> None:
+    """
+    Write an ISO 9660 image with VIDEO_TS/VIDEO_TS.IFO, a VIDEO_TS/VTS_01_1.VOB recorded as two extents and a VIDEO_TS/VTS_01_2.VOB,
+    with the root directory at sector 18, VIDEO_TS at sector 19 and the file data from sector 20
+    """
+    sectors = [b'\x00' * SECTOR_SIZE] * 25
+    primary_volume_descriptor = bytearray(b'\x01CD001\x01' + b'\x00' * (SECTOR_SIZE - 7))
+    primary_volume_descriptor[156:156 + 34] = directory_record(b'\x00', 18, SECTOR_SIZE, flags=0x02)
+    sectors[16] = bytes(primary_volume_descriptor)
+    sectors[17] = b'\xffCD001\x01' + b'\x00' * (SECTOR_SIZE - 7)
+    sectors[18] = (directory_record(b'\x00', 18, SECTOR_SIZE, flags=0x02) + directory_record(b'\x01', 18, SECTOR_SIZE, flags=0x02) +
+                   directory_record(b'VIDEO_TS', 19, SECTOR_SIZE, flags=0x02)).ljust(SECTOR_SIZE, b'\x00')
+    sectors[19] = (directory_record(b'\x00', 19, SECTOR_SIZE, flags=0x02) + directory_record(b'\x01', 18, SECTOR_SIZE, flags=0x02) +
+                   directory_record(b'VIDEO_TS.IFO;1', 20, 5) +
+                   directory_record(b'VTS_01_1.VOB;1', 21, SECTOR_SIZE, flags=0x80) +
+                   directory_record(b'VTS_01_1.VOB;1', 23, 3) +
+                   directory_record(b'VTS_01_2.VOB;1', 24, 4)).ljust(SECTOR_SIZE, b'\x00')
+    sectors[20] = b'DVDIF'.ljust(SECTOR_SIZE, b'\x00')
+    sectors[21] = b'A' * SECTOR_SIZE
+    sectors[22] = b'X' * SECTOR_SIZE  # Not part of any file
+    sectors[23] = b'BCD'.ljust(SECTOR_SIZE, b'\x00')
+    sectors[24] = b'EFGH'.ljust(SECTOR_SIZE, b'\x00')
+    image_path.write_bytes(b''.join(sectors))
+
+
+def test_list_iso9660_files(tmp_path) -> None:
+    """
+    Test that files are listed with their path in the image, and that a file recorded as several extents is read as one
+    """
+    image_path = Path(tmp_path, 'Live.iso')
+    make_iso(image_path)
+
+    image_files = {image_file.path: image_file for image_file in list_iso9660_files(image_path)}
+    assert sorted(image_files) == ['VIDEO_TS/VIDEO_TS.IFO', 'VIDEO_TS/VTS_01_1.VOB', 'VIDEO_TS/VTS_01_2.VOB']
+    vob = image_files['VIDEO_TS/VTS_01_1.VOB']
+    assert (vob.size, vob.suffix) == (SECTOR_SIZE + 3, '.VOB')
+
+    with open(image_path, 'rb') as image_file:
+        assert DiscImageFileReader(image_file, image_files['VIDEO_TS/VIDEO_TS.IFO']).read() == b'DVDIF'
+        reader = DiscImageFileReader(image_file, vob)
+        assert reader.read() == b'A' * SECTOR_SIZE + b'BCD'
+        reader.seek(SECTOR_SIZE - 1)
+        assert reader.read(3) == b'ABC'
+
+    Path(tmp_path, 'Live.mkv').write_bytes(b'\x00' * SECTOR_SIZE * 17)
+    with pytest.raises(RuntimeError):
+        list_iso9660_files(Path(tmp_path, 'Live.mkv'))
+
+
+def udf_descriptor(tag_identifier: int, fields: dict) -> bytes:
+    """
+    Sector with a UDF descriptor, with fields keyed by their offset
+    """
+    sector = bytearray(SECTOR_SIZE)
+    struct.pack_into('<H', sector, 0, tag_identifier)
+    for offset, value in fields.items():
+        sector[offset:offset + len(value)] = value
+    return bytes(sector)
+
+
+def udf_file_entry(file_type: int, information_length: int, allocation_type: int, allocation_descriptors: bytes, extended=True) -> bytes:
+    """
+    Sector with a UDF extended file entry, or file entry
+    """
+    if allocation_type == 3:  # Embedded data
+        information_length = len(allocation_descriptors)
+    fields = {27: bytes([file_type]), 34: struct.pack('<H', allocation_type), 56: struct.pack('<Q', information_length)}
+    if extended:
+        fields.update({208: struct.pack('<II', 0, len(allocation_descriptors)), 216: allocation_descriptors})
+    else:
+        fields.update({168: struct.pack('<II', 0, len(allocation_descriptors)), 176: allocation_descriptors})
+    return udf_descriptor(266 if extended else 261, fields)
+
+
+def udf_file_identifiers(*entries) -> bytes:
+    """
+    UDF file identifier descriptors of a directory, from (name, characteristics, block) of each entry in the metadata partition
+    """
+    file_identifiers = b''
+    for name, characteristics, block in entries:
+        identifier = b'\x08' + name if name else b''
+        file_identifier = struct.pack('<H14xHBBIIH6xH', 257, 1, characteristics, len(identifier), SECTOR_SIZE, block, 1, 0) + identifier
+        file_identifiers += file_identifier.ljust((len(file_identifier) + 3) & ~3, b'\x00')
+    return file_identifiers
+
+
+def mpls(*play_items) -> bytes:
+    """
+    Bluray playlist, from (clip name, IN_time, OUT_time) of each play item
+    """
+    play_item_data = b''.join(struct.pack('>H', 20) + clip_name.encode() + b'M2TS' + b'\x00' * 3 + struct.pack('>II', in_time, out_time)
+                              for clip_name, in_time, out_time in play_items)
+    return b'MPLS0200' + struct.pack('>III', 20, 0, 0) + struct.pack('>I2xHH', len(play_item_data) + 6, len(play_items), 0) + play_item_data
+
+
+def make_bluray_image(image_path: Path) -> None:
+    """
+    Write a UDF 2.50 image of a Bluray disc, with the directories and file entries in a metadata partition recorded as two extents,
+    a decoy playlist that repeats a small stream and a main playlist of two streams. The partition starts at sector 300.
+    """
+    decoy_playlist = mpls(*[('00001', 0, 45 * 600000)] * 50)
+    main_playlist = mpls(('00002', 0, 45 * 60000), ('00003', 45 * 1000, 45 * 31000), ('00002', 0, 45 * 60000))
+    bdmv_directory = udf_file_identifiers((b'', 0x0A, 1), (b'PLAYLIST', 0x02, 3), (b'STREAM', 0x02, 4))
+    metadata_partition_map = bytearray(64)
+    metadata_partition_map[0:2], metadata_partition_map[5:28] = bytes([2, 64]), b'*UDF Metadata Partition'
+    struct.pack_into('<HI', metadata_partition_map, 38, 0, 0)
+
+    sectors = {
+        256: udf_descriptor(2, {16: struct.pack('<II', 3 * SECTOR_SIZE, 257)}),
+        257: udf_descriptor(5, {22: struct.pack('<H', 0), 188: struct.pack('<I', 300)}),
+        258: udf_descriptor(6, {212: struct.pack('<I', SECTOR_SIZE), 248: struct.pack('<IIH', SECTOR_SIZE, 0, 1),
+                                268: struct.pack('<I', 2), 440: bytes([1, 6]) + struct.pack('<HH', 1, 0) + metadata_partition_map}),
+        259: udf_descriptor(8, {}),
+        # Metadata file, metadata partition blocks 0-2 are partition blocks 1-3 and blocks 3-10 are partition blocks 10-17
+        300: udf_file_entry(250, 11 * SECTOR_SIZE, 0, struct.pack('<IIII', 3 * SECTOR_SIZE, 1, 8 * SECTOR_SIZE, 10)),
+        301: udf_descriptor(256, {400: struct.pack('<IIH', SECTOR_SIZE, 1, 1)}),
+        302: udf_file_entry(4, 0, 3, udf_file_identifiers((b'', 0x0A, 1), (b'BDMV', 0x02, 2))),
+        303: udf_file_entry(4, len(bdmv_directory), 0, struct.pack('<II', len(bdmv_directory), 6), extended=False),
+        310: udf_file_entry(4, 0, 3, udf_file_identifiers((b'', 0x0A, 2), (b'00000.mpls', 0, 5), (b'00001.mpls', 0, 7))),
+        311: udf_file_entry(4, 0, 3, udf_file_identifiers((b'', 0x0A, 2), (b'00001.m2ts', 0, 8), (b'00002.m2ts', 0, 9),
+                                                            (b'00003.m2ts', 0, 10))),
+        312: udf_file_entry(5, len(decoy_playlist), 1, struct.pack('<IIH6x', len(decoy_playlist), 20, 0)),
+        313: bdmv_directory.ljust(SECTOR_SIZE, b'\x00'),
+        314: udf_file_entry(5, len(main_playlist), 1, struct.pack('<IIH6x', len(main_playlist), 21, 0)),
+        315: udf_file_entry(5, 100, 1, struct.pack('<IIH6x', 100, 22, 0)),
+        316: udf_file_entry(5, SECTOR_SIZE + 500, 1, struct.pack('<IIH6xIIH6x', SECTOR_SIZE, 23, 0, SECTOR_SIZE, 25, 0)),
+        317: udf_file_entry(5, 1000, 1, struct.pack('<IIH6x', 1000, 26, 0)),
+        320: decoy_playlist.ljust(SECTOR_SIZE, b'\x00'),
+        321: main_playlist.ljust(SECTOR_SIZE, b'\x00'),
+        322: b'A' * SECTOR_SIZE,
+        323: b'B' * SECTOR_SIZE,
+        325: b'C' * SECTOR_SIZE,
+        326: b'D' * SECTOR_SIZE,
+    }
+    image_path.write_bytes(b''.join(sectors.get(sector, b'\x00' * SECTOR_SIZE) for sector in range(327)))
+
+
+def test_list_udf_files(tmp_path) -> None:
+    """
+    Test that the files of a Bluray image are listed through its metadata partition, and that its main playlist is the one that plays
+    the most stream data
+    """
+    image_path = Path(tmp_path, 'Live.iso')
+    make_bluray_image(image_path)
+
+    image_files = {image_file.path: image_file for image_file in list_udf_files(image_path)}
+    assert sorted(image_files) == ['BDMV/PLAYLIST/00000.mpls', 'BDMV/PLAYLIST/00001.mpls',
+                                   'BDMV/STREAM/00001.m2ts', 'BDMV/STREAM/00002.m2ts', 'BDMV/STREAM/00003.m2ts']
+    with open(image_path, 'rb') as image_file:
+        assert DiscImageFileReader(image_file, image_files['BDMV/STREAM/00002.m2ts']).read() == b'B' * SECTOR_SIZE + b'C' * 500
+    assert sorted(image_file.path for image_file in list_dvd_files(image_path)) == sorted(image_files)
+
+    main_playlist = get_bluray_main_playlist(list(image_files.values()))
+    assert (main_playlist.path, main_playlist.duration) == ('BDMV/PLAYLIST/00001.mpls', 150000)
+    assert [stream.path for stream in main_playlist.streams] == ['BDMV/STREAM/00002.m2ts', 'BDMV/STREAM/00003.m2ts']
+
+
+def test_get_mediainfo_bluray(tmp_path, mocker) -> None:
+    """
+    Test that the SM video fields of a Bluray ISO are from the largest stream of its main playlist, and its duration from the playlist
+    """
+    make_bluray_image(Path(tmp_path, 'Live.iso'))
+    torrent = tp.encode({'info': {'name': 'Live.iso', 'piece length': 16384, 'pieces': b'', 'length': 327 * SECTOR_SIZE}})
+    mocker.patch('jps2sm.mediainfo.GetMediaIndex').return_value.media_index.return_value = MediaIndex(':memory:', [str(tmp_path)])
+    mocker.patch('jps2sm.mediainfo.GetMediainfoCache').return_value.mediainfo_cache.return_value = None
+    mediainfo_xml = '<Mediainfo><File>' \
+                    '<track type="General"><File_extension>{}</File_extension></track>' \
+                    '<track type="Video"><Commercial_name>AVC</Commercial_name><Width>1920</Width><Height>1080</Height>' \
+                    '<Scan_type>Interlaced</Scan_type></track><track type="Audio"><Format>PCM</Format></track>' \
+                    '</File></Mediainfo>'
+    parse_media_file = mocker.patch('jps2sm.mediainfo.parse_media_file', side_effect=lambda filename, read_limit: ParsedMediaFile(
+        text=f'{filename}\n', media_info=MediaInfo(mediainfo_xml.format('iso' if isinstance(filename, Path) else 'm2ts'))))
+
+    mediainfo, release_data = get_mediainfo(BytesIO(torrent), 'Bluray')
+    assert parse_media_file.call_args.args[0].path == 'BDMV/STREAM/00002.m2ts'
+    assert mediainfo.splitlines()[-1].startswith('DiscImageFile(') and str(tmp_path) not in mediainfo
+    assert (release_data['category'], release_data['container'], release_data['codec'], release_data['ressel'], release_data['duration']) == \
+        ('Bluray', 'M2TS', 'h264', '1080i', 150000)
+
+
+def test_get_mediainfo_dvd(tmp_path, mocker) -> None:
+    """
+    Test that the VOBs of a DVD ISO are analysed and their durations summed, and that the SM video fields are from the largest VOB
+    """
+    make_iso(Path(tmp_path, 'Live.iso'))
+    torrent = tp.encode({'info': {'name': 'Live.iso', 'piece length': 16384, 'pieces': b'', 'length': 25 * SECTOR_SIZE}})
+    mocker.patch('jps2sm.mediainfo.GetMediaIndex').return_value.media_index.return_value = MediaIndex(':memory:', [str(tmp_path)])
+    mocker.patch('jps2sm.mediainfo.GetMediainfoCache').return_value.mediainfo_cache.return_value = None
+    mocker.patch('jps2sm.mediainfo.GetMediainfoPool').return_value.mediainfo_pool.return_value = None
+    mediainfo_xml = '<Mediainfo><File>' \
+                    '<track type="General"><File_extension>{}</File_extension>{}</track>' \
+                    '<track type="Video"><Commercial_name>MPEG-2 Video</Commercial_name><Width>720</Width><Height>480</Height>' \
+                    '<Scan_type>Interlaced</Scan_type></track><track type="Audio"><Format>AC-3</Format></track>' \
+                    '</File></Mediainfo>'
+    vob_durations = {'VIDEO_TS/VTS_01_1.VOB': 60000, 'VIDEO_TS/VTS_01_2.VOB': 30000}
+
+    def mock_parse_media_file(filename, read_limit):
+        if isinstance(filename, Path):
+            return ParsedMediaFile(text=f'{filename}\n', media_info=MediaInfo(mediainfo_xml.format('iso', '')))
+        duration = f'<Duration>{vob_durations[filename.path]}</Duration>'
+        return ParsedMediaFile(text=f'{filename}\n', media_info=MediaInfo(mediainfo_xml.format(filename.path[-3:].lower(), duration)))
+    parse_media_file = mocker.patch('jps2sm.mediainfo.parse_media_file', side_effect=mock_parse_media_file)
+
+    mediainfo, release_data = get_mediainfo(BytesIO(torrent), 'DVD')
+    assert [call.args[0].path for call in parse_media_file.call_args_list[1:]] == ['VIDEO_TS/VTS_01_1.VOB', 'VIDEO_TS/VTS_01_2.VOB']
+    assert str(tmp_path) not in mediainfo
+    assert (release_data['category'], release_data['codec'], release_data['ressel'], release_data['audioformat'], release_data['duration']) == \
+        ('DVD', 'MPEG-2', '480i', 'AC3', 90000)
@@ -0,0 +1,72 @@
+"""
+Run tests for DownloadWatcher
+"""
+from io import BytesIO
+from pathlib import Path
+
+import torrent_parser as tp
+
+from jps2sm.download_watcher import DownloadWatcher
+from jps2sm.media_index import MediaIndex
+
+
+def make_torrent(name, files=None, length=None) -> BytesIO:
+    """
+    Return a BytesIO object of a torrent of a directory of files, or of a single file of length
+
+    :param files: list of (path, length) of the files of the directory
+    """
+    info = {'name': name, 'piece length': 16384, 'pieces': b''}
+    if files is not None:
+        info['files'] = [{'path': path, 'length': file_length} for path, file_length in files]
+    else:
+        info['length'] = length
+    return BytesIO(tp.encode({'info': info}))
+
+
+def test_download_watcher(tmp_path):
+    """
+    Test that a torrent is ready once every file is found at its full size in a subdirectory of the MediaDirectories, and that a
+    torrent whose files never download is ready after its timeout
+    """
+    media_dir = Path(tmp_path, 'Music', 'Singles')
+    Path(media_dir, 'Album', 'CD1').mkdir(parents=True)
+    Path(media_dir, 'Album', 'cover.jpg').write_bytes(b'1234')
+    Path(media_dir, 'Album', 'CD1', '01.flac').write_bytes(b'12')  # Still downloading
+    Path(media_dir, 'Single.mkv').write_bytes(b'123')
+
+    download_watcher = DownloadWatcher(MediaIndex(':memory:', [str(tmp_path)]), timeout_seconds=600, settle_seconds=0)
+    download_watcher.add('1', [make_torrent('Album', files=[(['cover.jpg'], 4), (['CD1', '01.flac'], 5)])], 'album')
+    download_watcher.add('2', [make_torrent('Single.mkv', length=3)], 'single')
+    assert download_watcher.ready() == [('2', 'single', True)]
+    assert '1' in download_watcher and '2' not in download_watcher
+
+    Path(media_dir, 'Album', 'CD1', '01.flac').write_bytes(b'12345')
+    assert download_watcher.ready() == [('1', 'album', True)]
+    assert not download_watcher
+
+    download_watcher = DownloadWatcher(MediaIndex(':memory:', [str(tmp_path)]), timeout_seconds=0, settle_seconds=0)
+    download_watcher.add('3', [make_torrent('Missing.mkv', length=3)], 'missing')
+    assert download_watcher.ready() == [('3', 'missing', False)]
+
+
+def test_download_watcher_wait(tmp_path, mocker):
+    """
+    Test that wait() yields each torrent as soon as its files have downloaded, and that Ctrl-C stops waiting for the rest
+    """
+    download_watcher = DownloadWatcher(MediaIndex(':memory:', [str(tmp_path)]), timeout_seconds=600, poll_seconds=30, settle_seconds=0)
+    download_watcher.add('1', [make_torrent('First.mkv', length=3)], 'first')
+    download_watcher.add('2', [make_torrent('Second.mkv', length=3)], 'second')
+    polls = []
+
+    def download_first(_):
+        polls.append(True)
+        if len(polls) == 1:
+            Path(tmp_path, 'First.mkv').write_bytes(b'123')
+        else:
+            raise KeyboardInterrupt
+    sleep = mocker.patch('jps2sm.download_watcher.sleep', side_effect=download_first)
+
+    assert list(download_watcher.wait()) == [('1', 'first', True), ('2', 'second', False)]
+    assert sleep.call_count == 2
+    assert not download_watcher
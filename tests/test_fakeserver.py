@@ -0,0 +1,39 @@
+"""
+Run tests for the fake JPS and SM sites
+"""
+import io
+from pathlib import Path
+
+from jps2sm import myloginsession
+from jps2sm.batch import get_batch_jps_group_torrent_ids
+from jps2sm.fakeserver import FakeSiteServer, FakeSiteSettings, FakeSiteTemplates
+from jps2sm.get_data import GetGroupData, get_jps_group_page
+from jps2sm.save_data import get_jps_torrent
+from jps2sm.utils import decide_duplicate
+
+
+def test_fake_sites(monkeypatch):
+    """
+    Test that jps2sm can list, scrape and hash check the groups generated by the fake sites
+    """
+    templates = FakeSiteTemplates(Path('tests'), groups=12)
+    jps_server = FakeSiteServer('jps', templates, FakeSiteSettings(), port=0)
+    sm_server = FakeSiteServer('sm', templates, FakeSiteSettings(), port=0)
+    monkeypatch.setattr(myloginsession, 'site_sessions', {})
+    monkeypatch.setattr(myloginsession, 'site_url_overrides', {'jps': jps_server.url, 'sm': sm_server.url})
+
+    try:
+        batch_uploads = get_batch_jps_group_torrent_ids(mode='snatched', user=1)
+        assert templates.listing_pages() == 2
+        assert batch_uploads == templates.all_group_torrent_ids()
+
+        jps_group_id, jps_group_page_text = get_jps_group_page('https://jpopsuki.eu/torrents.php?id=1')
+        group_data = GetGroupData(jps_group_id, jps_group_page_text)
+        assert group_data.category == 'DVD'
+        assert "swapTorrent('100')" in group_data.torrent_table
+
+        jps_torrent_file = get_jps_torrent('100', group_data.torrent_table)
+        assert decide_duplicate(io.BytesIO(jps_torrent_file.content)) is None
+    finally:
+        jps_server.stop()
+        sm_server.stop()
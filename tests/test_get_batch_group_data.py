@@ -1,22 +1,18 @@
 """
-Run tests for get_batch_group_data
+Run tests for the retrieval of the group data of a batch run by BatchGroupDataPool
 """
 import json
 
-from jps2sm.batch import get_batch_group_data
+from jps2sm.batch import BatchGroupDataPool, new_batch_group_results, record_batch_group_data
 from jps2sm.myloginsession import LoginParameters
 
 
 def test_get_batch_group_data(requests_mock, mocker):
     """
-    Test for get_batch_group_data
+    Test for BatchGroupDataPool and record_batch_group_data
     """
     # We mock this as it saves an extra set of request_mocks and this is already being tested in test_get_group_description_bbcode()
-    mocker.patch("jps2sm.get_data.get_group_description_bbcode", return_value="Torrent description empty mocked")
-    # Sleep in get_batch_jps_group_torrent_ids()
-    # TODO Consider removing the sleep as it may have no impact in the JPS Browse quota as it appears to be a counter that gets
-    #  reset every 30/60 mins and not a 'per min' counter as originally thought.
-    mocker.patch("time.sleep")
+    get_group_description_bbcode = mocker.patch("jps2sm.get_data.get_group_description_bbcode", return_value="Torrent description empty mocked")
 
     batch_uploads = {'173844': '474350',  # 2014 2NE1 WORLD TOUR ~ALL OR NOTHING~ in JAPAN
                      '120274': '164403',  # AKB48 - 1830m 	[ISO / DVD / Freeleech!] [2012.11.28]
@@ -48,9 +44,16 @@ def test_get_batch_group_data(requests_mock, mocker):
     with open("tests/batch-group-data", "r", encoding="utf-8") as batch_group_data_file:
         batch_group_data = batch_group_data_file.read()
 
-    batch_results = get_batch_group_data(batch_uploads=batch_uploads, excluded_category=excluded_category)
+    batch_results = new_batch_group_results()
+    group_data_pool = BatchGroupDataPool(excluded_category, workers=2)
+    for jps_group_id in batch_uploads:
+        group_data_pool.submit(jps_group_id)
+    for jps_group_id, jps_torrent_id in batch_uploads.items():
+        record_batch_group_data(batch_results, [jps_torrent_id], group_data_pool.result(jps_group_id))
+    group_data_pool.shutdown()
 
     assert batch_results['batch_group_data'] == json.loads(batch_group_data)
     assert batch_results['batch_group_errors'] == {}
     assert batch_results['batch_groups_excluded'] == ['212853']
     assert batch_results['batch_groups_va_errors'] == ['369725']
+    assert not get_group_description_bbcode.called  # The group description is only retrieved when it is used
@@ -2,8 +2,9 @@
 Run tests for get_batch_jps_group_torrent_ids
 """
 
-from jps2sm.batch import get_batch_jps_group_torrent_ids
+from jps2sm.batch import decide_listing_filter, get_batch_jps_group_torrent_ids, iter_batch_jps_group_torrent_ids, ListingTorrent
 from jps2sm.myloginsession import LoginParameters
+from jps2sm.utils import GetArgs, GetConfig
 
 
 def test_get_batch_jps_group_torrent_ids(requests_mock, mocker):
@@ -49,3 +50,75 @@ def test_get_batch_jps_group_torrent_ids(requests_mock, mocker):
                       text=user_page_snatched_userid_1_page_2)
 
     assert get_batch_jps_group_torrent_ids(mode="snatched", user=1, first=1, last=2, sort="time", order="desc") == batch_uploads
+
+
+def test_iter_batch_jps_group_torrent_ids(requests_mock, mocker):
+    """
+    Test that torrents are yielded from the first page before the next page is retrieved
+    """
+    mocker.patch("time.sleep")
+
+    with open("tests/user-page-snatched-userid-1-page-1", "r", encoding="utf-8") as user_page_snatched_userid_1_page_1_file:
+        user_page_snatched_userid_1_page_1 = user_page_snatched_userid_1_page_1_file.read()
+    with open("tests/user-page-snatched-userid-1-page-2", "r", encoding="utf-8") as user_page_snatched_userid_1_page_2_file:
+        user_page_snatched_userid_1_page_2 = user_page_snatched_userid_1_page_2_file.read()
+
+    requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+    page_1 = requests_mock.get("https://jpopsuki.eu/torrents.php?page=1&order_by=s3&order_way=DESC&type=snatched&userid=1&disablegrouping=1",
+                               text=user_page_snatched_userid_1_page_1)
+    page_2 = requests_mock.get("https://jpopsuki.eu/torrents.php?page=2&order_by=s3&order_way=DESC&type=snatched&userid=1&disablegrouping=1",
+                               text=user_page_snatched_userid_1_page_2)
+
+    batch_uploads = iter_batch_jps_group_torrent_ids(mode="snatched", user=1, first=1, last=2, sort="time", order="desc")
+    assert next(batch_uploads) == ListingTorrent(jps_group_id='1063', jps_torrent_id='1224', category='Album', slashdata=['MP3', '192', 'CD'],
+                                                 size_no_units='31.85', size_units='MB', seeders=5)
+    assert page_1.called and not page_2.called
+    last_listing_torrent = list(batch_uploads)[-1]
+    assert (last_listing_torrent.jps_group_id, last_listing_torrent.jps_torrent_id) == ('129707', '173960')
+    assert page_2.called
+
+
+def test_decide_listing_filter(monkeypatch):
+    """
+    Test that batch filters are decided from the columns of a page of torrents, and left to collate() when a column is missing
+    """
+    monkeypatch.setattr(GetConfig, 'jps_min_seeders', 1)
+    monkeypatch.setattr(GetArgs().parsed, 'excaudioformat', 'AAC')
+    monkeypatch.setattr(GetArgs().parsed, 'excmedia', 'HDTV')
+
+    def listing_torrent(**columns):
+        return ListingTorrent(**{'jps_group_id': '1', 'jps_torrent_id': '100', 'category': 'Album', 'slashdata': ['MP3', '320', 'CD'],
+                                 'size_no_units': '31.85', 'size_units': 'MB', 'seeders': 5, **columns})
+
+    assert decide_listing_filter(listing_torrent(), excluded_category=None, max_size=None) is None
+    assert decide_listing_filter(listing_torrent(), excluded_category='Album', max_size=None) == 'batch_groups_excluded'
+    assert decide_listing_filter(listing_torrent(), excluded_category=None, max_size='10MiB') == 'skipped_torrents_max_size'
+    assert decide_listing_filter(listing_torrent(seeders=0), excluded_category=None, max_size=None) == 'skipped_torrents_low_seeders'
+    assert decide_listing_filter(listing_torrent(slashdata=['AAC', '256', 'WEB']), excluded_category=None, max_size=None) \
+        == 'skipped_torrents_exc_filter'
+    assert decide_listing_filter(listing_torrent(category='PV', slashdata=['AAC', 'WEB']), excluded_category=None, max_size=None) \
+        == 'skipped_torrents_exc_filter'
+    # The exclusion filters are not applied to video torrents, as in collate()
+    assert decide_listing_filter(listing_torrent(category='PV', slashdata=['h264', 'HDTV']), excluded_category=None, max_size=None) is None
+    assert decide_listing_filter(listing_torrent(seeders=None, slashdata=None, size_no_units=None), excluded_category=None,
+                                 max_size='10MiB') is None
+
+
+def test_iter_batch_jps_group_torrent_ids_stop_at_torrent_id(requests_mock, mocker):
+    """
+    Test that recent mode only yields the torrents uploaded after the torrent processed by an earlier run, and stops paging once
+    it is reached
+    """
+    mocker.patch("time.sleep")
+
+    with open("tests/user-page-snatched-userid-1-page-1", "r", encoding="utf-8") as user_page_snatched_userid_1_page_1_file:
+        user_page_snatched_userid_1_page_1 = user_page_snatched_userid_1_page_1_file.read()
+
+    requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+    requests_mock.get("https://jpopsuki.eu/torrents.php?page=1&order_by=s3&order_way=DESC&disablegrouping=1",
+                      text=user_page_snatched_userid_1_page_1)
+    page_2 = requests_mock.get("https://jpopsuki.eu/torrents.php?page=2&order_by=s3&order_way=DESC&disablegrouping=1")
+
+    batch_uploads = iter_batch_jps_group_torrent_ids(mode="recent", user=1, stop_at_torrent_id=180000)
+    assert [listing_torrent.jps_torrent_id for listing_torrent in batch_uploads] == ['185534', '196465', '192311', '191765', '185534', '184100']
+    assert not page_2.called
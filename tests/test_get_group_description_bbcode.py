@@ -1,7 +1,7 @@
 """
 Run tests for get_group_description_bbcode
 """
-from jps2sm.get_data import get_group_description_bbcode
+from jps2sm.get_data import get_group_description, get_group_description_bbcode, JPSGroup
 from jps2sm.myloginsession import LoginParameters
 
 
@@ -18,3 +18,22 @@ def test_get_group_description_bbcode(requests_mock):
         requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
         requests_mock.get("https://jpopsuki.eu/torrents.php?action=editgroup&groupid=121206", text=group_edit_page_121206.read())
         assert group_description_bbcode == get_group_description_bbcode("121206")
+
+
+def test_get_group_description_lazy(requests_mock):
+    """
+    Test that the group description of a JPSGroup is only retrieved when it is used, and only once
+    """
+    with open("tests/group-edit-page-121206", "r", encoding="utf-8") as group_edit_page_121206:
+        requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+        edit_group_page = requests_mock.get("https://jpopsuki.eu/torrents.php?action=editgroup&groupid=121207",
+                                            text=group_edit_page_121206.read())
+
+    get_group_description.cache_clear()
+    jps_group = JPSGroup(groupid='121207', category='Album', artist=['Artist'], date='2012', title='Title', originalartist='',
+                         originaltitle='', torrent_table='', imagelink=None, tagsall='', contribartists={})
+    assert edit_group_page.call_count == 0
+
+    assert jps_group.groupdescription.startswith('[img]http://i.imgur.com/LJQps.png[/img]')
+    assert jps_group.groupdescription == get_group_description('121207')
+    assert edit_group_page.call_count == 1
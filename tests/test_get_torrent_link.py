@@ -0,0 +1,41 @@
+"""
+Run tests for get_torrent_link() and the torrent table index it shares with get_release_data()
+"""
+import pytest
+from bs4 import BeautifulSoup
+
+from jps2sm.get_data import get_torrent_link, get_torrent_table_index
+
+
+def get_fixture_torrent_table() -> str:
+    """
+    Return the torrent table of the group page fixture for group 120274
+    """
+    with open("tests/group-page-120274", "r", encoding="utf-8") as group_page:
+        soup = BeautifulSoup(group_page.read(), 'html5lib')
+    return str(soup.select('#content .thin .main_column .torrent_table tbody')[0])
+
+
+def test_get_torrent_table_index() -> None:
+    """
+    Test every release is indexed in order with its download link
+    """
+    torrent_table = get_fixture_torrent_table()
+    torrent_table_index = get_torrent_table_index(torrent_table)
+
+    assert list(torrent_table_index) == ['357770', '160084', '276789', '277001', '160466', '164403']
+    assert torrent_table_index['160084'].slashdata == 'MKV / DVD'
+    assert torrent_table_index['160084'].download_link == \
+        'torrents.php?action=download&amp;id=160084&amp;authkey=00000000000000000000000000000000&amp;torrent_pass=00000000000000000000000000000000'
+
+
+def test_get_torrent_link() -> None:
+    """
+    Test the download link of a torrent is found, and that an unknown torrent is an error
+    """
+    torrent_table = get_fixture_torrent_table()
+
+    assert get_torrent_link('276789', torrent_table) == \
+        'torrents.php?action=download&amp;id=276789&amp;authkey=00000000000000000000000000000000&amp;torrent_pass=00000000000000000000000000000000'
+    with pytest.raises(IndexError):
+        get_torrent_link('1', torrent_table)
@@ -0,0 +1,47 @@
+"""
+Run tests for GroupPageNodes() and the group data taken from its nodes
+"""
+from bs4 import BeautifulSoup
+
+from jps2sm.get_data import GroupPageNodes, get_contrib_artists, get_original_artist_title
+
+GROUP_PAGE = """
+<html><body><div id="content"><div class="thin">
+<h2>[Album] <a href="artist.php?id=1">V.A.</a> - PEAK TIME &amp; more [2023.01.01]</h2>
+<h3 style="text-align:center;">(<a href="artist.php?id=1">V.A.</a> - PEAK TIME - &lt;2Round&gt; Part.1)</h3>
+<div class="sidebar">
+  <div class="box"><p><a name="cover"></a><a href="static/images/torrents/1.jpg?a=1&amp;b=2">Cover</a></p></div>
+  <div class="box"><ul class="stats nobullet">
+    <li><a href="torrents.php?searchtags=japanese">japanese</a> <a href="torrents.php?action=vote_tag&amp;tagid=1">+</a></li>
+    <li><a href="torrents.php?searchtags=pop">pop</a></li>
+  </ul></div>
+  <div class="box"><div class="body"><ul class="stats nobullet">
+    <li><a href="artist.php?id=2" title="前田敦子">Atsuko Maeda</a></li>
+    <li><a href="artist.php?id=3" title="A &amp; B">A and B</a></li>
+    <li class="extra"><a href="artist.php?id=4" title="ignored">Ignored</a></li>
+    <li><a href="artist.php?id=5" title="ignored">Not &amp; matched</a></li>
+  </ul></div></div>
+</div>
+<div class="main_column"><table class="torrent_table"><tbody><tr><td>Release</td></tr></tbody></table></div>
+</div></div></body></html>
+"""
+
+
+def test_group_page_nodes():
+    """
+    Test that each node is collected as the CSS selectors would and that values are escaped as in the page source
+    """
+    soup = BeautifulSoup(GROUP_PAGE, 'html5lib')
+    group_page_nodes = GroupPageNodes(soup)
+
+    assert group_page_nodes.h2 is soup.select('.thin h2')[0]
+    assert group_page_nodes.h2_links == soup.select('.thin h2 a')
+    assert group_page_nodes.h3s == soup.select('.thin h3')
+    assert group_page_nodes.torrent_table is soup.select('#content .thin .main_column .torrent_table tbody')[0]
+    assert group_page_nodes.image_links == soup.select('#content .thin .sidebar .box p a')
+    assert group_page_nodes.contrib_artist_items == soup.select('#content .thin .sidebar .box .body ul.stats.nobullet li')
+    assert [link['href'] for link in group_page_nodes.tag_links][:2] == ['torrents.php?searchtags=japanese',
+                                                                         'torrents.php?action=vote_tag&tagid=1']
+
+    assert get_original_artist_title(group_page_nodes.h3s) == ('V.A.', 'PEAK TIME - &lt;2Round&gt; Part.1')
+    assert get_contrib_artists(group_page_nodes.contrib_artist_items) == {'Atsuko Maeda': '前田敦子', 'A and B': 'A &amp; B'}
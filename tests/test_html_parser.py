@@ -0,0 +1,60 @@
+"""
+Run tests for make_soup(), checking that lxml extracts the same data as html5lib
+"""
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from loguru import logger
+
+from jps2sm import get_data, html_parser
+from jps2sm.get_data import GetGroupData, get_group_description_bbcode
+from jps2sm.html_parser import make_soup
+
+
+def group_data_with_parser(monkeypatch, parser, jps_group_id, jps_group_page_text):
+    """
+    Return GetGroupData().all() for a group page parsed with parser, and the time taken
+    """
+    monkeypatch.setattr(html_parser, 'get_html_parser', lambda: parser)
+    start_time = time.perf_counter()
+    try:
+        group_data = GetGroupData(jps_group_id, jps_group_page_text).all()
+    except Exception as exc:  # The bad V.A. group raises an exception, which must also be the same
+        group_data = str(exc)
+    return group_data, time.perf_counter() - start_time
+
+
+def test_group_data_identical_across_parsers(monkeypatch):
+    """
+    Test that GetGroupData() extracts identical data from every group page fixture with lxml and html5lib, and benchmark them
+    """
+    monkeypatch.setattr(get_data, 'get_group_description_bbcode', lambda jps_group_id: 'Group description')
+    parse_times = {'lxml': 0.0, 'html5lib': 0.0}
+
+    for group_page_file in sorted(Path('tests').glob('group-page-*')):
+        jps_group_id = group_page_file.name.split('-')[2]
+        jps_group_page_text = group_page_file.read_text(encoding='utf-8')
+        lxml_group_data, parse_times['lxml'] = group_data_with_parser(monkeypatch, 'lxml', jps_group_id, jps_group_page_text)
+        html5lib_group_data, parse_times['html5lib'] = group_data_with_parser(monkeypatch, 'html5lib', jps_group_id, jps_group_page_text)
+        assert lxml_group_data == html5lib_group_data
+        logger.info(f'{group_page_file.name}: lxml {parse_times["lxml"]:.3f}s html5lib {parse_times["html5lib"]:.3f}s')
+
+    for edit_group_page_file in sorted(Path('tests').glob('group-edit-page-*')):
+        edit_group_page = SimpleNamespace(text=edit_group_page_file.read_text(encoding='utf-8'))
+        monkeypatch.setattr(get_data, 'jpopsuki', lambda url, page=edit_group_page: page)
+        monkeypatch.setattr(html_parser, 'get_html_parser', lambda: 'lxml')
+        lxml_bbcode = get_group_description_bbcode(edit_group_page_file.name.split('-')[3])
+        monkeypatch.setattr(html_parser, 'get_html_parser', lambda: 'html5lib')
+        assert lxml_bbcode == get_group_description_bbcode(edit_group_page_file.name.split('-')[3])
+
+
+def test_make_soup_fallback(monkeypatch):
+    """
+    Test that make_soup() falls back to html5lib if lxml does not find a required selector
+    """
+    monkeypatch.setattr(html_parser, 'get_html_parser', lambda: 'lxml')
+    page_text = '<html><body><table class="torrent_table"><tr><td>Torrent</td></tr></table></body></html>'
+
+    assert make_soup(page_text, ['.torrent_table tbody td']).builder.NAME == 'lxml'
+    assert make_soup(page_text, ['.missing']).builder.NAME == 'html5lib'
@@ -0,0 +1,48 @@
+"""
+Run tests for MediaIndex
+"""
+import os
+from pathlib import Path
+
+from jps2sm.media_index import MediaIndex
+
+
+def make_old(*paths) -> None:
+    """
+    Set the mtime of paths to an hour ago, as directories that have not changed since the index was last refreshed
+    """
+    for path in paths:
+        os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime - 3600))
+
+
+def test_media_index(tmp_path, mocker):
+    """
+    Test that files and directories are found by name in the first MediaDirectories root with them, and that a refresh only lists
+    the directories that have changed
+    """
+    first_root, second_root = Path(tmp_path, 'Music'), Path(tmp_path, 'BR-Rips')
+    Path(first_root, 'Artist', 'Album').mkdir(parents=True)
+    Path(first_root, 'Artist', 'Album', '01.flac').write_bytes(b'')
+    Path(second_root, 'Album').mkdir(parents=True)
+    Path(second_root, 'Live.mkv').write_bytes(b'')
+    make_old(first_root, Path(first_root, 'Artist'), Path(first_root, 'Artist', 'Album'), second_root, Path(second_root, 'Album'))
+
+    media_index = MediaIndex(Path(tmp_path, 'media-index.sqlite3'), [str(first_root), str(second_root)])
+    media_index.refresh()
+    assert media_index.lookup('Album', True) == Path(first_root, 'Artist', 'Album')
+    assert media_index.lookup('Live.mkv', False) == Path(second_root, 'Live.mkv')
+    assert media_index.lookup('Live.mkv', True) is None
+
+    Path(second_root, 'Single.mkv').write_bytes(b'')
+    Path(first_root, 'Artist', 'Album', '01.flac').unlink()
+    Path(first_root, 'Artist', 'Album').rmdir()
+    scandir = mocker.patch('jps2sm.media_index.os.scandir', wraps=os.scandir)
+    media_index = MediaIndex(Path(tmp_path, 'media-index.sqlite3'), [str(first_root), str(second_root)])
+    media_index.refresh()
+    assert sorted(call.args[0] for call in scandir.call_args_list) == [str(second_root), str(Path(first_root, 'Artist'))]
+    assert media_index.lookup('Single.mkv', False) == Path(second_root, 'Single.mkv')
+    assert media_index.lookup('Album', True) == Path(second_root, 'Album')
+    assert media_index.lookup('01.flac', False) is None
+
+    media_index = MediaIndex(Path(tmp_path, 'media-index.sqlite3'), [str(second_root)])
+    assert media_index.lookup('Single.mkv', False) is None
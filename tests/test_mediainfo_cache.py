@@ -0,0 +1,49 @@
+"""
+Run tests for the cache of get_mediainfo() results
+"""
+import os
+from io import BytesIO
+from pathlib import Path
+
+import torrent_parser as tp
+from pymediainfo import MediaInfo
+
+from jps2sm.cache import DiskCache
+from jps2sm.media_index import MediaIndex
+from jps2sm.mediainfo import ParsedMediaFile, get_mediainfo
+
+MEDIAINFO_XML = '<Mediainfo><File>' \
+                '<track type="General"><Duration>1000</Duration><File_extension>mkv</File_extension></track>' \
+                '<track type="Video"><Commercial_name>AVC</Commercial_name><Width>1920</Width><Height>1080</Height></track>' \
+                '<track type="Audio"><Format>AAC</Format></track>' \
+                '</File></Mediainfo>'
+
+
+def test_mediainfo_cache(tmp_path, mocker):
+    """
+    Test that the files of a torrent are only analysed again once one of them has changed
+    """
+    Path(tmp_path, 'Live', 'Live.mkv').parent.mkdir()
+    Path(tmp_path, 'Live', 'Live.mkv').write_bytes(b'123')
+    Path(tmp_path, 'Live', 'Live.nfo').write_bytes(b'1')
+    torrent = tp.encode({'info': {'name': 'Live', 'piece length': 16384, 'pieces': b'',
+                                  'files': [{'path': ['Live.mkv'], 'length': 3}, {'path': ['Live.nfo'], 'length': 1}]}})
+
+    mocker.patch('jps2sm.mediainfo.GetMediaIndex').return_value.media_index.return_value = MediaIndex(':memory:', [str(tmp_path)])
+    disk_cache = DiskCache(Path(tmp_path, 'mediainfo-cache'), max_size_bytes=1024 * 1024)
+    mocker.patch('jps2sm.mediainfo.GetMediainfoCache').return_value.mediainfo_cache.return_value = disk_cache
+    mocker.patch('jps2sm.mediainfo.GetMediainfoPool').return_value.mediainfo_pool.return_value = None
+    parse_media_file = mocker.patch('jps2sm.mediainfo.parse_media_file',
+                                    return_value=ParsedMediaFile(text='General\n', media_info=MediaInfo(MEDIAINFO_XML)))
+
+    mediainfo, release_data = get_mediainfo(BytesIO(torrent), 'Web')
+    assert (mediainfo, release_data['duration'], release_data['codec'], release_data['ressel']) == ('General\nGeneral\n', 2000, 'h264', '1080p')
+    assert parse_media_file.call_count == 2
+
+    assert get_mediainfo(BytesIO(torrent), 'Web') == (mediainfo, release_data)
+    assert parse_media_file.call_count == 2
+    assert (disk_cache.hits, disk_cache.misses) == (1, 1)
+
+    os.utime(Path(tmp_path, 'Live', 'Live.nfo'), ns=(0, 0))
+    get_mediainfo(BytesIO(torrent), 'Web')
+    assert parse_media_file.call_count == 4
@@ -0,0 +1,63 @@
+"""
+Run tests for parse_media_file() and parse_media_files()
+"""
+import multiprocessing
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+from pymediainfo import MediaInfo
+
+import jps2sm.mediainfo
+from jps2sm.mediainfo import parse_media_file, parse_media_files
+
+
+@pytest.mark.skipif(not MediaInfo.can_parse(), reason="libmediainfo is not installed")
+def test_parse_media_file() -> None:
+    """
+    Test that a single parse gives the same text output and tracks as parsing the file with MediaInfo.parse() for each
+    """
+    parsed_media_file = parse_media_file("tests/group-page-120274")
+
+    assert parsed_media_file.text == MediaInfo.parse("tests/group-page-120274", output="")
+    assert parsed_media_file.media_info.to_data() == MediaInfo.parse("tests/group-page-120274").to_data()
+    assert parsed_media_file.duration == 0
+    with pytest.raises(FileNotFoundError):
+        parse_media_file("tests/no-such-file")
+
+
+@pytest.mark.skipif(not MediaInfo.can_parse(), reason="libmediainfo is not installed")
+def test_parse_media_files(mocker) -> None:
+    """
+    Test that files parsed by the process pool are returned in order, the same as parsing them in turn
+    """
+    filenames = [Path("tests", group_page) for group_page in ("group-page-120274", "group-page-173844", "group-page-212853")]
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as mediainfo_pool:
+        mocker.patch('jps2sm.mediainfo.GetMediainfoPool').return_value.mediainfo_pool.return_value = mediainfo_pool
+        parsed_media_files = parse_media_files(filenames)
+
+    assert [parsed_media_file.text for parsed_media_file in parsed_media_files] == \
+        [parse_media_file(filename).text for filename in filenames]
+
+
+@pytest.mark.skipif(not MediaInfo.can_parse(), reason="libmediainfo is not installed")
+def test_parse_media_file_read_limit(tmp_path, mocker) -> None:
+    """
+    Test that a file larger than the read limit is analysed from no more than that many bytes of it, and that it is read in full
+    if fields are missing from that
+    """
+    with wave.open(str(Path(tmp_path, 'Live.wav')), 'wb') as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(b'\x00' * 4 * 44100 * 10)
+    feed_mediainfo_buffer = mocker.spy(jps2sm.mediainfo, 'feed_mediainfo_buffer')
+
+    parsed_media_file = parse_media_file(Path(tmp_path, 'Live.wav'), read_limit=65536)
+    assert feed_mediainfo_buffer.spy_return <= 65536
+    assert (parsed_media_file.duration, parsed_media_file.media_info.audio_tracks[0].format) == (10000, 'PCM')
+
+    # Not a media file, so the fields are missing and it is parsed again without the read limit
+    assert parse_media_file("tests/group-page-120274", read_limit=1024).text == parse_media_file("tests/group-page-120274").text
+    assert feed_mediainfo_buffer.call_count == 2
@@ -0,0 +1,73 @@
+"""
+Run tests for RateLimiter
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from jps2sm.ratelimit import RateLimiter
+
+
+def test_rate_limiter(mocker, tmp_path):
+    """
+    Test that RateLimiter waits once its budget is used up, and that a quota pause is persisted to the next run
+    """
+    clock = [1000.0]
+    mocker.patch("time.time", side_effect=lambda: clock[0])
+    sleep = mocker.patch("time.sleep", side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    state_file = Path(tmp_path, 'jps-rate-limit.json')
+
+    rate_limiter = RateLimiter(budget=2, window_seconds=10, pause_seconds=60, state_file=state_file)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert sleep.call_count == 0
+
+    rate_limiter.acquire()  # Budget is used up, so wait for a token to be refilled
+    assert clock[0] == pytest.approx(1005)
+
+    rate_limiter.quota_exceeded()
+    next_run_rate_limiter = RateLimiter(budget=2, window_seconds=10, pause_seconds=60, state_file=state_file)
+    assert next_run_rate_limiter.time_until_available(2) == pytest.approx(60)
+    assert next_run_rate_limiter.time_until_available(3) == pytest.approx(65)
+
+    next_run_rate_limiter.acquire()
+    assert clock[0] == pytest.approx(1065)
+
+
+def test_rate_limiter_min_interval(mocker, tmp_path):
+    """
+    Test that RateLimiter spaces requests by min_interval_seconds even with a full bucket, and that it only saves the bucket
+    every STATE_SAVE_INTERVAL_SECS until it is closed
+    """
+    clock = [1000.0]
+    mocker.patch("time.time", side_effect=lambda: clock[0])
+    mocker.patch("time.sleep", side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    state_file = Path(tmp_path, 'jps-rate-limit.json')
+
+    rate_limiter = RateLimiter(budget=100, window_seconds=100, pause_seconds=60, state_file=state_file, min_interval_seconds=2)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert clock[0] == pytest.approx(1002)
+    assert rate_limiter.time_until_available(3) == pytest.approx(6)
+    assert json.loads(state_file.read_text(encoding='utf-8'))['last_refill'] == pytest.approx(1000)
+
+    rate_limiter.close()
+    assert json.loads(state_file.read_text(encoding='utf-8'))['last_refill'] == pytest.approx(1002)
+
+
+def test_rate_limiter_time_waited_threads():
+    """
+    Test that the time waited by several threads at once is counted once, as the wall clock time spent waiting
+    """
+    rate_limiter = RateLimiter(budget=1, window_seconds=0.4, pause_seconds=60)
+    rate_limiter.acquire()
+
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda _: rate_limiter.acquire(), range(2)))
+    elapsed = time.monotonic() - start_time
+
+    assert 0.6 < rate_limiter.time_waited <= elapsed + 0.05
@@ -0,0 +1,66 @@
+"""
+Run tests for ResponseCache
+"""
+from pathlib import Path
+
+import requests
+
+from jps2sm.cache import DiskCache, ResponseCache
+
+
+def make_response(url: str, text: str) -> requests.Response:
+    """
+    Create a requests response for url with the content text
+    """
+    res = requests.Response()
+    res.status_code = 200
+    res.url = url
+    res.encoding = 'utf-8'
+    res._content = text.encode('utf-8')  # pylint: disable=protected-access
+    return res
+
+
+def test_response_cache(mocker, tmp_path):
+    """
+    Test ResponseCache TTLs, cache modes and LRU eviction of DiskCache
+    """
+    clock = [1000.0]
+    mocker.patch("time.time", side_effect=lambda: clock[0])
+    group_url = "https://jpopsuki.eu/torrents.php?id=120274"
+    download_url = "https://jpopsuki.eu/torrents.php?action=download&id=357770"
+
+    disk_cache = DiskCache(Path(tmp_path, 'http-cache'), max_size_bytes=10 * 1024 * 1024)
+    response_cache = ResponseCache(disk_cache, 'read-write')
+
+    response_cache.set(group_url, make_response(group_url, 'Group page'))
+    response_cache.set(download_url, make_response(download_url, 'Torrent file'))
+    assert response_cache.get(group_url).text == 'Group page'
+    assert response_cache.get(download_url) is None  # Torrent downloads are never cached
+
+    clock[0] += 13 * 60 * 60  # Group pages expire after 12 hours
+    assert response_cache.get(group_url) is None
+    assert (disk_cache.hits, disk_cache.misses) == (1, 1)
+
+    assert ResponseCache(disk_cache, 'refresh').get(group_url) is None
+    ResponseCache(disk_cache, 'read-only').set(group_url, make_response(group_url, 'New group page'))
+    ResponseCache(disk_cache, 'refresh').set(group_url, make_response(group_url, 'Refreshed group page'))
+    assert ResponseCache(disk_cache, 'read-only').get(group_url).text == 'Refreshed group page'
+
+    small_disk_cache = DiskCache(Path(tmp_path, 'small-cache'), max_size_bytes=1)
+    small_disk_cache.set('first', b'first')
+    small_disk_cache.set('second', b'second')
+    assert small_disk_cache.get('first') is None
+    assert small_disk_cache.size_bytes <= 1
+
+
+def test_disk_cache_evicted_after_read(mocker, tmp_path):
+    """
+    Test that DiskCache.get() treats a file evicted by another thread after it was read as a miss
+    """
+    disk_cache = DiskCache(Path(tmp_path, 'http-cache'), max_size_bytes=10 * 1024 * 1024)
+    disk_cache.set('key', 'value')
+    assert disk_cache.get('key')[0] == 'value'
+
+    mocker.patch("os.utime", side_effect=FileNotFoundError)
+    assert disk_cache.get('key') is None
+    assert (disk_cache.hits, disk_cache.misses) == (1, 1)
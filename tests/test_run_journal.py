@@ -0,0 +1,43 @@
+"""
+Run tests for RunJournal
+"""
+from pathlib import Path
+
+from jps2sm.batch import ListingTorrent
+from jps2sm.journal import RunJournal
+
+
+def test_run_journal(tmp_path):
+    """
+    Test that completed units are loaded again, that the torrents collated are not journaled and an incomplete unit is discarded
+    """
+    journal_path = Path(tmp_path, 'run.journal')
+    run_journal = RunJournal('run', journal_path)
+    run_journal.record('batch_args', {'mode': 'snatched', 'user': 1})
+    run_journal.record('last_page', 3)
+    run_journal.record('page', 1, [ListingTorrent('100', '1000', category='Album')])
+    run_journal.record('group_data', ('100', 'data', {'groupid': '100'}))
+    run_journal.record('collate', '100', '1000', {
+        'jps_torrent_collated_data': {'1000': {'jps_torrent_object': object(), 'torrentgroupdata': object(),
+                                               'release_data_collated': {'jpstorrentid': '1000'}, 'sm_torrent_hash': 'aaaa'}},
+        'skipped_torrents_low_seeders': 0,
+    })
+    run_journal.record('uploaded', '1000')
+    complete_size = journal_path.stat().st_size
+    with open(journal_path, "ab") as journal_file:
+        journal_file.write(b'\x80\x04\x95')  # A unit being written when the run crashed
+
+    run_journal = RunJournal('run', journal_path)
+    assert journal_path.stat().st_size == complete_size
+    assert run_journal.batch_args == {'mode': 'snatched', 'user': 1}
+    assert run_journal.last_page == 3
+    assert run_journal.pages == {1: [ListingTorrent('100', '1000', category='Album')]}
+    assert run_journal.group_data_results == {'100': ('100', 'data', {'groupid': '100'})}
+    assert run_journal.collate_results['1000'] == ('100', {
+        'jps_torrent_collated_data': {'1000': {'release_data_collated': {'jpstorrentid': '1000'}, 'sm_torrent_hash': 'aaaa'}},
+        'skipped_torrents_low_seeders': 0,
+    })
+    assert run_journal.uploaded == {'1000'}
+
+    run_journal.finish()
+    assert not journal_path.exists()
@@ -0,0 +1,91 @@
+"""
+Run tests for SiteSession
+"""
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from jps2sm.myloginsession import SiteSession, LoginParameters
+
+
+def test_site_session(requests_mock):
+    """
+    Test that SiteSession re-uses one login session and only logs in again when the session has expired
+    """
+    requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+    requests_mock.get("https://jpopsuki.eu/login.php", text="Login form")
+    requests_mock.get("https://jpopsuki.eu/torrents.php?id=1", [
+        {'status_code': 302, 'headers': {'Location': 'https://jpopsuki.eu/login.php'}},  # Session expired
+        {'text': 'Group page'},
+        {'text': 'Group page'},
+    ])
+
+    site_session = SiteSession(LoginParameters.jps_login_url, LoginParameters.jps_test_url, LoginParameters.jps_success,
+                               {'username': 'jpsuser123', 'password': 'jpspass123'})
+
+    assert site_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1").text == 'Group page'
+    login_session = site_session.login_session
+    logins_after_expiry = site_session.pool_stats()['logins']
+    assert logins_after_expiry >= 1
+
+    assert site_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1").text == 'Group page'
+    assert site_session.login_session is login_session
+    assert site_session.pool_stats()['logins'] == logins_after_expiry
+
+
+def test_site_session_saves_session_file(requests_mock, mocker):
+    """
+    Test that a SiteSession shared by several threads saves a loadable session file once, without changing the umask
+    """
+    requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+    requests_mock.get("https://jpopsuki.eu/torrents.php", text='Group page')
+
+    site_session = SiteSession(LoginParameters.jps_login_url, LoginParameters.jps_test_url, LoginParameters.jps_success,
+                               {'username': 'jpsuser123', 'password': 'jpspass123'})
+    umask = os.umask(0o022)
+    os.umask(umask)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(site_session.retrieve_content, [f"https://jpopsuki.eu/torrents.php?id={i}" for i in range(20)]))
+    assert {res.text for res in responses} == {'Group page'}
+
+    session_file = site_session.login_session.session_file
+    with open(session_file, "rb") as session_file_object:
+        assert isinstance(pickle.load(session_file_object), requests.Session)
+    assert session_file.stat().st_mode & 0o777 == 0o600
+    assert list(session_file.parent.glob(f'{session_file.name}.*')) == []
+    assert os.umask(umask) == umask
+
+    save_session_to_cache = mocker.patch.object(site_session.login_session, 'save_session_to_cache')
+    site_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1")
+    save_session_to_cache.assert_not_called()
+
+
+def test_site_session_retries_acquire_rate_limiter(requests_mock, mocker):
+    """
+    Test that the retries after a relogin and after a quota pause take a token from the rate limiter, and that a SiteSession
+    without a rate limiter retries a quota exceeded response without one
+    """
+    requests_mock.post("https://jpopsuki.eu/login.php", text=LoginParameters.jps_success)  # Mock the initial login with requestsloginsession()
+    requests_mock.get("https://jpopsuki.eu/login.php", text="Login form")
+    requests_mock.get("https://jpopsuki.eu/torrents.php?id=1", [
+        {'status_code': 302, 'headers': {'Location': 'https://jpopsuki.eu/login.php'}},  # Session expired
+        {'text': LoginParameters.jps_quota_exceeded},
+        {'text': 'Group page'},
+    ])
+    requests_mock.get("https://jpopsuki.eu/torrents.php?id=2", text=LoginParameters.jps_quota_exceeded)
+
+    rate_limiter = mocker.MagicMock()
+    site_session = SiteSession(LoginParameters.jps_login_url, LoginParameters.jps_test_url, LoginParameters.jps_success,
+                               {'username': 'jpsuser123', 'password': 'jpspass123'},
+                               rate_limiter=rate_limiter, quota_exceeded_string=LoginParameters.jps_quota_exceeded)
+    assert site_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=1").text == 'Group page'
+    assert rate_limiter.acquire.call_count == 3
+    assert rate_limiter.quota_exceeded.call_count == 1
+
+    site_session.rate_limiter = None
+    with pytest.raises(RuntimeError, match='Quota still exceeded'):
+        site_session.retrieve_content("https://jpopsuki.eu/torrents.php?id=2")
@@ -0,0 +1,65 @@
+"""
+Run tests for TorrentLedger and the outcomes batch mode records in it
+"""
+from pathlib import Path
+
+from jps2sm.batch import record_collate_outcomes
+from jps2sm.ledger import TorrentLedger
+
+
+def test_torrent_ledger(tmp_path):
+    """
+    Test that only final outcomes are skipped, are kept between runs and are never replaced by outcomes that are not final
+    """
+    ledger_path = Path(tmp_path, 'ledger.sqlite3')
+    torrent_ledger = TorrentLedger(ledger_path)
+    torrent_ledger.record('1', '10', 'uploaded', sm_torrent_hash='aaaa')
+    torrent_ledger.record('1', '11', 'dupe', sm_torrent_id=500, sm_torrent_hash='bbbb')
+    torrent_ledger.record('1', '12', 'filtered', detail='skipped_torrents_low_seeders')
+    torrent_ledger.record('2', '20', 'error', detail='Bad response')
+    torrent_ledger.record('1', '10', 'error', detail='SM upload error')
+    torrent_ledger.record('2', '20', 'uploaded', sm_torrent_hash='cccc')
+    torrent_ledger.connection.close()
+
+    torrent_ledger = TorrentLedger(ledger_path)
+    assert [torrent_ledger.final_outcome(jps_torrent_id) for jps_torrent_id in ('10', '11', '12', '20', '99')] == \
+        ['uploaded', 'dupe', None, 'uploaded', None]
+    assert torrent_ledger.dupe_sm_torrent_id('bbbb') == 500
+    assert torrent_ledger.dupe_sm_torrent_id('aaaa') is None
+    assert torrent_ledger.sm_requests_saved == 1
+
+    read_only_ledger = TorrentLedger(ledger_path, read_only=True)
+    read_only_ledger.record('3', '30', 'uploaded')
+    assert read_only_ledger.final_outcome('30') is None
+
+
+def test_record_collate_outcomes():
+    """
+    Test that duplicates and filtered torrents from collate() are recorded, and collated torrents are left until they are uploaded
+    """
+    torrent_ledger = TorrentLedger(':memory:')
+    collate_torrent_info = {
+        'jps_torrent_collated_data': {'12': {}},
+        'skipped_torrents_max_size': 0,
+        'skipped_torrents_low_seeders': 1,
+        'skipped_torrents_exc_filter': 0,
+        'dupe_jps_ids': [10],
+        'dupe_sm_ids': [500],
+        'dupe_sm_torrent_hashes': ['bbbb'],
+    }
+    record_collate_outcomes(torrent_ledger, '1', ['10', '11', '12'], collate_torrent_info)
+
+    rows = torrent_ledger.connection.execute('SELECT jps_torrent_id, outcome, sm_torrent_id, detail FROM torrents ORDER BY jps_torrent_id')
+    assert rows.fetchall() == [('10', 'dupe', 500, None), ('11', 'filtered', None, 'skipped_torrents_low_seeders')]
+
+
+def test_torrent_ledger_cursor():
+    """
+    Test that a cursor only moves forward
+    """
+    torrent_ledger = TorrentLedger(':memory:')
+    assert torrent_ledger.cursor('recent') is None
+    torrent_ledger.set_cursor('recent', 200)
+    torrent_ledger.set_cursor('recent', 150)
+    assert torrent_ledger.cursor('recent') == 200
+    assert torrent_ledger.cursor('recent-freeleech') is None